@@ -1,6 +1,14 @@
 #!/bin/bash
 # PACBench Full Evaluation Pipeline
 # Runs evaluations, verification, and generates summary tables
+#
+# Usage: ./run_full_evaluation.sh [EVAL_MODEL] [VERIFIER_MODEL] [NUM_SAMPLES] [OUTPUT_DIR]
+# Example: ./run_full_evaluation.sh meta-llama/llama-4-maverick meta-llama/llama-4-maverick 10 evaluations
+#
+# The stages run as a dependency graph in scripts/orchestrate.py; extra
+# orchestrator options (e.g. --budget 32, --force) can be passed in
+# ORCHESTRATE_ARGS. Set PIPELINE=1 to instead verify rows while evaluation is
+# still running (scripts/pipeline.py), followed by the summary tables.
 
 echo "================================================================================"
 echo "PACBENCH FULL EVALUATION PIPELINE"
@@ -18,84 +26,48 @@ echo "Number of Samples: ${NUM_SAMPLES:-all}"
 echo "Output Directory: $OUTPUT_DIR"
 echo "================================================================================"
 
-# Change to scripts directory
-cd scripts || exit 1
-
-# Step 1: Run Property Evaluations
-echo ""
-echo "================================================================================"
-echo "STEP 1: Running Property Evaluations"
-echo "================================================================================"
-if [ -z "$NUM_SAMPLES" ]; then
-    python run_properties.py --model "$EVAL_MODEL" --dataset all
-else
-    python run_properties.py --model "$EVAL_MODEL" --dataset all --num_samples "$NUM_SAMPLES"
-fi
-
-if [ $? -ne 0 ]; then
-    echo "ERROR: Property evaluation failed!"
-    exit 1
+ARGS=(--model "$EVAL_MODEL" --verifier_model "$VERIFIER_MODEL" --output_dir "../$OUTPUT_DIR")
+if [ -n "$NUM_SAMPLES" ]; then
+    ARGS+=(--num_samples "$NUM_SAMPLES")
 fi
 
-# Step 2: Run Affordance Evaluations
-echo ""
-echo "================================================================================"
-echo "STEP 2: Running Affordance Evaluations"
-echo "================================================================================"
-if [ -z "$NUM_SAMPLES" ]; then
-    python run_affordance.py --model "$EVAL_MODEL" --dataset all
-else
-    python run_affordance.py --model "$EVAL_MODEL" --dataset all --num_samples "$NUM_SAMPLES"
-fi
-
-if [ $? -ne 0 ]; then
-    echo "ERROR: Affordance evaluation failed!"
-    exit 1
-fi
+# Change to scripts directory
+cd scripts || exit 1
 
-# Step 3: Run Constraint Evaluations
-echo ""
-echo "================================================================================"
-echo "STEP 3: Running Constraint Evaluations"
-echo "================================================================================"
-if [ -z "$NUM_SAMPLES" ]; then
-    python run_constraint.py --model "$EVAL_MODEL" --dataset all
+if [ "${PIPELINE:-0}" = "1" ]; then
+    echo ""
+    echo "================================================================================"
+    echo "STEP 1: Running Evaluations and Verification (streaming pipeline)"
+    echo "================================================================================"
+    python pipeline.py "${ARGS[@]}"
+
+    if [ $? -ne 0 ]; then
+        echo "ERROR: Evaluation pipeline failed!"
+        exit 1
+    fi
+
+    echo ""
+    echo "================================================================================"
+    echo "STEP 2: Generating Summary Tables"
+    echo "================================================================================"
+    python generate_performance.py --eval_dir "../$OUTPUT_DIR" --output_dir "../$OUTPUT_DIR"
+
+    if [ $? -ne 0 ]; then
+        echo "ERROR: Summary generation failed!"
+        exit 1
+    fi
 else
-    python run_constraint.py --model "$EVAL_MODEL" --dataset all --num_samples "$NUM_SAMPLES"
-fi
-
-if [ $? -ne 0 ]; then
-    echo "ERROR: Constraint evaluation failed!"
-    exit 1
-fi
-
-# Step 4: Run verification
-echo ""
-echo "================================================================================"
-echo "STEP 4: Verifying Results with LLM"
-echo "================================================================================"
-python verify_results.py \
-    --model "$VERIFIER_MODEL" \
-    --output_dir "../$OUTPUT_DIR" \
-    --task all
-
-if [ $? -ne 0 ]; then
-    echo "ERROR: Verification failed!"
-    exit 1
-fi
-
-# Step 5: Generate summary tables
-echo ""
-echo "================================================================================"
-echo "STEP 5: Generating Summary Tables"
-echo "================================================================================"
-python generate_performance.py \
-    --eval_dir "../$OUTPUT_DIR" \
-    --output_dir "../$OUTPUT_DIR"
-
-if [ $? -ne 0 ]; then
-    echo "ERROR: Summary generation failed!"
-    exit 1
+    echo ""
+    echo "================================================================================"
+    echo "Running Evaluations, Verification and Summary Tables (orchestrate.py)"
+    echo "================================================================================"
+    # shellcheck disable=SC2086
+    python orchestrate.py "${ARGS[@]}" $ORCHESTRATE_ARGS
+
+    if [ $? -ne 0 ]; then
+        echo "ERROR: Orchestrated evaluation failed! Rerun to retry the failed stages."
+        exit 1
+    fi
 fi
 
 # Return to root directory
@@ -131,4 +103,3 @@ echo ""
 echo "Usage: ./run_full_evaluation.sh [EVAL_MODEL] [VERIFIER_MODEL] [NUM_SAMPLES] [OUTPUT_DIR]"
 echo "Example: ./run_full_evaluation.sh meta-llama/llama-4-maverick meta-llama/llama-4-maverick 10 evaluations"
 echo "================================================================================"
-
@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import time
+import zlib
+import shlex
+import random
+import shutil
+import struct
+import resource
+import argparse
+import tempfile
+import importlib
+import multiprocessing
+from tabulate import tabulate
+from config import (PROPERTY_MCQ_OPTIONS, property_ground_files, GROUND_TRUTH_DIR, OPEN_IMAGES_DIR,
+                    ROBOCASA_OBJECTS_DIR, HUMANOID_IMAGES_DIR, CONSTRAINT_IMAGES_DIR, SYN_PROPERTIES_GT,
+                    ROBO_PROPERTIES_GT, SYN_AFFORDANCE_GT, ROBO_AFFORDANCES_GT, SYN_CONSTRAINTS_GT,
+                    ROBO_CONSTRAINTS_GT)
+from mock_server import add_mock_args, configure_mock_from_args, start_mock_server, mock_stats
+from ratelimit import percentile
+
+DEFAULT_SCALE = 5
+DEFAULT_IMAGE_SIZE = (160, 120)
+# Seconds a stage process that closed its pipe without a result gets to exit
+STAGE_EXIT_TIMEOUT = 10.0
+
+# (stage, module whose main() runs, extra arguments); verification reads the
+# evaluation CSVs, which the runners and verify_results.py find at their default
+# paths relative to the synthetic scripts/ directory
+BENCHMARK_STAGES = [
+    ("properties", "run_properties", []),
+    ("affordances", "run_affordance", []),
+    ("constraints", "run_constraint", []),
+    ("verify:properties", "verify_results", ["--task", "properties"]),
+    ("verify:affordances", "verify_results", ["--task", "affordances"]),
+    ("verify:constraints", "verify_results", ["--task", "constraints"]),
+]
+
+# Metrics compared against --baseline, and whether higher is better
+COMPARED_METRICS = {"requests_per_second": True, "p50_ms": False, "p99_ms": False,
+                    "cpu_ms_per_request": False, "peak_rss_mb": False}
+
+
+def _write_png(path, size, rng):
+    """Write an RGB PNG of random pixels, so payloads are as large as real photos of that size."""
+    width, height = size
+    raw = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+                + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+
+def make_dataset(root, scale=DEFAULT_SCALE, image_size=DEFAULT_IMAGE_SIZE, seed=0):
+    """Write a synthetic dataset with the layout of config.py under root.
+
+    Returns the scripts/ directory to run from, since the dataset paths in
+    config.py are relative to it. Every dataset gets rows in proportion to
+    scale.
+    """
+    rng = random.Random(seed)
+    scripts_dir = os.path.join(root, "scripts")
+    os.makedirs(scripts_dir, exist_ok=True)
+
+    def path(relative, *parts):
+        return os.path.normpath(os.path.join(scripts_dir, relative, *parts))
+
+    def write_table(relative, sep, header, rows):
+        os.makedirs(os.path.dirname(path(relative)), exist_ok=True)
+        with open(path(relative), "w") as f:
+            f.write(sep.join(header) + "\n")
+            f.writelines(sep.join(row) + "\n" for row in rows)
+
+    for filename in property_ground_files:
+        prop = filename.split("_")[-2].upper()
+        options = PROPERTY_MCQ_OPTIONS[prop]
+        rows = []
+        for i in range(3 * scale):
+            rows.append([f"img{prop}{i}", f'"{options[i % len(options)]}"'])
+            _write_png(path(OPEN_IMAGES_DIR, f"img{prop}{i}.jpg"), image_size, rng)
+        write_table(os.path.join(GROUND_TRUTH_DIR, filename), ",", ["image", "choice"], rows)
+
+    objects = [f"object{i}" for i in range(3 * scale)]
+    for obj in objects:
+        for view in range(3):
+            _write_png(path(ROBOCASA_OBJECTS_DIR, obj, "unnamed", f"v{view}.png"), image_size, rng)
+    write_table(SYN_PROPERTIES_GT, "|", ["object_name", "property_name", "selected_category", "selected_descriptors"],
+                [[obj, prop, *PROPERTY_MCQ_OPTIONS[prop][0].split(": ")] for obj in objects for prop in ("WEIGHT", "COLOR")])
+    write_table(SYN_AFFORDANCE_GT, "|", ["object_name", "affordance1", "affordance2", "affordance3"],
+                [[obj, "grasp", "pour", ""] for obj in objects])
+
+    cams = [(f"o{i}_cam0.png", f"o{i}_cam1.png") for i in range(4 * scale)]
+    for cam0, cam1 in cams:
+        _write_png(path(HUMANOID_IMAGES_DIR, cam0), image_size, rng)
+        _write_png(path(HUMANOID_IMAGES_DIR, cam1), image_size, rng)
+    write_table(ROBO_PROPERTIES_GT, "|", ["property_name", "selected_category", "selected_descriptors", "cam0_file", "cam1_file"],
+                [[prop, *PROPERTY_MCQ_OPTIONS[prop][1].split(": "), cam0, cam1]
+                 for cam0, cam1 in cams for prop in ("HARDNESS", "SEALING")])
+    write_table(ROBO_AFFORDANCES_GT, "|", ["cam0_file", "cam1_file", "affordance1", "affordance2", "affordance3"],
+                [[cam0, cam1, "grasp", "lift", ""] for cam0, cam1 in cams])
+    write_table(ROBO_CONSTRAINTS_GT, "|", ["question", "answer", "cam0_file", "cam1_file"],
+                [[f"Can we pick up object {i}?", "No constraint", cam0, cam1] for i, (cam0, cam1) in enumerate(cams)])
+
+    keys = [f"constraint{i}" for i in range(2 * scale)]
+    for key in keys:
+        for view in ("agentview", "frontview", "sideview"):
+            for frame in range(3):
+                _write_png(path(CONSTRAINT_IMAGES_DIR, key, view, f"f{frame}.png"), image_size, rng)
+    write_table(SYN_CONSTRAINTS_GT, "|", ["key", "prompt", "verification_prompt"],
+                [[key, f"Stack the block on {key}", "Is the object blocked?"] for key in keys])
+    return scripts_dir
+
+
+def _run_stage(module_name, argv, cwd, log_path, conn):
+    """Child process body: run module.main() with argv and send back its measurements."""
+    os.chdir(cwd)
+    log = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+    os.environ.setdefault("OPENROUTER_API_KEY", "mock")
+
+    import ratelimit
+    module = importlib.import_module(module_name)
+    sys.argv = [f"{module_name}.py", *argv]
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    error = None
+    try:
+        module.main()
+    except SystemExit as e:
+        if e.code:
+            error = f"exit {e.code}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    # Prepare pool workers have been joined by now, so they count as children
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    sys.stdout.flush()
+
+    conn.send({
+        "wall_seconds": wall,
+        "cpu_seconds": (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+                       + children.ru_utime + children.ru_stime,
+        "peak_rss_mb": max(after.ru_maxrss, children.ru_maxrss) / 1024,
+        "latencies": ratelimit.request_latencies(),
+        "ratelimit": ratelimit.ratelimit_stats(),
+        "error": error,
+    })
+    conn.close()
+
+
+def run_stage(module_name, argv, cwd, log_path):
+    """Run one stage in a fresh interpreter, so its CPU time and peak RSS are its own."""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_stage, args=(module_name, argv, cwd, log_path, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        # The exit code is only known once the process has been reaped
+        process.join(STAGE_EXIT_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        result = {"error": f"stage process died (exit code {process.exitcode}); see {log_path}"}
+    process.join()
+    return result
+
+
+def summarize_stage(result):
+    """Throughput, latency percentiles, CPU and memory of one stage's measurements."""
+    if "latencies" not in result:
+        return {"error": result["error"]}
+    latencies = result["latencies"]
+    stats = result["ratelimit"]
+    requests = len(latencies)
+    wall = result["wall_seconds"]
+    return {
+        "requests": requests,
+        "attempts": stats["requests"],
+        "retries": stats["retries"],
+        "failed": stats["gave_up"],
+        "wall_seconds": wall,
+        "requests_per_second": requests / wall if wall > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "cpu_seconds": result["cpu_seconds"],
+        "cpu_ms_per_request": result["cpu_seconds"] / requests * 1000 if requests else None,
+        "peak_rss_mb": result["peak_rss_mb"],
+        "error": result["error"],
+    }
+
+
+def _fmt(value, digits=1):
+    return "-" if value is None else f"{value:,.{digits}f}"
+
+
+def print_report(summaries, server):
+    """Print the per-stage table, and what the mock server saw."""
+    rows = []
+    for stage, summary in summaries.items():
+        if "requests" not in summary:
+            rows.append([stage] + ["-"] * 9 + [summary["error"]])
+            continue
+        rows.append([stage, summary["requests"], summary["retries"], summary["failed"],
+                     _fmt(summary["wall_seconds"], 2), _fmt(summary["requests_per_second"]),
+                     _fmt(summary["p50_ms"]), _fmt(summary["p99_ms"]), _fmt(summary["cpu_seconds"], 2),
+                     _fmt(summary["cpu_ms_per_request"], 2), _fmt(summary["peak_rss_mb"]), summary["error"] or ""])
+    print("\n" + "="*80)
+    print("HARNESS BENCHMARK")
+    print("="*80)
+    print(tabulate(rows, headers=["Stage", "Requests", "Retries", "Failed", "Wall (s)", "Req/s", "p50 (ms)",
+                                  "p99 (ms)", "CPU (s)", "CPU/req (ms)", "Peak RSS (MB)", "Error"], tablefmt="grid"))
+    print("Latency is per successful request from the caller's side, rate limit waits and retries included. "
+          "CPU time includes the prepare pool workers.")
+    print(f"Mock server: {server['completions']} completions, {server['throttled']} injected 429s, "
+          f"{server['errors']} injected 500s, {server['bytes_in'] / 1024 / 1024:,.1f} MB received")
+
+
+def print_comparison(summaries, baseline, settings):
+    """Print the relative change of each compared metric against a saved benchmark report."""
+    changed = sorted(k for k, v in settings.items() if k != "stages" and baseline.get("settings", {}).get(k, v) != v)
+    if changed:
+        print(f"\nNote: the baseline was run with different {', '.join(changed)}")
+    rows = []
+    for stage, summary in summaries.items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before or "requests" not in summary or "requests" not in before:
+            continue
+        row = [stage]
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before.get(metric), summary.get(metric)
+            if not old or new is None:
+                row.append("-")
+                continue
+            change = (new - old) / old * 100
+            worse = change < 0 if higher_is_better else change > 0
+            row.append(f"{change:+.1f}%" + (" (worse)" if worse and abs(change) >= 10 else ""))
+        rows.append(row)
+    if rows:
+        print("\nChange against baseline:")
+        print(tabulate(rows, headers=["Stage", "Req/s", "p50", "p99", "CPU/req", "Peak RSS"], tablefmt="grid"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the harness end to end against a local mock API")
+    parser.add_argument("--scale", type=int, default=DEFAULT_SCALE,
+                        help="Size of the synthetic dataset (rows per dataset grow linearly with it)")
+    parser.add_argument("--image_size", type=int, nargs=2, default=list(DEFAULT_IMAGE_SIZE), metavar=("W", "H"),
+                        help="Width and height of the synthetic images")
+    parser.add_argument("--stages", type=str, default=",".join(stage for stage, _, _ in BENCHMARK_STAGES),
+                        help="Comma-separated stages to run, in order")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="--concurrency of the evaluation runners")
+    parser.add_argument("--verify_concurrency", type=int, default=4,
+                        help="--verify_concurrency of verify_results.py")
+    parser.add_argument("--verify_batch_size", type=int, default=1,
+                        help="--verify_batch_size of verify_results.py")
+    parser.add_argument("--runner_args", type=str, default="",
+                        help="Extra arguments for every evaluation runner, e.g. \"--prepare_workers 4\"")
+    parser.add_argument("--workdir", type=str, default=None,
+                        help="Directory for the synthetic dataset and results (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Save the results as JSON, e.g. to pass as --baseline later")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="JSON saved by an earlier --output run to compare against")
+    add_mock_args(parser)
+    parser.set_defaults(latency_ms=50.0)
+    args = parser.parse_args()
+
+    stages = {stage: (module, extra) for stage, module, extra in BENCHMARK_STAGES}
+    selected = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in selected if stage not in stages]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)} (choose from {', '.join(stages)})")
+
+    configure_mock_from_args(args)
+    server, base_url = start_mock_server()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pacbench-benchmark-")
+    try:
+        start = time.perf_counter()
+        cwd = make_dataset(workdir, args.scale, tuple(args.image_size), args.seed)
+        print(f"Synthetic dataset (scale {args.scale}) written to {workdir} in {time.perf_counter() - start:.1f}s")
+        print(f"Mock API at {base_url}: {args.latency_dist} latency, median {args.latency_ms:g} ms, "
+              f"{args.throttle_rate:.0%} 429s, {args.error_rate:.0%} 500s")
+
+        summaries = {}
+        for stage in selected:
+            module, extra = stages[stage]
+            argv = ["--base_url", base_url, *extra]
+            if module == "verify_results":
+                argv += ["--disable_verify_memo", "--verify_concurrency", str(args.verify_concurrency),
+                         "--verify_batch_size", str(args.verify_batch_size)]
+            else:
+                argv += ["--concurrency", str(args.concurrency), *shlex.split(args.runner_args)]
+            log_path = os.path.join(workdir, f"{stage.replace(':', '_')}.log")
+            print(f"Running {stage}...", flush=True)
+            summaries[stage] = summarize_stage(run_stage(module, argv, cwd, log_path))
+            if summaries[stage].get("error"):
+                print(f"  {stage} failed: {summaries[stage]['error']} (log: {log_path})")
+
+        print_report(summaries, mock_stats())
+        settings = {k: v for k, v in vars(args).items() if k not in ("workdir", "output", "baseline")}
+        if args.baseline:
+            with open(args.baseline) as f:
+                print_comparison(summaries, json.load(f), settings)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"settings": settings, "stages": summaries}, f, indent=2)
+            print(f"\nResults saved to: {args.output}")
+    finally:
+        server.shutdown()
+        server.server_close()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if any(summary.get("error") for summary in summaries.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
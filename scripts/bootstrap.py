@@ -0,0 +1,53 @@
+import numpy as np
+
+DEFAULT_REPLICATES = 1000
+CONFIDENCE = 0.95
+
+
+def _percentiles(replicates, confidence):
+    alpha = (1 - confidence) / 2
+    return np.quantile(replicates, [alpha, 1 - alpha], axis=1)
+
+
+def accuracy_intervals(totals, corrects, replicates=DEFAULT_REPLICATES, rng=None, confidence=CONFIDENCE):
+    """Percentile bootstrap intervals (in %) for many accuracies at once.
+
+    Resampling n rows with replacement and counting the CORRECT ones is exactly
+    a Binomial(n, correct / n) draw, so all replicates for all groups come from
+    one (groups, replicates) binomial matrix instead of resampling rows in a
+    loop. Returns (low, high) arrays; groups with no rows get (0, 0).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    totals = np.asarray(totals, dtype=np.int64)
+    corrects = np.asarray(corrects, dtype=np.int64)
+    safe_totals = np.maximum(totals, 1)
+
+    draws = rng.binomial(totals[:, None], (corrects / safe_totals)[:, None], size=(len(totals), replicates))
+    return _percentiles(draws / safe_totals[:, None] * 100, confidence)
+
+
+def paired_intervals(outcomes, replicates=DEFAULT_REPLICATES, rng=None, confidence=CONFIDENCE):
+    """Paired bootstrap of the accuracy difference between a run and a baseline.
+
+    outcomes is a (groups, 3) array counting, per group, the shared items the
+    run got worse on (-1), tied on (0) and improved on (+1) relative to the
+    baseline. Resampling items is a multinomial draw over those three
+    per-item differences, done for every group and replicate in one call.
+    Returns (difference, low, high, p_value) with differences in percentage
+    points of (run - baseline) and a two-sided bootstrap p-value for a
+    difference of zero.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    outcomes = np.asarray(outcomes, dtype=np.int64).reshape(-1, 3)
+    items = outcomes.sum(axis=1)
+    safe_items = np.maximum(items, 1)
+
+    pvals = outcomes / safe_items[:, None]
+    pvals[items == 0] = [0, 1, 0]
+    draws = rng.multinomial(items[:, None], pvals[:, None, :], size=(len(items), replicates))
+    diffs = (draws[..., 2] - draws[..., 0]) / safe_items[:, None] * 100
+
+    difference = (outcomes[:, 2] - outcomes[:, 0]) / safe_items * 100
+    low, high = _percentiles(diffs, confidence)
+    p_value = np.minimum(1.0, 2 * np.minimum((diffs <= 0).mean(axis=1), (diffs >= 0).mean(axis=1)))
+    return difference, low, high, p_value
@@ -0,0 +1,167 @@
+import io
+import os
+import re
+import csv
+from collections import Counter
+
+# Number of rows written between fsyncs of an evaluation CSV
+CHECKPOINT_BATCH = 20
+
+
+def _read_complete_rows(path):
+    """Read CSV rows from path, ignoring a truncated trailing record.
+
+    Returns (rows, valid_bytes) where valid_bytes is the length of the prefix of
+    the file that holds complete records only.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    consumed = 0
+    last_line_complete = True
+
+    def lines():
+        nonlocal consumed, last_line_complete
+        for line in io.BytesIO(data):
+            consumed += len(line)
+            last_line_complete = line.endswith(b"\n")
+            yield line.decode("utf-8", errors="replace")
+
+    rows = []
+    valid_bytes = 0
+    reader = csv.reader(lines())
+    try:
+        for row in reader:
+            if not last_line_complete or (rows and len(row) != len(rows[0])):
+                break
+            rows.append(row)
+            valid_bytes = consumed
+    except csv.Error:
+        pass
+
+    return rows, valid_bytes
+
+
+def _rewrite(path, rows, lineterminator):
+    """Replace the file at path by rows, atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="") as f:
+        csv.writer(f, lineterminator=lineterminator).writerows(rows)
+        sync(f)
+    os.replace(tmp_path, path)
+
+
+def open_results(output_csv, header, key_columns, resume=False, lineterminator="\r\n", redo=None):
+    """Open an evaluation CSV for writing.
+
+    Without resume, the file is truncated and the header written. With resume,
+    an existing file is kept, any partially written last record is cut off,
+    and the file is opened for appending. lineterminator is used for the
+    header and should match the writer used for the rows. With resume, rows
+    for which redo({column: text}) is true are removed from the file so they
+    are processed again. Returns (outfile, completed) where completed counts
+    the key tuples (values of key_columns) already present.
+    """
+    completed = Counter()
+
+    if resume and os.path.exists(output_csv):
+        rows, valid_bytes = _read_complete_rows(output_csv)
+        if rows:
+            if rows[0] != header:
+                raise ValueError(
+                    f"Cannot resume {output_csv}: header {rows[0]} does not match expected {header}"
+                )
+            if valid_bytes < os.path.getsize(output_csv):
+                print(f"Discarding truncated last record in {output_csv}")
+                with open(output_csv, "r+b") as f:
+                    f.truncate(valid_bytes)
+
+            if redo is not None:
+                kept = [row for row in rows[1:] if not redo(dict(zip(header, row)))]
+                if len(kept) < len(rows) - 1:
+                    print(f"Redoing {len(rows) - 1 - len(kept)} rows of {output_csv}")
+                    rows = [header] + kept
+                    _rewrite(output_csv, rows, lineterminator)
+
+            key_idx = [header.index(c) for c in key_columns]
+            for row in rows[1:]:
+                completed[tuple(row[i] for i in key_idx)] += 1
+
+            print(f"Resuming {output_csv}: {sum(completed.values())} rows already complete")
+            return open(output_csv, "a", newline=""), completed
+
+    outfile = open(output_csv, "w", newline="")
+    csv.writer(outfile, lineterminator=lineterminator).writerow(header)
+    return outfile, completed
+
+
+def read_rows(path):
+    """Return the complete rows (header first) of a results CSV as lists of strings."""
+    rows, _ = _read_complete_rows(path)
+    return rows
+
+
+def read_results(path):
+    """Return the complete rows of an existing results CSV as {column: value} dicts."""
+    if not os.path.exists(path):
+        return []
+    rows, _ = _read_complete_rows(path)
+    return [dict(zip(rows[0], row)) for row in rows[1:]]
+
+
+def csv_text(value):
+    """The text csv.writer writes for value (None as an empty cell)."""
+    return "" if value is None else str(value)
+
+
+def result_writer(outfile, header, on_row=None):
+    """Return a writerow function for outfile.
+
+    When on_row is given, every written row is also handed to it as a
+    {column: text} dict of the cells as written, the same dicts read_results
+    returns for the file (see pipeline.py).
+    """
+    writer = csv.writer(outfile)
+    if on_row is None:
+        return writer.writerow
+
+    def writerow(row):
+        writer.writerow(row)
+        on_row({column: csv_text(value) for column, value in zip(header, row)})
+
+    return writerow
+
+
+def parse_models(models_arg):
+    """Split a comma-separated --models value into a list of model ids."""
+    return [m.strip() for m in models_arg.split(",") if m.strip()]
+
+
+def model_slug(model):
+    """Directory-safe name for a model id (e.g. meta-llama/llama-4-maverick -> meta-llama_llama-4-maverick)."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+
+
+def model_output_path(output_csv, model):
+    """Path of a model's copy of output_csv in a per-model subdirectory of its directory."""
+    return os.path.join(os.path.dirname(output_csv), model_slug(model), os.path.basename(output_csv))
+
+
+def sync(outfile):
+    """Flush an output file all the way to disk."""
+    outfile.flush()
+    os.fsync(outfile.fileno())
+
+
+def checkpointed(outfile, on_result, batch_size=CHECKPOINT_BATCH):
+    """Wrap an on_result callback so outfile is fsynced every batch_size rows."""
+    count = 0
+
+    def write_and_sync(item, responses):
+        nonlocal count
+        on_result(item, responses)
+        count += 1
+        if count % batch_size == 0:
+            sync(outfile)
+
+    return write_and_sync
@@ -0,0 +1,96 @@
+import importlib
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, Timeout
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_POOL_SIZE = 100
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+
+_settings = {
+    "base_url": DEFAULT_BASE_URL,
+    "pool_size": DEFAULT_POOL_SIZE,
+    "keepalive_expiry": DEFAULT_KEEPALIVE_EXPIRY,
+    "http2": False,
+    "connect_timeout": DEFAULT_CONNECT_TIMEOUT,
+    "read_timeout": DEFAULT_READ_TIMEOUT,
+}
+
+
+def configure_clients(base_url=None, pool_size=DEFAULT_POOL_SIZE, keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+                      http2=False, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+    """Set the endpoint and HTTP transport used by make_client / make_async_client.
+
+    Up to pool_size connections are opened per client and all of them are kept
+    alive for keepalive_expiry seconds between requests, so concurrent runs
+    reuse connections instead of repeating TLS setup. base_url overrides the
+    OpenRouter endpoint, e.g. to point at a local stand-in server.
+    """
+    _settings.update(base_url=base_url or DEFAULT_BASE_URL, pool_size=pool_size, keepalive_expiry=keepalive_expiry,
+                     http2=http2, connect_timeout=connect_timeout, read_timeout=read_timeout)
+
+
+def add_client_args(parser):
+    """Register the API endpoint and connection pool command line options on an argparse parser."""
+    parser.add_argument("--base_url", type=str, default=None,
+                        help=f"OpenAI-compatible API endpoint (default: {DEFAULT_BASE_URL})")
+    parser.add_argument("--pool_size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="Maximum open (and kept-alive) connections per client; keep at or above --concurrency")
+    parser.add_argument("--keepalive_expiry", type=float, default=DEFAULT_KEEPALIVE_EXPIRY,
+                        help="Seconds an idle connection is kept open for reuse")
+    parser.add_argument("--http2", action="store_true",
+                        help="Multiplex requests over HTTP/2 connections (requires the h2 package)")
+    parser.add_argument("--connect_timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help="Seconds allowed to establish a connection")
+    parser.add_argument("--read_timeout", type=float, default=DEFAULT_READ_TIMEOUT,
+                        help="Seconds allowed for each read, write or wait for a pooled connection")
+
+
+def configure_clients_from_args(args):
+    """Configure clients from options registered with add_client_args."""
+    configure_clients(args.base_url, args.pool_size, args.keepalive_expiry, args.http2,
+                      args.connect_timeout, args.read_timeout)
+
+
+def _timeout():
+    return Timeout(_settings["read_timeout"], connect=_settings["connect_timeout"])
+
+
+def _limits(**kwargs):
+    """Connection limits of the HTTP library the installed openai is built on (httpx, or httpx2 in later releases)."""
+    http = importlib.import_module(DefaultHttpxClient.__mro__[1].__module__.partition(".")[0])
+    return http.Limits(**kwargs)
+
+
+def _transport_kwargs():
+    if _settings["http2"]:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            raise ImportError("h2 is required for --http2 (pip install h2)")
+
+    pool_size = _settings["pool_size"]
+    return dict(
+        limits=_limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                       keepalive_expiry=_settings["keepalive_expiry"]),
+        timeout=_timeout(),
+        http2=_settings["http2"],
+    )
+
+
+def make_client(api_key):
+    """Create an OpenAI client on the configured endpoint with a pooled HTTP transport.
+
+    The client is safe to share across threads.
+    """
+    return OpenAI(base_url=_settings["base_url"], api_key=api_key, timeout=_timeout(),
+                  http_client=DefaultHttpxClient(**_transport_kwargs()))
+
+
+def make_async_client(api_key):
+    """Create an AsyncOpenAI client on the configured endpoint with a pooled HTTP transport.
+
+    Like any AsyncOpenAI client it must only be used from one event loop.
+    """
+    return AsyncOpenAI(base_url=_settings["base_url"], api_key=api_key, timeout=_timeout(),
+                       http_client=DefaultAsyncHttpxClient(**_transport_kwargs()))
@@ -1,3 +1,20 @@
+import os
+
+# Dataset layout, relative to the scripts/ directory
+DATA_ROOT = "../pacbench"
+GROUND_TRUTH_DIR = os.path.join(DATA_ROOT, "ground_truth")
+OPEN_IMAGES_DIR = os.path.join(DATA_ROOT, "open_images")
+ROBOCASA_OBJECTS_DIR = os.path.join(DATA_ROOT, "robocasa_objects/object_views")
+HUMANOID_IMAGES_DIR = os.path.join(DATA_ROOT, "humanoid/captured_images")
+CONSTRAINT_IMAGES_DIR = os.path.join(DATA_ROOT, "constraint_images")
+
+SYN_PROPERTIES_GT = os.path.join(GROUND_TRUTH_DIR, "syn_properties.psv")
+ROBO_PROPERTIES_GT = os.path.join(GROUND_TRUTH_DIR, "robo_properties.psv")
+SYN_AFFORDANCE_GT = os.path.join(GROUND_TRUTH_DIR, "syn_affordance.psv")
+ROBO_AFFORDANCES_GT = os.path.join(GROUND_TRUTH_DIR, "robo_affordances.psv")
+SYN_CONSTRAINTS_GT = os.path.join(GROUND_TRUTH_DIR, "syn_constraints.psv")
+ROBO_CONSTRAINTS_GT = os.path.join(GROUND_TRUTH_DIR, "robo_constraints.psv")
+
 property_ground_files = [
     "property_CAPACITY_.csv", "property_COLOR_.csv", "property_COMPLEXITY_.csv",
     "property_CONSUMABILITY_.csv", "property_CONTENTS_.csv", "property_DENSITY_.csv",
@@ -18,4 +35,14 @@ PROPERTY_MCQ_OPTIONS = {
     "DENSITY": ["High-density: Dense, Compact", "Low-density: Lightweight, Buoyant", "Variable: Adjustable, Fluid"],
     "THICKNESS": ["Thin: Slim, Minimal Thickness", "Medium: Standard Thickness, Balanced", "Thick: Sturdy, Bulky"],
     "STICKINESS": ["Sticky: Adhesive, Tacky", "Non-sticky: Smooth, Slippery", "Variable: Temporary Stickiness, Conditional Adhesion"],
-}
\ No newline at end of file
+}
+# USD per million (input, output) tokens, used by planner.py to estimate the
+# cost of a run. List prices change; update them from the provider's model page
+MODEL_PRICES = {
+    "meta-llama/llama-4-maverick": (0.15, 0.60),
+    "meta-llama/llama-4-scout": (0.08, 0.30),
+    "qwen/qwen2.5-vl-72b-instruct": (0.25, 0.75),
+    "google/gemini-2.0-flash-001": (0.10, 0.40),
+    "openai/gpt-4o-mini": (0.15, 0.60),
+    "openai/gpt-4o": (2.50, 10.00),
+}
@@ -0,0 +1,328 @@
+import io
+import os
+import time
+import asyncio
+import threading
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from utils import encode_single_image, encode_multi_image, aquery_encoded
+from preprocess import configure_preprocessing, preprocessing_options, preprocessing_enabled
+import payload_store
+from checkpoint import open_results, result_writer, checkpointed, sync, model_output_path
+from sharding import shard_items
+from instrumentation import event_labels
+
+DEFAULT_CONCURRENCY = 8
+
+# How many work items (per allowed in-flight request) may be scheduled ahead of
+# the one currently being written. Bounds memory on very large datasets.
+LOOKAHEAD_FACTOR = 4
+
+# Worker processes reading, preprocessing and base64 encoding images (0: on the event loop thread)
+DEFAULT_PREPARE_WORKERS = 0
+
+_local = threading.local()
+_prefetch = {"workers": 0, "window": None, "pool": None}
+
+# Busy time of each stage, and the time it could have been busy (wall time
+# times its workers or request slots), summed over every run_model_sweep call
+_stage_stats = {"items": 0, "requests": 0, "failed": 0, "wall_seconds": 0.0, "prepare_seconds": 0.0, "prepare_capacity": 0.0,
+                "request_seconds": 0.0, "request_capacity": 0.0, "write_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def image_query(prompt, image_path):
+    """Describe a single-image request for the engine."""
+    return {"prompt": prompt, "image": image_path}
+
+
+def multi_image_query(prompt, image_paths):
+    """Describe a multi-image request for the engine."""
+    return {"prompt": prompt, "images": list(image_paths)}
+
+
+def _prepare_query(query):
+    """Encode a query's images once; returns (prompt, image_urls) or a literal response."""
+    # Plain strings are precomputed answers (e.g. "Missing cam0") and cost no request
+    if isinstance(query, str):
+        return query
+
+    if "images" in query:
+        image_urls, error = encode_multi_image(query["images"])
+    else:
+        image_urls, error = encode_single_image(query["image"])
+    return error or (query["prompt"], image_urls)
+
+
+def _prepare_queries(queries):
+    """Prepare every query of an item; returns (prepared queries, seconds spent)."""
+    start = time.perf_counter()
+    prepared = [_prepare_query(q) for q in queries]
+    return prepared, time.perf_counter() - start
+
+
+def _init_prepare_worker(options, store_path):
+    """Apply the parent's preprocessing settings and payload store in a pool worker."""
+    configure_preprocessing(**options)
+    if store_path:
+        with contextlib.redirect_stdout(io.StringIO()):
+            payload_store.load_payload_store(store_path)
+
+
+def configure_prefetch(workers=DEFAULT_PREPARE_WORKERS, window=None):
+    """Prepare the payloads of upcoming work items in a pool of worker processes.
+
+    Images are read, preprocessed and base64 encoded by `workers` processes
+    (0 encodes them on the event loop thread, between requests) while earlier
+    items are being sent. At most `window` items are scheduled ahead of the
+    oldest one not yet written, which bounds the payloads held in memory
+    (default: LOOKAHEAD_FACTOR per request slot, and two per worker). Call it
+    after preprocessing and the payload store are configured, since workers
+    start with those settings. No pool is started while a payload store is
+    loaded and preprocessing is off: payloads are then mmap slices, which
+    workers would only copy and pickle back.
+    """
+    close_prefetch()
+    pool = None
+    if workers and payload_store.loaded_store_path() and not preprocessing_enabled():
+        print("Payload store loaded, preparing payloads on the event loop thread instead of worker processes")
+        workers = 0
+    if workers:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_prepare_worker,
+                                   initargs=(preprocessing_options(), payload_store.loaded_store_path()))
+        # Start the workers now, before the caller starts threads of its own
+        pool.submit(int).result()
+    _prefetch.update(workers=workers, window=window, pool=pool)
+
+
+def add_prefetch_args(parser):
+    """Register the payload preparation command line options on an argparse parser."""
+    parser.add_argument("--prepare_workers", type=int, default=DEFAULT_PREPARE_WORKERS,
+                        help="Processes reading and encoding images ahead of the requests "
+                             "(default 0: encode inline; not used with a payload store)")
+    parser.add_argument("--prefetch_window", type=int, default=None,
+                        help="Work items prepared ahead of the oldest unwritten one (default: "
+                             f"{LOOKAHEAD_FACTOR} per in-flight request and 2 per prepare worker)")
+
+
+def configure_prefetch_from_args(args):
+    """Configure payload preparation from options registered with add_prefetch_args."""
+    configure_prefetch(args.prepare_workers, args.prefetch_window)
+
+
+def close_prefetch():
+    """Stop the prepare workers, if any."""
+    if _prefetch["pool"] is not None:
+        _prefetch["pool"].shutdown()
+    _prefetch.update(workers=0, pool=None)
+
+
+def _add_stats(**amounts):
+    with _stats_lock:
+        for key, amount in amounts.items():
+            _stage_stats[key] += amount
+
+
+async def _prepare_item(item):
+    pool = _prefetch["pool"]
+    if pool is None:
+        prepared, seconds = _prepare_queries(item["queries"])
+    else:
+        prepared, seconds = await asyncio.get_running_loop().run_in_executor(pool, _prepare_queries, item["queries"])
+    _add_stats(items=1, prepare_seconds=seconds)
+    return prepared
+
+
+async def _run_query(client, model, prepared, semaphore):
+    if isinstance(prepared, str):
+        return prepared
+
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            return await aquery_encoded(client, model, *prepared)
+        finally:
+            _add_stats(requests=1, request_seconds=time.perf_counter() - start)
+
+
+async def _run_item(client, models, item, semaphore):
+    """Send an item's queries to every model, encoding each query's images only once.
+
+    A model whose request failed (after ratelimit's retries) maps to the exception.
+    """
+    prepared = await _prepare_item(item)
+    results = await asyncio.gather(*(
+        asyncio.gather(*(_run_query(client, model, p, semaphore) for p in prepared)) for model in models
+    ), return_exceptions=True)
+    return dict(zip(models, results))
+
+
+async def _run_work_items(client, jobs, on_results, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    workers = _prefetch["workers"]
+    window = _prefetch["window"] or max(1, concurrency * LOOKAHEAD_FACTOR, 2 * workers)
+    pending = deque()
+    start = time.perf_counter()
+    write_seconds = 0.0
+    failed = 0
+
+    def write(done_item, results):
+        nonlocal write_seconds, failed
+        for model, error in results.items():
+            if isinstance(error, Exception):
+                failed += 1
+                print(f"Request for {done_item['key']} to {model} failed, not written: {error}")
+        results = {model: r for model, r in results.items() if not isinstance(r, Exception)}
+        if not results:
+            return
+        write_start = time.perf_counter()
+        on_results(done_item, results)
+        write_seconds += time.perf_counter() - write_start
+
+    try:
+        for item, models in jobs:
+            pending.append((item, asyncio.ensure_future(_run_item(client, models, item, semaphore))))
+            if len(pending) >= window:
+                done_item, task = pending.popleft()
+                write(done_item, await task)
+
+        while pending:
+            done_item, task = pending.popleft()
+            write(done_item, await task)
+        return failed
+    finally:
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+        wall = time.perf_counter() - start
+        _add_stats(wall_seconds=wall, write_seconds=write_seconds, failed=failed,
+                   prepare_capacity=wall * max(1, workers), request_capacity=wall * concurrency)
+
+
+def run_model_sweep(client, jobs, on_results, concurrency=DEFAULT_CONCURRENCY):
+    """Run (item, models) jobs concurrently and hand results back in input order.
+
+    Each item's images are encoded once and the same payload is sent to every
+    model listed for it. ``on_results(item, {model: responses})`` is called
+    once per job, in the order the jobs were produced, for the models whose
+    requests succeeded; failed requests are reported instead, and their count
+    is returned. ``client`` must be an AsyncOpenAI instance used only from the
+    calling thread; at most ``concurrency`` requests are in flight across all
+    models.
+    """
+    # A single loop is kept per thread so one AsyncOpenAI client (and its
+    # connection pool) can be reused across datasets run on that thread.
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(_run_work_items(client, jobs, on_results, concurrency))
+
+
+def run_work_items(client, model, items, on_result, concurrency=DEFAULT_CONCURRENCY):
+    """Run work items concurrently and hand results back in input order.
+
+    Each item is a dict with a ``queries`` list built from image_query /
+    multi_image_query (or plain strings used verbatim as the response).
+    ``on_result(item, responses)`` is called once per item whose requests
+    succeeded, in the order the items were produced, with one response per query.
+    Returns the number of items whose requests failed. ``client`` must be an
+    AsyncOpenAI instance used only from the calling thread; at most
+    ``concurrency`` requests are in flight.
+    """
+    jobs = ((item, [model]) for item in items)
+    return run_model_sweep(client, jobs, lambda item, results: on_result(item, results[model]), concurrency)
+
+
+def evaluate_items(client, model_name, items, output_csv, header, key_columns, make_row,
+                   concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None, labels=None):
+    """Evaluate work items and append one row per item to the output CSV.
+
+    make_row(item, responses) returns the row for one model's responses;
+    key_columns identify items already done when resuming, and on_row is
+    passed to result_writer. model_name may also be a list of models: the
+    items are then built once, each payload is encoded once and sent to every
+    model, and each model's rows go to its own CSV (see model_output_path).
+    With resume, a model is only sent the items missing from its own CSV.
+    Items whose request failed after all retries get no row, so resuming
+    retries them; their count (one per model) is returned, so callers can
+    treat the output as incomplete.
+    With a shard configured (see sharding.py), only that shard's items are evaluated.
+    labels (e.g. task and dataset) are attached to the instrumentation event
+    of every request.
+    """
+    sweep = not isinstance(model_name, str)
+    models = list(model_name) if sweep else [model_name]
+    paths = {model: model_output_path(output_csv, model) if sweep else output_csv for model in models}
+    outputs = {}
+
+    try:
+        for model in models:
+            os.makedirs(os.path.dirname(paths[model]) or ".", exist_ok=True)
+            outfile, completed = open_results(paths[model], header, key_columns, resume)
+            writerow = result_writer(outfile, header, on_row)
+
+            def write_result(item, responses, model=model, writerow=writerow):
+                if sweep:
+                    print(f"[{model}]", end=" ")
+                writerow(make_row(item, responses))
+
+            outputs[model] = (outfile, completed, checkpointed(outfile, write_result))
+
+        def jobs():
+            for item in shard_items(items):
+                pending_models = []
+                for model in models:
+                    completed = outputs[model][1]
+                    if completed[item["key"]] > 0:
+                        completed[item["key"]] -= 1
+                    else:
+                        pending_models.append(model)
+                if pending_models:
+                    yield item, pending_models
+
+        def on_results(item, results):
+            for model, responses in results.items():
+                outputs[model][2](item, responses)
+
+        with event_labels(stage="evaluation", **(labels or {})):
+            failed = run_model_sweep(client, jobs(), on_results, concurrency)
+        for outfile, _, _ in outputs.values():
+            sync(outfile)
+    finally:
+        for outfile, _, _ in outputs.values():
+            outfile.close()
+
+    if sweep:
+        for model in models:
+            print(f"  {model}: {paths[model]}")
+    return failed
+
+
+def stage_stats():
+    """Return a copy of the per-stage busy time counters."""
+    with _stats_lock:
+        return dict(_stage_stats)
+
+
+def print_stage_stats():
+    """Print how busy the prepare, request and write stages were (no-op when nothing was evaluated)."""
+    stats = stage_stats()
+    if not stats["wall_seconds"]:
+        return
+
+    def share(busy, capacity):
+        return f"{busy / capacity * 100:.0f}%" if capacity else "n/a"
+
+    workers = _prefetch["workers"]
+    print(f"\nStages: {stats['items']} items, {stats['requests']} requests "
+          f"({stats['wall_seconds']:.1f}s of evaluation time)")
+    print(f"  Prepare: {stats['prepare_seconds']:.1f}s busy, "
+          f"{share(stats['prepare_seconds'], stats['prepare_capacity'])} of "
+          + (f"{workers} worker process{'es' if workers > 1 else ''}" if workers else "the event loop thread"))
+    print(f"  Requests: {stats['request_seconds']:.1f}s busy, "
+          f"{share(stats['request_seconds'], stats['request_capacity'])} of the request slots")
+    print(f"  Write: {stats['write_seconds']:.1f}s busy, "
+          f"{share(stats['write_seconds'], stats['wall_seconds'])} of the wall time")
+    if stats["failed"]:
+        print(f"  Failed: {stats['failed']} items not written after retries; rerun with --resume to retry them")
@@ -1,245 +1,351 @@
 import os
 import pandas as pd
 import argparse
+import numpy as np
 from tabulate import tabulate
+from bootstrap import DEFAULT_REPLICATES, accuracy_intervals, paired_intervals
+from checkpoint import parse_models, model_slug
 
+# (task, verification CSV, per-type column) for every task summarized
+TASK_FILES = [
+    ('Properties', "property_verification_results.csv", 'property_type'),
+    ('Affordances', "affordance_verification_results.csv", None),
+    ('Constraints', "constraint_verification_results.csv", 'constraint_type'),
+]
 
-def generate_property_summary(verification_csv):
-    """Generate property accuracy summary table."""
+# Columns that identify the same item across two verification runs
+PAIR_KEY_COLUMNS = ['source_file', 'identifier', 'camera']
+
+# Labels the per-call events (see instrumentation.py) are summarized by
+EVENT_GROUP_COLUMNS = ['stage', 'task', 'dataset', 'model']
+
+
+def load_verification_results(verification_csv):
+    """Read a verification CSV once and flag its CORRECT rows."""
     df = pd.read_csv(verification_csv)
-    
-    if 'property_type' not in df.columns:
-        print("Warning: property_type column not found. Re-run verify_results.py with updated version.")
+    df['is_correct'] = df['verification'] == 'CORRECT'
+    return df
+
+
+def load_task_results(eval_dir):
+    """Load every verification CSV present in eval_dir once, as {task: (df, type_column)}."""
+    frames = {}
+    for task, filename, type_column in TASK_FILES:
+        path = os.path.join(eval_dir, filename)
+        if os.path.exists(path):
+            frames[task] = (load_verification_results(path), type_column)
+    return frames
+
+
+def summarize_results(eval_dir):
+    """Load and summarize every verification CSV in eval_dir, as {task: summary}."""
+    return {task: summarize_task(df, type_column) for task, (df, type_column) in load_task_results(eval_dir).items()}
+
+
+def summarize_task(df, type_column=None):
+    """Aggregate one task's verification rows for every summary table in a single pass.
+
+    Rows are grouped once by (type_column, camera), where those columns exist;
+    the per-type, per-camera and overall counts are then rolled up from that
+    small group table instead of re-filtering df for each group. Returns a
+    dict with 'overall' as (total, correct) and 'by_type' / 'by_camera' as
+    DataFrames of size/sum counts (None when the column is missing).
+    """
+    columns = [c for c in (type_column, 'camera') if c is not None and c in df.columns]
+    if columns:
+        counts = df.groupby(columns, dropna=False)['is_correct'].agg(['size', 'sum'])
+    else:
+        counts = pd.DataFrame({'size': [len(df)], 'sum': [df['is_correct'].sum()]})
+
+    summary = {
+        'overall': (int(counts['size'].sum()), int(counts['sum'].sum())),
+        'by_type': None,
+        'by_camera': None,
+    }
+    for name, column, sort_key in (('by_type', type_column, None), ('by_camera', 'camera', str)):
+        if column in columns:
+            rolled = counts.groupby(level=columns.index(column)).sum()
+            if sort_key is not None:
+                rolled = rolled.sort_index(key=lambda index: index.map(sort_key))
+            summary[name] = rolled
+    return summary
+
+
+def accuracy_row(label_column, label, total, correct):
+    """One summary table row with accuracy formatted as a percentage."""
+    accuracy = (correct / total * 100) if total > 0 else 0
+    return {
+        label_column: label,
+        'Total': int(total),
+        'Correct': int(correct),
+        'Accuracy (%)': f"{accuracy:.2f}"
+    }
+
+
+def accuracy_rows(label_column, counts, label_format=None):
+    """Summary rows for each group in a by_type / by_camera count table."""
+    return [
+        accuracy_row(label_column, label if label_format is None else label_format.format(label), total, correct)
+        for label, total, correct in zip(counts.index, counts['size'], counts['sum'])
+    ]
+
+
+def add_confidence_intervals(table, replicates, rng):
+    """Append bootstrap CI columns for the Total/Correct counts of every row of a summary table."""
+    if table is None or table.empty or replicates <= 0:
+        return table
+    low, high = accuracy_intervals(table['Total'], table['Correct'], replicates, rng)
+    table['CI Low (%)'] = [f"{x:.2f}" for x in low]
+    table['CI High (%)'] = [f"{x:.2f}" for x in high]
+    return table
+
+
+def paired_outcomes(df, baseline_df, type_column=None):
+    """Match items of two verification runs and count per-item differences.
+
+    Items are matched on PAIR_KEY_COLUMNS (plus type_column), with repeated
+    keys paired in file order. Returns a DataFrame indexed by group (each
+    type, then OVERALL) with the paired item count, both accuracies and the
+    worse/tie/better counts expected by paired_intervals.
+    """
+    keys = [c for c in PAIR_KEY_COLUMNS + [type_column] if c is not None and c in df.columns and c in baseline_df.columns]
+    frames = []
+    for frame in (df, baseline_df):
+        frame = frame[keys + ['is_correct']].copy()
+        frame['occurrence'] = frame.groupby(keys, dropna=False).cumcount() if keys else np.arange(len(frame))
+        frames.append(frame)
+    merged = frames[0].merge(frames[1], on=keys + ['occurrence'], suffixes=('', '_baseline'))
+    merged['outcome'] = merged['is_correct'].astype(int) - merged['is_correct_baseline'].astype(int)
+    for label, value in (('worse', -1), ('tie', 0), ('better', 1)):
+        merged[label] = merged['outcome'] == value
+
+    columns = ['is_correct', 'is_correct_baseline', 'worse', 'tie', 'better']
+    overall = merged[columns].sum().to_frame('OVERALL').T
+    overall['items'] = len(merged)
+    if type_column in keys:
+        grouped = merged.groupby(type_column)[columns].sum()
+        grouped['items'] = merged.groupby(type_column).size()
+        overall = pd.concat([grouped, overall])
+    return overall
+
+
+def generate_paired_comparison(frames, baseline_frames, replicates, rng):
+    """Paired accuracy differences (run - baseline) for every task and type present in both runs."""
+    counts = []
+    for task, (df, type_column) in frames.items():
+        if task in baseline_frames:
+            outcomes = paired_outcomes(df, baseline_frames[task][0], type_column)
+            counts.append(outcomes.assign(task=task))
+    if not counts:
         return None
-    
-    # Calculate accuracy by property type
-    summary = []
-    property_types = df['property_type'].unique()
-    
-    for prop_type in sorted(property_types):
-        prop_data = df[df['property_type'] == prop_type]
-        total = len(prop_data)
-        correct = len(prop_data[prop_data['verification'] == 'CORRECT'])
-        accuracy = (correct / total * 100) if total > 0 else 0
-        
-        summary.append({
-            'Property': prop_type,
-            'Total': total,
-            'Correct': correct,
-            'Accuracy (%)': f"{accuracy:.2f}"
-        })
-    
-    # Add overall accuracy
-    total_all = len(df)
-    correct_all = len(df[df['verification'] == 'CORRECT'])
-    accuracy_all = (correct_all / total_all * 100) if total_all > 0 else 0
-    
-    summary.append({
-        'Property': 'OVERALL',
-        'Total': total_all,
-        'Correct': correct_all,
-        'Accuracy (%)': f"{accuracy_all:.2f}"
+
+    counts = pd.concat(counts)
+    difference, low, high, p_value = paired_intervals(counts[['worse', 'tie', 'better']].to_numpy(), replicates, rng)
+    items = np.maximum(counts['items'].to_numpy(), 1)
+    return pd.DataFrame({
+        'Task': counts['task'].to_numpy(),
+        'Group': counts.index,
+        'Paired Items': counts['items'].to_numpy(),
+        'Accuracy (%)': [f"{x:.2f}" for x in counts['is_correct'].to_numpy() / items * 100],
+        'Baseline Accuracy (%)': [f"{x:.2f}" for x in counts['is_correct_baseline'].to_numpy() / items * 100],
+        'Difference (pp)': [f"{x:.2f}" for x in difference],
+        'CI Low (pp)': [f"{x:.2f}" for x in low],
+        'CI High (pp)': [f"{x:.2f}" for x in high],
+        'p-value': [f"{x:.4f}" for x in p_value],
     })
-    
-    return pd.DataFrame(summary)
 
 
-def generate_property_by_camera_summary(verification_csv):
+def generate_property_summary(summary):
+    """Generate property accuracy summary table."""
+    if summary['by_type'] is None:
+        print("Warning: property_type column not found. Re-run verify_results.py with updated version.")
+        return None
+
+    rows = accuracy_rows('Property', summary['by_type'])
+    rows.append(accuracy_row('Property', 'OVERALL', *summary['overall']))
+    return pd.DataFrame(rows)
+
+
+def generate_property_by_camera_summary(summary):
     """Generate property accuracy by camera view."""
-    df = pd.read_csv(verification_csv)
-    
-    if 'camera' not in df.columns:
+    if summary['by_camera'] is None:
         return None
-    
-    summary = []
-    cameras = df['camera'].dropna().unique()
-    
-    for camera in sorted(cameras, key=str):
-        cam_data = df[df['camera'] == camera]
-        total = len(cam_data)
-        correct = len(cam_data[cam_data['verification'] == 'CORRECT'])
-        accuracy = (correct / total * 100) if total > 0 else 0
-        
-        summary.append({
-            'Camera': camera,
-            'Total': total,
-            'Correct': correct,
-            'Accuracy (%)': f"{accuracy:.2f}"
-        })
-    
-    return pd.DataFrame(summary)
+    return pd.DataFrame(accuracy_rows('Camera', summary['by_camera']))
 
 
-def generate_constraint_summary(verification_csv):
+def generate_constraint_summary(summary):
     """Generate constraint accuracy summary table."""
-    df = pd.read_csv(verification_csv)
-    
-    if 'constraint_type' not in df.columns:
+    if summary['by_type'] is None:
         print("Warning: constraint_type column not found. Re-run verify_results.py with updated version.")
         return None
-    
-    # Calculate accuracy by constraint type
-    summary = []
-    constraint_types = df['constraint_type'].unique()
-    
-    for const_type in sorted(constraint_types):
-        const_data = df[df['constraint_type'] == const_type]
-        total = len(const_data)
-        correct = len(const_data[const_data['verification'] == 'CORRECT'])
-        accuracy = (correct / total * 100) if total > 0 else 0
-        
-        summary.append({
-            'Constraint Type': const_type,
-            'Total': total,
-            'Correct': correct,
-            'Accuracy (%)': f"{accuracy:.2f}"
-        })
-    
-    # Add overall accuracy
-    total_all = len(df)
-    correct_all = len(df[df['verification'] == 'CORRECT'])
-    accuracy_all = (correct_all / total_all * 100) if total_all > 0 else 0
-    
-    summary.append({
-        'Constraint Type': 'OVERALL',
-        'Total': total_all,
-        'Correct': correct_all,
-        'Accuracy (%)': f"{accuracy_all:.2f}"
-    })
-    
-    return pd.DataFrame(summary)
+
+    rows = accuracy_rows('Constraint Type', summary['by_type'])
+    rows.append(accuracy_row('Constraint Type', 'OVERALL', *summary['overall']))
+    return pd.DataFrame(rows)
 
 
-def generate_constraint_by_camera_summary(verification_csv):
+def generate_constraint_by_camera_summary(summary):
     """Generate constraint accuracy by camera view."""
-    df = pd.read_csv(verification_csv)
-    
-    if 'camera' not in df.columns:
+    if summary['by_camera'] is None:
         return None
-    
-    summary = []
-    cameras = df['camera'].dropna().unique()
-    
-    for camera in sorted(cameras, key=str):
-        cam_data = df[df['camera'] == camera]
-        total = len(cam_data)
-        correct = len(cam_data[cam_data['verification'] == 'CORRECT'])
-        accuracy = (correct / total * 100) if total > 0 else 0
-        
-        summary.append({
-            'Camera': camera,
-            'Total': total,
-            'Correct': correct,
-            'Accuracy (%)': f"{accuracy:.2f}"
-        })
-    
-    return pd.DataFrame(summary)
+    return pd.DataFrame(accuracy_rows('Camera', summary['by_camera']))
 
 
-def generate_affordance_summary(verification_csv):
+def generate_affordance_summary(summary):
     """Generate affordance accuracy summary table."""
-    df = pd.read_csv(verification_csv)
-    
-    # Overall accuracy
-    total = len(df)
-    correct = len(df[df['verification'] == 'CORRECT'])
-    accuracy = (correct / total * 100) if total > 0 else 0
-    
-    summary = [{
-        'Metric': 'Overall Affordance Accuracy',
-        'Total': total,
-        'Correct': correct,
-        'Accuracy (%)': f"{accuracy:.2f}"
-    }]
-    
-    # By camera if available
-    if 'camera' in df.columns:
-        cameras = df['camera'].dropna().unique()
-        for camera in sorted(cameras, key=str):
-            cam_data = df[df['camera'] == camera]
-            total_cam = len(cam_data)
-            correct_cam = len(cam_data[cam_data['verification'] == 'CORRECT'])
-            accuracy_cam = (correct_cam / total_cam * 100) if total_cam > 0 else 0
-            
-            summary.append({
-                'Metric': f'Camera {camera}',
-                'Total': total_cam,
-                'Correct': correct_cam,
-                'Accuracy (%)': f"{accuracy_cam:.2f}"
-            })
-    
-    return pd.DataFrame(summary)
+    rows = [accuracy_row('Metric', 'Overall Affordance Accuracy', *summary['overall'])]
+    if summary['by_camera'] is not None:
+        rows.extend(accuracy_rows('Metric', summary['by_camera'], label_format='Camera {}'))
+    return pd.DataFrame(rows)
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Generate summary tables from verification results")
-    parser.add_argument("--eval_dir", type=str, default="../evaluations",
-                        help="Directory containing verification CSVs")
-    parser.add_argument("--output_dir", type=str, default="../evaluations",
-                        help="Directory to save summary tables")
-    
-    args = parser.parse_args()
-    
-    # File paths
-    property_csv = os.path.join(args.eval_dir, "property_verification_results.csv")
-    affordance_csv = os.path.join(args.eval_dir, "affordance_verification_results.csv")
-    constraint_csv = os.path.join(args.eval_dir, "constraint_verification_results.csv")
+def generate_leaderboard(model_summaries):
+    """Model x task accuracy table from {model: task summaries}, best mean task accuracy first."""
+    rows, means = [], []
+    for model, task_summaries in model_summaries.items():
+        row = {'Model': model}
+        accuracies = []
+        for task, _, _ in TASK_FILES:
+            row[f'{task} (%)'] = ''
+            if task in task_summaries:
+                total, correct = task_summaries[task]['overall']
+                accuracies.append((correct / total * 100) if total > 0 else 0)
+                row[f'{task} (%)'] = f"{accuracies[-1]:.2f}"
+        means.append(sum(accuracies) / len(accuracies) if accuracies else 0)
+        row['Mean (%)'] = f"{means[-1]:.2f}" if accuracies else ''
+        rows.append(row)
+
+    order = sorted(range(len(rows)), key=lambda i: -means[i])
+    return pd.DataFrame([rows[i] for i in order])
+
+
+def write_leaderboard(model_summaries, output_dir):
+    """Print and save the combined model x task leaderboard."""
+    print("\n" + "="*80)
+    print("MODEL LEADERBOARD")
+    print("="*80)
+
+    leaderboard = generate_leaderboard(model_summaries)
+    print(tabulate(leaderboard, headers='keys', tablefmt='grid', showindex=False))
+    leaderboard.to_csv(os.path.join(output_dir, "leaderboard.csv"), index=False)
+    print(f"\nLeaderboard saved to: {os.path.join(output_dir, 'leaderboard.csv')}")
+    print("="*80)
+
+
+def load_events(events_paths):
+    """Read the per-call events written with --events by the runners, verify_results.py, pipeline.py or orchestrate.py."""
+    frames = [pd.read_json(path, lines=True) for path in events_paths if os.path.getsize(path)]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def generate_request_metrics_summary(events):
+    """Calls, failures, latency, bytes and tokens per (stage, task, dataset, model) from the per-call events."""
+    rows = []
+    events = events.fillna({column: '' for column in EVENT_GROUP_COLUMNS})
+    for labels, group in events.groupby(EVENT_GROUP_COLUMNS, sort=True):
+        sent = group[group['status'] != 'cached']
+        failed = sent['status'] != 'ok'
+        rows.append({
+            **dict(zip(['Stage', 'Task', 'Dataset', 'Model'], labels)),
+            'Calls': len(sent),
+            'Cached': len(group) - len(sent),
+            'Failed': int(failed.sum()),
+            'Retries': int(sent['retries'].sum()),
+            'p50 (s)': f"{sent['latency_s'].quantile(0.5):.2f}" if len(sent) else '',
+            'p99 (s)': f"{sent['latency_s'].quantile(0.99):.2f}" if len(sent) else '',
+            'API (s)': f"{sent['provider_s'].sum():.1f}",
+            'Waiting (s)': f"{sent['wait_s'].sum():.1f}",
+            'Sent (MB)': f"{sent['request_bytes'].sum() / 1024 / 1024:.2f}",
+            'Prompt tokens': int(sent['prompt_tokens'].fillna(0).sum()),
+            'Completion tokens': int(sent['completion_tokens'].fillna(0).sum()),
+        })
+    return pd.DataFrame(rows)
+
+
+def write_request_metrics(events_paths, output_dir):
+    """Print and save the request metrics summary of one or more events files."""
+    print("\n" + "="*80)
+    print("REQUEST METRICS")
+    print("="*80)
+
+    events = load_events(events_paths)
+    if events is None:
+        print("No events recorded.")
+        return
+    summary = generate_request_metrics_summary(events)
+    print(tabulate(summary, headers='keys', tablefmt='grid', showindex=False))
+    print("API is time spent waiting on responses (all attempts); Waiting is rate limit waits and retry backoff.")
+    summary.to_csv(os.path.join(output_dir, "request_metrics_summary.csv"), index=False)
+    print(f"\nRequest metrics saved to: {os.path.join(output_dir, 'request_metrics_summary.csv')}")
+    print("="*80)
+
+
+def write_summaries(eval_dir, output_dir, replicates=DEFAULT_REPLICATES, seed=0, compare_dir=None):
+    """Print and save every summary table for the verification CSVs in eval_dir.
+
+    Returns the per-task summaries (see summarize_task) for building a leaderboard.
+    """
+    rng = np.random.default_rng(seed)
     
     print("\n" + "="*80)
     print("GENERATING SUMMARY TABLES")
     print("="*80)
+
+    # Each verification CSV is read and aggregated exactly once
+    task_frames = load_task_results(eval_dir)
+    task_summaries = {task: summarize_task(df, type_column) for task, (df, type_column) in task_frames.items()}
     
     # Property Summary
-    if os.path.exists(property_csv):
+    if 'Properties' in task_summaries:
         print("\n" + "="*80)
         print("PROPERTY EVALUATION SUMMARY")
         print("="*80)
         
-        prop_summary = generate_property_summary(property_csv)
+        prop_summary = add_confidence_intervals(generate_property_summary(task_summaries['Properties']), replicates, rng)
         if prop_summary is not None:
             print("\n### Property Accuracy by Type:")
             print(tabulate(prop_summary, headers='keys', tablefmt='grid', showindex=False))
-            prop_summary.to_csv(os.path.join(args.output_dir, "property_summary.csv"), index=False)
+            prop_summary.to_csv(os.path.join(output_dir, "property_summary.csv"), index=False)
         
-        prop_cam_summary = generate_property_by_camera_summary(property_csv)
+        prop_cam_summary = add_confidence_intervals(generate_property_by_camera_summary(task_summaries['Properties']), replicates, rng)
         if prop_cam_summary is not None:
             print("\n### Property Accuracy by Camera:")
             print(tabulate(prop_cam_summary, headers='keys', tablefmt='grid', showindex=False))
-            prop_cam_summary.to_csv(os.path.join(args.output_dir, "property_by_camera_summary.csv"), index=False)
+            prop_cam_summary.to_csv(os.path.join(output_dir, "property_by_camera_summary.csv"), index=False)
     
     # Affordance Summary
-    if os.path.exists(affordance_csv):
+    if 'Affordances' in task_summaries:
         print("\n" + "="*80)
         print("AFFORDANCE EVALUATION SUMMARY")
         print("="*80)
         
-        aff_summary = generate_affordance_summary(affordance_csv)
+        aff_summary = add_confidence_intervals(generate_affordance_summary(task_summaries['Affordances']), replicates, rng)
         if aff_summary is not None:
             print(tabulate(aff_summary, headers='keys', tablefmt='grid', showindex=False))
-            aff_summary.to_csv(os.path.join(args.output_dir, "affordance_summary.csv"), index=False)
+            aff_summary.to_csv(os.path.join(output_dir, "affordance_summary.csv"), index=False)
     
     # Constraint Summary
-    if os.path.exists(constraint_csv):
+    if 'Constraints' in task_summaries:
         print("\n" + "="*80)
         print("CONSTRAINT EVALUATION SUMMARY")
         print("="*80)
         
-        const_summary = generate_constraint_summary(constraint_csv)
+        const_summary = add_confidence_intervals(generate_constraint_summary(task_summaries['Constraints']), replicates, rng)
         if const_summary is not None:
             print("\n### Constraint Accuracy by Type:")
             print(tabulate(const_summary, headers='keys', tablefmt='grid', showindex=False))
-            const_summary.to_csv(os.path.join(args.output_dir, "constraint_summary.csv"), index=False)
+            const_summary.to_csv(os.path.join(output_dir, "constraint_summary.csv"), index=False)
         
-        const_cam_summary = generate_constraint_by_camera_summary(constraint_csv)
+        const_cam_summary = add_confidence_intervals(generate_constraint_by_camera_summary(task_summaries['Constraints']), replicates, rng)
         if const_cam_summary is not None:
             print("\n### Constraint Accuracy by Camera:")
             print(tabulate(const_cam_summary, headers='keys', tablefmt='grid', showindex=False))
-            const_cam_summary.to_csv(os.path.join(args.output_dir, "constraint_by_camera_summary.csv"), index=False)
+            const_cam_summary.to_csv(os.path.join(output_dir, "constraint_by_camera_summary.csv"), index=False)
     
     print("\n" + "="*80)
     print("SUMMARY TABLES SAVED")
     print("="*80)
-    print(f"Location: {args.output_dir}/")
+    print(f"Location: {output_dir}/")
     print("Files:")
     print("  - property_summary.csv")
     print("  - property_by_camera_summary.csv")
@@ -253,55 +359,72 @@ def main():
     print("OVERALL BENCHMARK SUMMARY")
     print("="*80)
     
-    overall_summary = []
-    
-    # Property accuracy
-    if os.path.exists(property_csv):
-        df_prop = pd.read_csv(property_csv)
-        total_prop = len(df_prop)
-        correct_prop = len(df_prop[df_prop['verification'] == 'CORRECT'])
-        accuracy_prop = (correct_prop / total_prop * 100) if total_prop > 0 else 0
-        overall_summary.append({
-            'Task': 'Properties',
-            'Total': total_prop,
-            'Correct': correct_prop,
-            'Accuracy (%)': f"{accuracy_prop:.2f}"
-        })
-    
-    # Affordance accuracy
-    if os.path.exists(affordance_csv):
-        df_aff = pd.read_csv(affordance_csv)
-        total_aff = len(df_aff)
-        correct_aff = len(df_aff[df_aff['verification'] == 'CORRECT'])
-        accuracy_aff = (correct_aff / total_aff * 100) if total_aff > 0 else 0
-        overall_summary.append({
-            'Task': 'Affordances',
-            'Total': total_aff,
-            'Correct': correct_aff,
-            'Accuracy (%)': f"{accuracy_aff:.2f}"
-        })
-    
-    # Constraint accuracy
-    if os.path.exists(constraint_csv):
-        df_const = pd.read_csv(constraint_csv)
-        total_const = len(df_const)
-        correct_const = len(df_const[df_const['verification'] == 'CORRECT'])
-        accuracy_const = (correct_const / total_const * 100) if total_const > 0 else 0
-        overall_summary.append({
-            'Task': 'Constraints',
-            'Total': total_const,
-            'Correct': correct_const,
-            'Accuracy (%)': f"{accuracy_const:.2f}"
-        })
+    overall_summary = [
+        accuracy_row('Task', task, *summary['overall'])
+        for task, summary in task_summaries.items()
+    ]
     
     if overall_summary:
-        df_overall = pd.DataFrame(overall_summary)
+        df_overall = add_confidence_intervals(pd.DataFrame(overall_summary), replicates, rng)
         print(tabulate(df_overall, headers='keys', tablefmt='grid', showindex=False))
-        df_overall.to_csv(os.path.join(args.output_dir, "overall_benchmark_summary.csv"), index=False)
-        print(f"\nOverall summary saved to: {os.path.join(args.output_dir, 'overall_benchmark_summary.csv')}")
+        df_overall.to_csv(os.path.join(output_dir, "overall_benchmark_summary.csv"), index=False)
+        print(f"\nOverall summary saved to: {os.path.join(output_dir, 'overall_benchmark_summary.csv')}")
     
     print("="*80)
 
+    if compare_dir:
+        print("\n" + "="*80)
+        print(f"PAIRED COMPARISON AGAINST {compare_dir}")
+        print("="*80)
+
+        comparison = generate_paired_comparison(task_frames, load_task_results(compare_dir), replicates, rng)
+        if comparison is None:
+            print("No verification results shared with the baseline directory.")
+        else:
+            print(tabulate(comparison, headers='keys', tablefmt='grid', showindex=False))
+            comparison.to_csv(os.path.join(output_dir, "paired_comparison.csv"), index=False)
+            print(f"\nPaired comparison saved to: {os.path.join(output_dir, 'paired_comparison.csv')}")
+        print("="*80)
+
+    return task_summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate summary tables from verification results")
+    parser.add_argument("--eval_dir", type=str, default="../evaluations",
+                        help="Directory containing verification CSVs")
+    parser.add_argument("--output_dir", type=str, default="../evaluations",
+                        help="Directory to save summary tables")
+    parser.add_argument("--bootstrap", type=int, default=DEFAULT_REPLICATES,
+                        help="Bootstrap replicates for the 95%% confidence intervals (0 disables them)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed for bootstrap resampling")
+    parser.add_argument("--compare_dir", type=str, default=None,
+                        help="Directory with a baseline run's verification CSVs for a paired per-item comparison")
+    parser.add_argument("--models", type=str, default=None,
+                        help="Comma-separated models of a sweep: summarize each model's subdirectory of --eval_dir "
+                             "and write a combined leaderboard")
+    parser.add_argument("--events", type=str, nargs="+", default=None,
+                        help="Events files written with --events (e.g. one per shard) to summarize per task, "
+                             "dataset and model")
+    
+    args = parser.parse_args()
+    if args.events:
+        os.makedirs(args.output_dir, exist_ok=True)
+        write_request_metrics(args.events, args.output_dir)
+    if not args.models:
+        write_summaries(args.eval_dir, args.output_dir, args.bootstrap, args.seed, args.compare_dir)
+        return
+
+    model_summaries = {}
+    for model in parse_models(args.models):
+        output_dir = os.path.join(args.output_dir, model_slug(model))
+        os.makedirs(output_dir, exist_ok=True)
+        compare_dir = os.path.join(args.compare_dir, model_slug(model)) if args.compare_dir else None
+        model_summaries[model] = write_summaries(os.path.join(args.eval_dir, model_slug(model)), output_dir,
+                                                 args.bootstrap, args.seed, compare_dir)
+    write_leaderboard(model_summaries, args.output_dir)
+
 
 if __name__ == "__main__":
     main()
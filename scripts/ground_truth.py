@@ -0,0 +1,79 @@
+import os
+import threading
+import pandas as pd
+
+# String columns with at most this fraction of distinct values are stored as
+# categoricals, so repeated object names, property names and keys are kept once
+CATEGORICAL_MAX_UNIQUE_FRACTION = 0.5
+
+_tables = {}
+_lock = threading.Lock()
+
+
+def _load(path, sep, index_columns):
+    df = pd.read_csv(path, sep=sep)
+    df.columns = [c.strip().lower() for c in df.columns]
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_string_dtype(values) and values.nunique() <= len(df) * CATEGORICAL_MAX_UNIQUE_FRACTION:
+            df[column] = values.astype("category")
+
+    # One namedtuple per row, with a field per column, built once for all iterators
+    table = {"frame": df, "records": list(df.itertuples(index=False, name="Row")), "indexes": {}}
+    for column in index_columns:
+        _build_index(table, column)
+    return table
+
+
+def _build_index(table, column):
+    """Map each value of column (lowercased) to the positions of its rows, in file order."""
+    index = {}
+    for position, value in enumerate(table["frame"][column]):
+        if isinstance(value, str):
+            index.setdefault(value.lower(), []).append(position)
+    table["indexes"][column] = index
+    return index
+
+
+def load_ground_truth(path, sep="|", index_columns=()):
+    """Parse a ground truth file once per process and return it as a table.
+
+    Column names are stripped and lowercased. The parsed table is reused by
+    every later call for the same file until the file changes, and a hash
+    index is built for each of index_columns (see lookup).
+    """
+    key = (os.path.abspath(path), sep, os.stat(path).st_mtime_ns)
+    with _lock:
+        table = _tables.get(key)
+        if table is None:
+            table = _tables[key] = _load(path, sep, index_columns)
+        for column in index_columns:
+            if column not in table["indexes"]:
+                _build_index(table, column)
+    return table
+
+
+def row_count(table):
+    """Number of rows in a table."""
+    return len(table["records"])
+
+
+def iter_rows(table, limit=None):
+    """Iterate over the first limit rows (all rows if None) as namedtuples with one field per column."""
+    records = table["records"]
+    return iter(records[:limit] if limit else records)
+
+
+def rows_at(table, positions):
+    """Iterate over the rows at positions, in the given order."""
+    records = table["records"]
+    return (records[position] for position in positions)
+
+
+def lookup(table, column, value):
+    """Positions of the rows whose column equals value, ignoring case."""
+    index = table["indexes"].get(column)
+    if index is None:
+        with _lock:
+            index = table["indexes"].get(column) or _build_index(table, column)
+    return index.get(value.lower(), [])
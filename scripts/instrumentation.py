@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import contextvars
+from collections import defaultdict
+
+# Upper bounds (seconds) of the request latency histogram buckets in the Prometheus export
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# The Prometheus textfile is rewritten at most this often while events are recorded
+PROMETHEUS_INTERVAL = 15.0
+
+# Labels of every event and Prometheus series, set with event_labels
+LABELS = ("stage", "task", "dataset", "model")
+
+_settings = {"events_path": None, "prometheus_path": None}
+_state = {"file": None, "written_at": 0.0}
+# Prometheus aggregates per label tuple (LABELS + status for the counters)
+_totals = defaultdict(lambda: {"requests": 0, "retries": 0, "request_bytes": 0, "prompt_tokens": 0,
+                               "completion_tokens": 0})
+_latency = defaultdict(lambda: {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0})
+_lock = threading.Lock()
+_labels = contextvars.ContextVar("instrumentation_labels", default={})
+
+
+def configure_instrumentation(events_path=None, prometheus_path=None):
+    """Record one event per API call to events_path (JSONL) and/or aggregate metrics to a Prometheus textfile.
+
+    Events are appended, so a resumed run adds to the same file. Without
+    either path nothing is recorded.
+    """
+    close_instrumentation()
+    with _lock:
+        _settings.update(events_path=events_path, prometheus_path=prometheus_path)
+        if events_path:
+            os.makedirs(os.path.dirname(events_path) or ".", exist_ok=True)
+            _state["file"] = open(events_path, "a", buffering=1)
+
+
+def add_instrumentation_args(parser):
+    """Register the --events and --prometheus_textfile command line options on an argparse parser."""
+    parser.add_argument("--events", type=str, default=None,
+                        help="Append one JSON line per API call (latency, bytes, tokens, status, retries) to this file; "
+                             "summarize it with generate_performance.py --events")
+    parser.add_argument("--prometheus_textfile", type=str, default=None,
+                        help="Write request metrics in the Prometheus text format to this file "
+                             "(e.g. for the node exporter's textfile collector)")
+
+
+def configure_instrumentation_from_args(args):
+    """Configure instrumentation from the options registered with add_instrumentation_args."""
+    configure_instrumentation(args.events, args.prometheus_textfile)
+
+
+def instrumentation_enabled():
+    """Whether calls are being recorded."""
+    return bool(_settings["events_path"] or _settings["prometheus_path"])
+
+
+@contextlib.contextmanager
+def event_labels(**labels):
+    """Label the calls made in this block (and in asyncio tasks it starts), e.g. with task and dataset."""
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def _request_size(kwargs):
+    """Bytes of prompt text and encoded images in a chat completion request, and its image count."""
+    size = images = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            size += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "image_url":
+                size += len(part["image_url"]["url"])
+                images += 1
+            else:
+                size += len(part.get("text", ""))
+    return size, images
+
+
+def call_status(error):
+    """The status of a failed call: its HTTP status code, or the exception class for connection errors."""
+    status = getattr(error, "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+
+def record_call(kwargs, latency, provider_seconds, retries, resp=None, error=None):
+    """Record one chat completion call as made by ratelimit.create / acreate.
+
+    latency is the whole call, provider_seconds the part spent waiting on the
+    API (all attempts); the rest was spent in rate limit waits and backoff.
+    """
+    if not instrumentation_enabled():
+        return
+    usage = getattr(resp, "usage", None)
+    request_bytes, images = _request_size(kwargs)
+    event = {
+        "time": round(time.time(), 3),
+        **{label: _labels.get().get(label) for label in LABELS},
+        "model": kwargs.get("model"),
+        "status": "ok" if error is None else call_status(error),
+        "latency_s": round(latency, 4),
+        "provider_s": round(provider_seconds, 4),
+        "wait_s": round(max(0.0, latency - provider_seconds), 4),
+        "request_bytes": request_bytes,
+        "images": images,
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "retries": retries,
+    }
+    _record(event)
+
+
+def record_cached(model):
+    """Record a response served from the response cache, which sends no request."""
+    if not instrumentation_enabled():
+        return
+    _record({
+        "time": round(time.time(), 3),
+        **{label: _labels.get().get(label) for label in LABELS},
+        "model": model,
+        "status": "cached",
+        "latency_s": 0.0, "provider_s": 0.0, "wait_s": 0.0, "request_bytes": 0, "images": 0,
+        "prompt_tokens": None, "completion_tokens": None, "retries": 0,
+    })
+
+
+def _record(event):
+    line = json.dumps(event) + "\n"
+    with _lock:
+        if _state["file"] is not None:
+            _state["file"].write(line)
+        if not _settings["prometheus_path"]:
+            return
+        labels = tuple(event[label] or "" for label in LABELS)
+        totals = _totals[labels + (event["status"],)]
+        totals["requests"] += 1
+        totals["retries"] += event["retries"]
+        totals["request_bytes"] += event["request_bytes"]
+        totals["prompt_tokens"] += event["prompt_tokens"] or 0
+        totals["completion_tokens"] += event["completion_tokens"] or 0
+        if event["status"] != "cached":
+            histogram = _latency[labels]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if event["latency_s"] <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += event["latency_s"]
+            histogram["count"] += 1
+        if time.monotonic() - _state["written_at"] >= PROMETHEUS_INTERVAL:
+            _write_prometheus()
+
+
+def _label_text(names, values):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def _write_prometheus():
+    """Rewrite the textfile from the aggregates (called with _lock held)."""
+    path = _settings["prometheus_path"]
+    lines = []
+    counters = [("requests", "API calls, by final status"), ("retries", "Retried attempts of API calls"),
+                ("request_bytes", "Bytes of prompt text and encoded images sent"),
+                ("prompt_tokens", "Prompt tokens reported by the API"),
+                ("completion_tokens", "Completion tokens reported by the API")]
+    for name, help_text in counters:
+        lines += [f"# HELP pacbench_{name}_total {help_text}.", f"# TYPE pacbench_{name}_total counter"]
+        for labels, totals in sorted(_totals.items()):
+            lines.append(f"pacbench_{name}_total{{{_label_text(LABELS + ('status',), labels)}}} {totals[name]}")
+
+    lines += ["# HELP pacbench_request_seconds Latency of API calls, rate limit waits and retries included.",
+              "# TYPE pacbench_request_seconds histogram"]
+    for labels, histogram in sorted(_latency.items()):
+        label_text = _label_text(LABELS, labels)
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f'pacbench_request_seconds_bucket{{{label_text},le="{bound:g}"}} {count}')
+        lines.append(f'pacbench_request_seconds_bucket{{{label_text},le="+Inf"}} {histogram["count"]}')
+        lines.append(f"pacbench_request_seconds_sum{{{label_text}}} {histogram['sum']:.4f}")
+        lines.append(f"pacbench_request_seconds_count{{{label_text}}} {histogram['count']}")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Written to a temporary file and renamed, so collectors never read a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+    _state["written_at"] = time.monotonic()
+
+
+def close_instrumentation():
+    """Flush and close the events file and write the final Prometheus textfile."""
+    with _lock:
+        if _settings["prometheus_path"] and (_totals or _latency):
+            _write_prometheus()
+        if _state["file"] is not None:
+            _state["file"].close()
+            _state["file"] = None
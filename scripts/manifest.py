@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_DATA_ROOT = "../pacbench"
+DEFAULT_MANIFEST_PATH = "../.cache/manifest.json"
+DEFAULT_WORKERS = 16
+MANIFEST_VERSION = 1
+
+# The index maps each directory (relative to the data root, "" for the root)
+# to {"m": mtime_ns, "d": [subdirectory names], "f": {file name: [size, mtime_ns, sha256]}},
+# names in the order the filesystem lists them
+_manifest = {"root": None, "dirs": {}}
+
+
+def _scan_dir(path):
+    """List one directory: returns (mtime_ns, subdirectory names, {file name: [size, mtime_ns, None]})."""
+    subdirs = []
+    files = {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = [stat.st_size, stat.st_mtime_ns, None]
+    return os.stat(path).st_mtime_ns, subdirs, files
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _join(root, rel):
+    return os.path.join(root, rel) if rel else root
+
+
+def _carry_hashes(files, old_files):
+    """Keep the content hash of files whose size and mtime are unchanged."""
+    for name, meta in files.items():
+        old = old_files.get(name)
+        if old is not None and old[:2] == meta[:2]:
+            meta[2] = old[2]
+
+
+def _scan_tree(pool, root, rels, previous):
+    """Scan the directories rels and everything below them in parallel.
+
+    Returns {rel: entry}. Hashes of files whose size and mtime match their
+    entry in previous are carried over; other hashes are left as None.
+    """
+    scanned = {}
+    pending = {pool.submit(_scan_dir, _join(root, rel)): rel for rel in rels}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            rel = pending.pop(future)
+            try:
+                mtime, subdirs, files = future.result()
+            except OSError as e:
+                print(f"Skipping unreadable directory {_join(root, rel)}: {e}")
+                continue
+
+            _carry_hashes(files, previous.get(rel, {}).get("f", {}))
+            scanned[rel] = {"m": mtime, "d": subdirs, "f": files}
+            for name in subdirs:
+                child = os.path.join(rel, name)
+                pending[pool.submit(_scan_dir, _join(root, child))] = child
+    return scanned
+
+
+def _fill_hashes(pool, root, dirs):
+    """Hash every file without a content hash; returns how many were hashed."""
+    missing = [(rel, name) for rel, entry in dirs.items() for name, meta in entry["f"].items() if meta[2] is None]
+    paths = [os.path.join(_join(root, rel), name) for rel, name in missing]
+    for (rel, name), digest in zip(missing, pool.map(_hash_file, paths)):
+        dirs[rel]["f"][name][2] = digest
+    return len(missing)
+
+
+def _read_index(manifest_path):
+    with open(manifest_path) as f:
+        index = json.load(f)
+    if index.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Manifest {manifest_path} has version {index.get('version')}, expected {MANIFEST_VERSION}")
+    return index
+
+
+def _write_index(manifest_path, root, dirs):
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "data_root": root, "dirs": dirs}, f, separators=(",", ":"))
+    os.replace(tmp_path, manifest_path)
+
+
+def build_manifest(data_root=DEFAULT_DATA_ROOT, manifest_path=DEFAULT_MANIFEST_PATH, workers=DEFAULT_WORKERS):
+    """Scan data_root with parallel scandir calls and write the manifest index.
+
+    Content hashes from an existing manifest of the same root are reused for
+    files whose size and mtime are unchanged, so rebuilding only reads new or
+    modified files.
+    """
+    start = time.perf_counter()
+    root = os.path.abspath(data_root)
+    previous = {}
+    if os.path.exists(manifest_path):
+        try:
+            index = _read_index(manifest_path)
+            if index["data_root"] == root:
+                previous = index["dirs"]
+        except (ValueError, KeyError, json.JSONDecodeError):
+            pass
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        dirs = _scan_tree(pool, root, [""], previous)
+        hashed = _fill_hashes(pool, root, dirs)
+    _write_index(manifest_path, root, dirs)
+
+    files = sum(len(entry["f"]) for entry in dirs.values())
+    print(f"Indexed {files} files in {len(dirs)} directories ({hashed} hashed) "
+          f"in {time.perf_counter() - start:.2f}s: {manifest_path}")
+    return files
+
+
+def _revalidate(pool, root, dirs):
+    """Rescan directories whose mtime changed since the manifest was written; returns how many changed.
+
+    Adding, removing or renaming entries updates a directory's mtime, so one
+    stat per directory finds every changed listing. Files rewritten in place
+    keep their listed size/mtime until the manifest is rebuilt.
+    """
+    rels = list(dirs)
+
+    def mtime(rel):
+        try:
+            return os.stat(_join(root, rel)).st_mtime_ns
+        except OSError:
+            return None
+
+    changed = [rel for rel, current in zip(rels, pool.map(mtime, rels)) if current != dirs[rel]["m"]]
+    for rel in changed:
+        # Removed directories are dropped along with their parent's stale listing
+        if rel not in dirs or not os.path.isdir(_join(root, rel)):
+            continue
+        old = dirs[rel]
+        mtime_ns, subdirs, files = _scan_dir(_join(root, rel))
+        _carry_hashes(files, old["f"])
+        dirs[rel] = {"m": mtime_ns, "d": subdirs, "f": files}
+
+        for name in set(old["d"]) - set(subdirs):
+            prefix = os.path.join(rel, name)
+            for stale in [r for r in dirs if r == prefix or r.startswith(prefix + os.sep)]:
+                del dirs[stale]
+        # Unchanged subdirectories are checked by their own mtime; only new ones are scanned
+        added = [os.path.join(rel, name) for name in subdirs if os.path.join(rel, name) not in dirs]
+        dirs.update(_scan_tree(pool, root, added, {}))
+    return len(changed)
+
+
+def load_manifest(manifest_path=DEFAULT_MANIFEST_PATH, workers=DEFAULT_WORKERS):
+    """Load a manifest so listdir / exists / isdir answer from it instead of the filesystem.
+
+    Directories changed since the manifest was written are rescanned, and the
+    refreshed manifest is saved back.
+    """
+    start = time.perf_counter()
+    index = _read_index(manifest_path)
+    root, dirs = index["data_root"], index["dirs"]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        changed = _revalidate(pool, root, dirs)
+    if changed:
+        _write_index(manifest_path, root, dirs)
+
+    _manifest.update(root=root, dirs=dirs)
+    files = sum(len(entry["f"]) for entry in dirs.values())
+    print(f"Loaded manifest with {files} files in {len(dirs)} directories ({changed} rescanned) "
+          f"in {time.perf_counter() - start:.2f}s from {manifest_path}")
+
+
+def close_manifest():
+    """Go back to answering listdir / exists / isdir from the filesystem."""
+    _manifest.update(root=None, dirs={})
+
+
+def _relative(path):
+    """path relative to the loaded manifest's data root ("" for the root), or None if outside it."""
+    root = _manifest["root"]
+    if root is None:
+        return None
+    path = os.path.abspath(path)
+    if path == root:
+        return ""
+    prefix = root.rstrip(os.sep) + os.sep
+    return path[len(prefix):] if path.startswith(prefix) else None
+
+
+def listdir(path):
+    """os.listdir served from the loaded manifest when path is inside its data root."""
+    rel = _relative(path)
+    if rel is None:
+        return os.listdir(path)
+    entry = _manifest["dirs"].get(rel)
+    if entry is None:
+        raise FileNotFoundError(f"No such directory in manifest: {path}")
+    return entry["d"] + list(entry["f"])
+
+
+def isdir(path):
+    """os.path.isdir served from the loaded manifest when path is inside its data root."""
+    rel = _relative(path)
+    if rel is None:
+        return os.path.isdir(path)
+    return rel in _manifest["dirs"]
+
+
+def exists(path):
+    """os.path.exists served from the loaded manifest when path is inside its data root."""
+    rel = _relative(path)
+    if rel is None:
+        return os.path.exists(path)
+    if rel in _manifest["dirs"]:
+        return True
+    parent, name = os.path.split(rel)
+    entry = _manifest["dirs"].get(parent)
+    return entry is not None and name in entry["f"]
+
+
+def getsize(path):
+    """os.path.getsize served from the loaded manifest when path is inside its data root."""
+    rel = _relative(path)
+    if rel is None:
+        return os.path.getsize(path)
+    parent, name = os.path.split(rel)
+    meta = _manifest["dirs"].get(parent, {}).get("f", {}).get(name)
+    if meta is None:
+        raise FileNotFoundError(f"No such file in manifest: {path}")
+    return meta[0]
+
+
+def walk_files(path, stat=False):
+    """Return (relative path, size, mtime_ns) of every file below directory path, sorted by path.
+
+    Served from the loaded manifest when path is inside its data root, so no
+    directory is listed; otherwise the directory tree is walked. The manifest's
+    sizes and mtimes predate files rewritten in place (which leave their
+    directory's mtime alone); with stat, the listed files are stat'ed instead.
+    """
+    rel = _relative(path)
+    if rel is None:
+        files = []
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                st = os.stat(full_path)
+                files.append((os.path.relpath(full_path, path), st.st_size, st.st_mtime_ns))
+        return sorted(files)
+
+    prefix = rel + os.sep if rel else ""
+    files = sorted((os.path.relpath(os.path.join(dir_rel, name), rel or "."), meta[0], meta[1])
+                   for dir_rel, entry in _manifest["dirs"].items()
+                   if dir_rel == rel or dir_rel.startswith(prefix)
+                   for name, meta in entry["f"].items())
+    if stat:
+        stats = [os.stat(os.path.join(path, file_rel)) for file_rel, _, _ in files]
+        files = [(file_rel, st.st_size, st.st_mtime_ns) for (file_rel, _, _), st in zip(files, stats)]
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the benchmark dataset so runners start without scanning it")
+    parser.add_argument("--data_root", type=str, default=DEFAULT_DATA_ROOT,
+                        help="Dataset directory to index")
+    parser.add_argument("--manifest_path", type=str, default=DEFAULT_MANIFEST_PATH,
+                        help="Output manifest file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Directories scanned and files hashed in parallel")
+
+    args = parser.parse_args()
+    build_manifest(args.data_root, args.manifest_path, args.workers)
+
+
+if __name__ == "__main__":
+    main()
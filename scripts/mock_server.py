@@ -0,0 +1,241 @@
+import re
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import PROPERTY_MCQ_OPTIONS
+from ratelimit import CHARS_PER_TOKEN, IMAGE_TOKEN_ESTIMATE
+
+DEFAULT_PORT = 8765
+DEFAULT_LATENCY_MS = 500.0
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+
+# Canned answers for the free-text tasks, picked by a hash of the prompt
+AFFORDANCE_ANSWERS = ["grasp, lift", "grasp, pour", "push, slide", "open, close", "lift, carry, stack"]
+CONSTRAINT_ANSWERS = ["No constraint.", "Yes, the object is blocked.", "Yes, the lid is closed.",
+                      "No, the path is clear."]
+
+_BATCH_COUNT = re.compile(r"JSON array of (\d+) strings")
+
+_settings = {
+    "latency_ms": DEFAULT_LATENCY_MS,
+    "distribution": "lognormal",
+    "sigma": 0.5,
+    "error_rate": 0.0,
+    "throttle_rate": 0.0,
+    "retry_after": 0.0,
+    "correct_rate": 0.5,
+    "seed": 0,
+}
+_stats = {"requests": 0, "completions": 0, "throttled": 0, "errors": 0, "bytes_in": 0}
+_lock = threading.Lock()
+_rng = random.Random(0)
+
+
+def configure_mock(latency_ms=DEFAULT_LATENCY_MS, distribution="lognormal", sigma=0.5, error_rate=0.0,
+                   throttle_rate=0.0, retry_after=0.0, correct_rate=0.5, seed=0):
+    """Set how the stand-in server answers.
+
+    Each completion is delayed by a draw from distribution ("fixed",
+    "uniform" between 0 and twice latency_ms, or "lognormal" with median
+    latency_ms and shape sigma). A fraction throttle_rate of requests is
+    answered 429 with a Retry-After of retry_after seconds, and a fraction
+    error_rate 500. Verifier prompts are judged CORRECT with probability
+    correct_rate. Answers depend only on the prompt and seed, so runs are
+    repeatable; delays and injected failures are random.
+    """
+    if distribution not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+    with _lock:
+        _settings.update(latency_ms=latency_ms, distribution=distribution, sigma=sigma, error_rate=error_rate,
+                         throttle_rate=throttle_rate, retry_after=retry_after, correct_rate=correct_rate, seed=seed)
+        _rng.seed(seed)
+
+
+def add_mock_args(parser):
+    """Register the latency, failure injection and answer options on an argparse parser."""
+    parser.add_argument("--latency_ms", type=float, default=DEFAULT_LATENCY_MS,
+                        help="Median delay of a completion in milliseconds")
+    parser.add_argument("--latency_dist", type=str, choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                        help="Distribution of completion delays")
+    parser.add_argument("--latency_sigma", type=float, default=0.5,
+                        help="Shape of the lognormal delay distribution (larger means a longer tail)")
+    parser.add_argument("--error_rate", type=float, default=0.0,
+                        help="Fraction of requests answered with a 500 error")
+    parser.add_argument("--throttle_rate", type=float, default=0.0,
+                        help="Fraction of requests answered with 429 Too Many Requests")
+    parser.add_argument("--retry_after", type=float, default=0.0,
+                        help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--correct_rate", type=float, default=0.5,
+                        help="Fraction of verifier verdicts that are CORRECT")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for answers, delays and injected failures")
+
+
+def configure_mock_from_args(args):
+    """Configure the server from the options registered with add_mock_args."""
+    configure_mock(args.latency_ms, args.latency_dist, args.latency_sigma, args.error_rate, args.throttle_rate,
+                   args.retry_after, args.correct_rate, args.seed)
+
+
+def mock_stats():
+    """Return a copy of the request, completion and injected failure counters."""
+    with _lock:
+        return dict(_stats)
+
+
+def _draw_delay():
+    """Seconds to wait before answering, and the injected failure status (or None)."""
+    with _lock:
+        latency = _settings["latency_ms"] / 1000
+        distribution = _settings["distribution"]
+        if distribution == "uniform":
+            delay = _rng.uniform(0, 2 * latency)
+        elif distribution == "lognormal":
+            delay = latency * _rng.lognormvariate(0, _settings["sigma"])
+        else:
+            delay = latency
+        draw = _rng.random()
+        if draw < _settings["throttle_rate"]:
+            return 0.0, 429
+        if draw < _settings["throttle_rate"] + _settings["error_rate"]:
+            return delay, 500
+        return delay, None
+
+
+def _pick(options, text):
+    """A choice among options that depends only on text and the seed."""
+    return options[zlib.crc32(f"{_settings['seed']}|{text}".encode()) % len(options)]
+
+
+def _verdict(text):
+    roll = zlib.crc32(f"{_settings['seed']}|verdict|{text}".encode()) % 1000
+    return "CORRECT" if roll < _settings["correct_rate"] * 1000 else "INCORRECT"
+
+
+def canned_answer(text):
+    """The answer to a prompt: verdicts for verifier prompts, an MCQ option for property prompts."""
+    batch = _BATCH_COUNT.search(text)
+    if batch:
+        count = int(batch.group(1))
+        pairs = re.split(r"\n\n(?=\d+\. )", text)[1:count + 1]
+        pairs += [f"{i}|{text}" for i in range(len(pairs), count)]
+        return json.dumps([_verdict(pair) for pair in pairs])
+    if '"CORRECT" if' in text:
+        return _verdict(text)
+    if "Choose one of the following options" in text:
+        for options in PROPERTY_MCQ_OPTIONS.values():
+            if all(option in text for option in options):
+                return _pick(options, text)
+        return text.split("options:\n", 1)[1].split("\n", 1)[0]
+    if "constraint" in text:
+        return _pick(CONSTRAINT_ANSWERS, text)
+    return _pick(AFFORDANCE_ANSWERS, text)
+
+
+def _completion(body, text, images, answer):
+    prompt_tokens = len(text) // CHARS_PER_TOKEN + images * IMAGE_TOKEN_ESTIMATE
+    completion_tokens = max(1, len(answer) // CHARS_PER_TOKEN)
+    return {
+        "id": f"mock-{zlib.crc32(text.encode()):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": answer}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Answers POST .../chat/completions like the OpenAI API; anything else is a 404."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=()):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        delay, failure = _draw_delay()
+        with _lock:
+            _stats["requests"] += 1
+            _stats["bytes_in"] += len(raw)
+        time.sleep(delay)
+        if failure == 429:
+            with _lock:
+                _stats["throttled"] += 1
+            self._send(429, {"error": {"message": "Rate limit exceeded (injected)", "code": 429}},
+                       [("Retry-After", f"{_settings['retry_after']:g}")])
+            return
+        if failure == 500:
+            with _lock:
+                _stats["errors"] += 1
+            self._send(500, {"error": {"message": "Internal server error (injected)", "code": 500}})
+            return
+
+        try:
+            body = json.loads(raw)
+            content = body["messages"][0]["content"]
+            parts = [{"type": "text", "text": content}] if isinstance(content, str) else content
+            text = "".join(part.get("text", "") for part in parts if isinstance(part, dict))
+            images = sum(1 for part in parts if isinstance(part, dict) and part.get("type") == "image_url")
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            self._send(400, {"error": {"message": f"Malformed request: {e}"}})
+            return
+        with _lock:
+            _stats["completions"] += 1
+        self._send(200, _completion(body, text, images, canned_answer(text)))
+
+
+def start_mock_server(host="127.0.0.1", port=0):
+    """Serve the mock API from a background thread; returns (server, base_url).
+
+    port 0 picks a free port. Stop it with server.shutdown().
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for OpenRouter, for offline runs")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    add_mock_args(parser)
+    args = parser.parse_args()
+    configure_mock_from_args(args)
+
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    print(f"Mock API listening on http://{args.host}:{server.server_address[1]}/v1 (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\nServed: {mock_stats()}")
+
+
+if __name__ == "__main__":
+    main()
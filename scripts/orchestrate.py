@@ -0,0 +1,412 @@
+import os
+import glob
+import json
+import time
+import hashlib
+import inspect
+import argparse
+import threading
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from tabulate import tabulate
+from config import (property_ground_files, GROUND_TRUTH_DIR, OPEN_IMAGES_DIR, ROBOCASA_OBJECTS_DIR, HUMANOID_IMAGES_DIR,
+                    CONSTRAINT_IMAGES_DIR, SYN_PROPERTIES_GT, ROBO_PROPERTIES_GT, SYN_AFFORDANCE_GT, ROBO_AFFORDANCES_GT,
+                    SYN_CONSTRAINTS_GT, ROBO_CONSTRAINTS_GT)
+from response_cache import add_cache_args, configure_cache_from_args, close_cache, print_cache_stats
+from clients import add_client_args, configure_clients_from_args, make_client, make_async_client, DEFAULT_BASE_URL
+from ratelimit import add_ratelimit_args, configure_ratelimit_from_args, print_ratelimit_stats
+from payload_store import load_payload_store
+import manifest
+from preprocess import add_preprocess_args, configure_preprocessing_from_args, preprocessing_settings
+from engine import DEFAULT_CONCURRENCY, add_prefetch_args, configure_prefetch_from_args, print_stage_stats, close_prefetch
+from instrumentation import add_instrumentation_args, configure_instrumentation_from_args, close_instrumentation
+from pipeline import PIPELINE_TASKS
+from planner import run_plan
+from bootstrap import DEFAULT_REPLICATES
+from generate_performance import write_summaries, write_leaderboard, summarize_results
+from checkpoint import parse_models, model_slug, model_output_path
+import verification_memo
+import verify_results
+import run_constraint
+import utils
+
+DEFAULT_STATE_PATH = "../.cache/orchestrator_state.json"
+
+# Total API requests allowed in flight across all running nodes
+DEFAULT_BUDGET = 16
+
+# Ground truth files and image directories read by each (task, dataset) evaluation
+DATASET_INPUTS = {
+    ("properties", "openimages"): [os.path.join(GROUND_TRUTH_DIR, f) for f in property_ground_files] + [OPEN_IMAGES_DIR],
+    ("properties", "robocasa"): [SYN_PROPERTIES_GT, ROBOCASA_OBJECTS_DIR],
+    ("properties", "humanoid"): [ROBO_PROPERTIES_GT, HUMANOID_IMAGES_DIR],
+    ("affordances", "humanoid"): [ROBO_AFFORDANCES_GT, HUMANOID_IMAGES_DIR],
+    ("affordances", "robocasa"): [SYN_AFFORDANCE_GT, ROBOCASA_OBJECTS_DIR],
+    ("constraints", "humanoid"): [ROBO_CONSTRAINTS_GT, HUMANOID_IMAGES_DIR],
+    ("constraints", "simulated"): [SYN_CONSTRAINTS_GT, CONSTRAINT_IMAGES_DIR],
+}
+
+# Evaluation clients are per thread: an AsyncOpenAI client belongs to the
+# event loop of the thread that first used it (see engine.run_work_items)
+_thread_clients = threading.local()
+
+# Listing hashes of the image directories by path; several nodes read the same directory
+_listing_hashes = {}
+
+
+def _eval_client(api_key):
+    client = getattr(_thread_clients, "client", None)
+    if client is None:
+        client = _thread_clients.client = make_async_client(api_key)
+    return client
+
+
+def _listing_hash(path):
+    """Hash of a directory's file listing (names, sizes, mtimes), computed once per invocation.
+
+    With --manifest the file names come from the manifest, but every file is
+    still stat'ed, since an image rewritten in place leaves its directory's
+    mtime (all load_manifest checks) unchanged.
+    """
+    listing = _listing_hashes.get(path)
+    if listing is None:
+        digest = hashlib.sha256()
+        for rel, size, mtime_ns in manifest.walk_files(path, stat=True):
+            digest.update(f"{rel}|{size}|{mtime_ns}\n".encode())
+        listing = _listing_hashes[path] = digest.hexdigest()
+    return listing
+
+
+def _hash_path(path, digest):
+    """Feed a file's contents, or a directory's file listing, into digest."""
+    if manifest.isdir(path):
+        digest.update(_listing_hash(path).encode())
+    elif os.path.exists(path):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(b"<missing>")
+
+
+def input_hash(node):
+    """Hash a node's parameters and the current contents of its inputs."""
+    digest = hashlib.sha256(json.dumps(node["params"], sort_keys=True, default=str).encode())
+    for path in node["inputs"]():
+        digest.update(f"\0{path}\0".encode())
+        _hash_path(path, digest)
+    return digest.hexdigest()
+
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def save_state(state_path, state):
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+def add_node(nodes, name, run, deps=(), inputs=(), outputs=(), params=None, cost=0):
+    """Add a node to the graph.
+
+    inputs is a list of paths, or a callable returning one when the inputs are
+    only known once the dependencies have run. cost is the number of API
+    requests the node keeps in flight, counted against the global budget.
+    """
+    nodes[name] = {
+        "name": name,
+        "run": run,
+        "deps": list(deps),
+        "inputs": inputs if callable(inputs) else (lambda: list(inputs)),
+        "outputs": list(outputs),
+        "params": params or {},
+        "cost": cost,
+    }
+
+
+def build_graph(args, api_key):
+    """Build the evaluate -> verify -> summarize graph for the selected tasks.
+
+    With --models, each evaluation node sends its payloads to every model, and
+    verification and summaries run per model on the models' subdirectories,
+    followed by a combined leaderboard.
+    """
+    nodes = {}
+    tasks = list(PIPELINE_TASKS) if args.task == "all" else [args.task]
+    models = parse_models(args.models) if args.models else None
+    # (model, subdirectory) of every run; a single-model run uses the directories as given
+    runs = [(model, model_slug(model)) for model in models] if models else [(args.model, "")]
+    verify_client = make_client(api_key)
+    eval_cost = min(args.concurrency, args.budget)
+    verify_cost = min(max(1, args.verify_concurrency), args.budget)
+    verify_nodes = {model: [] for model, _ in runs}
+
+    for task in tasks:
+        spec = PIPELINE_TASKS[task]
+        results_dir = getattr(args, spec["results_dir"])
+        eval_nodes = []
+
+        for dataset, evaluate_fn, filename in spec["datasets"]:
+            output_csv = os.path.join(results_dir, filename)
+
+            def run_eval(evaluate_fn=evaluate_fn, output_csv=output_csv):
+                os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+                failed = evaluate_fn(_eval_client(api_key), models or args.model, args.num_samples, output_csv,
+                                     eval_cost, args.resume)
+                # Fail the node so its state is not saved and the next run evaluates it again
+                if failed:
+                    raise RuntimeError(f"{failed} items failed after retries; rerun with --resume to retry only those")
+
+            params = {"model": models or args.model, "num_samples": args.num_samples,
+                      "base_url": args.base_url or DEFAULT_BASE_URL, "preprocess": preprocessing_settings()}
+            if (task, dataset) == ("constraints", "simulated"):
+                params["sim_packing"] = run_constraint.sim_packing_settings()
+            name = f"evaluate:{task}:{dataset}"
+            add_node(nodes, name, run_eval,
+                     inputs=DATASET_INPUTS[(task, dataset)] + [inspect.getsourcefile(evaluate_fn), utils.__file__],
+                     outputs=[model_output_path(output_csv, m) for m in models] if models else [output_csv],
+                     params=params, cost=eval_cost)
+            eval_nodes.append(name)
+
+        verify_kwargs = dict(batch_size=args.verify_batch_size, concurrency=args.verify_concurrency, resume=args.resume)
+        if task == "properties":
+            verify_kwargs["fast_path"] = not args.disable_fast_path
+
+        for model, subdir in runs:
+            run_results_dir = os.path.join(results_dir, subdir)
+            output_file = os.path.join(args.output_dir, subdir, spec["output"])
+
+            def run_verify(spec=spec, run_results_dir=run_results_dir, output_file=output_file):
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+                executor = ThreadPoolExecutor(max_workers=args.verify_concurrency) if args.verify_concurrency > 1 else None
+                try:
+                    spec["verify"](client=verify_client, model=args.verifier_model, input_dir=run_results_dir,
+                                   output_file=output_file, executor=executor, **verify_kwargs)
+                finally:
+                    if executor is not None:
+                        executor.shutdown()
+
+            def verify_inputs(run_results_dir=run_results_dir):
+                return sorted(glob.glob(os.path.join(run_results_dir, "*.csv"))) + [verify_results.__file__]
+
+            name = f"verify:{task}" + (f":{model}" if models else "")
+            add_node(nodes, name, run_verify, deps=eval_nodes, inputs=verify_inputs, outputs=[output_file],
+                     params={"model": args.verifier_model,
+                             **{k: v for k, v in verify_kwargs.items() if k not in ("concurrency", "resume")}},
+                     cost=verify_cost)
+            verify_nodes[model].append((name, output_file))
+
+    summary_nodes = []
+    for model, subdir in runs:
+        summary_dir = os.path.join(args.output_dir, subdir)
+
+        def run_summary(summary_dir=summary_dir):
+            write_summaries(summary_dir, summary_dir, args.bootstrap, args.seed)
+
+        name = "summarize" + (f":{model}" if models else "")
+        add_node(nodes, name, run_summary, deps=[n for n, _ in verify_nodes[model]],
+                 inputs=[f for _, f in verify_nodes[model]] + [inspect.getsourcefile(write_summaries)],
+                 outputs=[os.path.join(summary_dir, "overall_benchmark_summary.csv")],
+                 params={"bootstrap": args.bootstrap, "seed": args.seed})
+        summary_nodes.append(name)
+
+    if models:
+        def run_leaderboard():
+            model_summaries = {model: summarize_results(os.path.join(args.output_dir, subdir)) for model, subdir in runs}
+            write_leaderboard(model_summaries, args.output_dir)
+
+        add_node(nodes, "leaderboard", run_leaderboard, deps=summary_nodes,
+                 inputs=[f for model, _ in runs for _, f in verify_nodes[model]] + [inspect.getsourcefile(write_leaderboard)],
+                 outputs=[os.path.join(args.output_dir, "leaderboard.csv")],
+                 params={"models": models})
+    return nodes
+
+
+def run_graph(nodes, budget, state, state_path, force=False):
+    """Run nodes once their dependencies succeed, as many at a time as the budget allows.
+
+    A node is skipped when its outputs exist and the hash of its parameters
+    and inputs matches the one recorded in state after its last successful
+    run. Nodes downstream of a failure are not run. Returns {name: (status,
+    seconds)} with status one of ran, skipped, failed or blocked.
+    """
+    results = {}
+    pending = list(nodes)
+    running = {}
+    started = {}
+    in_use = 0
+
+    def execute(node):
+        digest = input_hash(node)
+        up_to_date = all(os.path.exists(p) for p in node["outputs"]) and \
+            state.get(node["name"], {}).get("input_hash") == digest
+        if up_to_date and not force:
+            return "skipped", digest
+        node["run"]()
+        return "ran", digest
+
+    with ThreadPoolExecutor(max_workers=len(nodes)) as pool:
+        while pending or running:
+            for name in list(pending):
+                node = nodes[name]
+                dep_status = [results[d][0] if d in results else None for d in node["deps"]]
+                if any(s in ("failed", "blocked") for s in dep_status):
+                    pending.remove(name)
+                    results[name] = ("blocked", 0.0)
+                    print(f"[orchestrate] {name} blocked by a failed dependency")
+                elif all(s in ("ran", "skipped") for s in dep_status) and (in_use + node["cost"] <= budget or not running):
+                    pending.remove(name)
+                    in_use += node["cost"]
+                    started[name] = time.perf_counter()
+                    print(f"\n{'='*80}\n[orchestrate] starting {name}\n{'='*80}")
+                    running[pool.submit(execute, node)] = node
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                in_use -= node["cost"]
+                seconds = time.perf_counter() - started[node["name"]]
+                try:
+                    status, digest = future.result()
+                except Exception:
+                    traceback.print_exc()
+                    results[node["name"]] = ("failed", seconds)
+                    print(f"[orchestrate] {node['name']} failed after {seconds:.1f}s")
+                    continue
+
+                results[node["name"]] = (status, seconds)
+                print(f"[orchestrate] {node['name']} {status} in {seconds:.1f}s")
+                if status == "ran":
+                    state[node["name"]] = {"input_hash": digest, "seconds": round(seconds, 3),
+                                           "finished": datetime.now().isoformat(timespec="seconds")}
+                    save_state(state_path, state)
+
+    return results
+
+
+def main():
+    """Run the full benchmark (evaluation, verification, summaries) as one dependency graph."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Run evaluation, verification and summaries as a dependency graph")
+    parser.add_argument("--model", type=str, default="meta-llama/llama-4-maverick",
+                        help="Model name to use for evaluation")
+    parser.add_argument("--models", type=str, default=None,
+                        help="Comma-separated models to evaluate in one sweep (overrides --model); every output "
+                             "directory gets a subdirectory per model and a combined leaderboard is written")
+    parser.add_argument("--verifier_model", type=str, default="meta-llama/llama-4-maverick",
+                        help="Model name to use for verification")
+    parser.add_argument("--num_samples", type=int, default=None,
+                        help="Number of samples to evaluate per dataset (default: all)")
+    parser.add_argument("--task", type=str, choices=["properties", "affordances", "constraints", "all"],
+                        default="all", help="Which task to run")
+    parser.add_argument("--property_dir", type=str, default="../property_results",
+                        help="Directory to save property evaluation CSVs")
+    parser.add_argument("--affordance_dir", type=str, default="../affordance_results",
+                        help="Directory to save affordance evaluation CSVs")
+    parser.add_argument("--constraint_dir", type=str, default="../constraint_results",
+                        help="Directory to save constraint evaluation CSVs")
+    parser.add_argument("--output_dir", type=str, default="../evaluations",
+                        help="Directory to save verification results and summary tables")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET,
+                        help="Total API requests in flight across all concurrently running nodes")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum in-flight requests of one evaluation node")
+    parser.add_argument("--verify_concurrency", type=int, default=1,
+                        help="Maximum in-flight requests of one verification node")
+    parser.add_argument("--verify_batch_size", type=int, default=1,
+                        help="Number of (ground truth, response) pairs verified per LLM request")
+    parser.add_argument("--disable_fast_path", action="store_true",
+                        help="Send every property verification to the LLM instead of matching MCQ options locally")
+    parser.add_argument("--verify_memo", type=str, default=verification_memo.DEFAULT_MEMO_PATH,
+                        help="SQLite file memoizing verdicts across rows and runs")
+    parser.add_argument("--disable_verify_memo", action="store_true",
+                        help="Do not read or write the verification memo")
+    parser.add_argument("--bootstrap", type=int, default=DEFAULT_REPLICATES,
+                        help="Bootstrap replicates for the summary confidence intervals (0 disables them)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed for bootstrap resampling")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep existing CSVs of nodes that run and only process what is missing")
+    parser.add_argument("--state_path", type=str, default=DEFAULT_STATE_PATH,
+                        help="JSON file recording the input hash of every node's last successful run")
+    parser.add_argument("--force", action="store_true",
+                        help="Run every node even if its inputs are unchanged")
+    add_cache_args(parser)
+    add_ratelimit_args(parser)
+    add_client_args(parser)
+    add_preprocess_args(parser)
+    add_prefetch_args(parser)
+    add_instrumentation_args(parser)
+    run_constraint.add_sim_packing_args(parser)
+    parser.add_argument("--payload_store", type=str, default=None,
+                        help="Path prefix of a store built by payload_store.py to serve pre-encoded images from")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Dataset index built by manifest.py to list and check image files from")
+    parser.add_argument("--plan", action="store_true",
+                        help="Only print the requests, payload bytes, tokens and cost the run would take; nothing is sent")
+
+    args = parser.parse_args()
+    configure_cache_from_args(args)
+    configure_ratelimit_from_args(args)
+    configure_clients_from_args(args)
+    configure_preprocessing_from_args(args)
+    run_constraint.configure_sim_packing_from_args(args)
+    if args.payload_store:
+        load_payload_store(args.payload_store)
+    if args.manifest:
+        manifest.load_manifest(args.manifest)
+    if args.plan:
+        tasks = list(PIPELINE_TASKS) if args.task == "all" else [args.task]
+        run_plan(tasks, parse_models(args.models) if args.models else [args.model], args.verifier_model,
+                 args.num_samples, args.verify_batch_size, not args.disable_fast_path)
+        return
+
+    OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+    if not OPENROUTER_API_KEY:
+        raise EnvironmentError("OPENROUTER_API_KEY not set in environment variables.")
+    configure_prefetch_from_args(args)
+    configure_instrumentation_from_args(args)
+    if not args.disable_verify_memo:
+        verification_memo.open_memo(args.verify_memo)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    nodes = build_graph(args, OPENROUTER_API_KEY)
+    state = load_state(args.state_path)
+    start = time.perf_counter()
+    results = run_graph(nodes, args.budget, state, args.state_path, args.force)
+
+    print("\n" + "="*80)
+    print("ORCHESTRATION SUMMARY")
+    print("="*80)
+    rows = [[name, *results[name][:1], f"{results[name][1]:.1f}"] for name in nodes]
+    print(tabulate(rows, headers=["Node", "Status", "Seconds"], tablefmt="grid"))
+    print(f"Total wall time: {time.perf_counter() - start:.1f}s")
+    print_stage_stats()
+    print_cache_stats()
+    print_ratelimit_stats()
+    close_cache()
+    close_prefetch()
+    close_instrumentation()
+    verify_results._print_verifier_stats()
+    verification_memo.print_memo_stats()
+    verification_memo.close_memo()
+
+    if any(status in ("failed", "blocked") for status, _ in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import json
+import mmap
+import argparse
+from preprocess import add_preprocess_args, configure_preprocessing_from_args, preprocessing_settings
+
+DEFAULT_DATA_ROOT = "../pacbench"
+DEFAULT_STORE_PATH = "../.cache/payloads"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+_store = {"path": None, "root": None, "entries": {}, "mmap": None, "file": None}
+
+
+def _blob_path(store_path):
+    return store_path + ".bin"
+
+
+def _index_path(store_path):
+    return store_path + ".json"
+
+
+def iter_image_files(data_root):
+    """Yield every image file under data_root in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(data_root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def build_payload_store(data_root=DEFAULT_DATA_ROOT, store_path=DEFAULT_STORE_PATH):
+    """Encode every image under data_root once into a single blob plus an offset index.
+
+    The blob holds the exact data URLs that encode_image would produce under
+    the current preprocessing settings, so a loaded store is a drop-in
+    replacement for reading and encoding files.
+    """
+    from utils import encode_image
+
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    entries = {}
+    offset = 0
+
+    with open(_blob_path(store_path), "wb") as blob:
+        for image_path in iter_image_files(data_root):
+            payload = encode_image(image_path).encode()
+            if not payload:
+                print(f"Skipping unreadable image: {image_path}")
+                continue
+            blob.write(payload)
+            entries[os.path.relpath(image_path, data_root)] = [offset, len(payload)]
+            offset += len(payload)
+
+    with open(_index_path(store_path), "w") as f:
+        json.dump({
+            "data_root": os.path.abspath(data_root),
+            "preprocess": preprocessing_settings(),
+            "entries": entries,
+        }, f)
+
+    print(f"Stored {len(entries)} images ({offset / 1024 / 1024:.1f} MB of payloads) in {_blob_path(store_path)}")
+    return len(entries)
+
+
+def load_payload_store(store_path=DEFAULT_STORE_PATH):
+    """Memory-map a store built by build_payload_store so encode_image can serve from it."""
+    close_payload_store()
+    with open(_index_path(store_path)) as f:
+        index = json.load(f)
+
+    if index.get("preprocess", preprocessing_settings()) != preprocessing_settings():
+        raise ValueError(
+            f"Payload store {store_path} was built with preprocessing {index['preprocess']}, "
+            f"but the current settings are {preprocessing_settings()}. Rebuild it with matching options."
+        )
+
+    blob = open(_blob_path(store_path), "rb")
+    _store["path"] = store_path
+    _store["file"] = blob
+    _store["mmap"] = mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ) if index["entries"] else None
+    _store["root"] = index["data_root"]
+    _store["entries"] = index["entries"]
+    print(f"Loaded payload store with {len(index['entries'])} images from {_blob_path(store_path)}")
+
+
+def close_payload_store():
+    """Release the memory map of the loaded store, if any."""
+    if _store["mmap"] is not None:
+        _store["mmap"].close()
+    if _store["file"] is not None:
+        _store["file"].close()
+    _store.update(path=None, root=None, entries={}, mmap=None, file=None)
+
+
+def loaded_store_path():
+    """Path prefix of the loaded store, or None."""
+    return _store["path"]
+
+
+def lookup(image_path):
+    """Return the stored data URL for image_path, or None if it is not in the store."""
+    if _store["root"] is None:
+        return None
+    entry = _store["entries"].get(os.path.relpath(os.path.abspath(image_path), _store["root"]))
+    if entry is None:
+        return None
+    offset, length = entry
+    return _store["mmap"][offset:offset + length].decode()
+
+
+def payload_size(image_path):
+    """Return the length of the stored data URL for image_path, or None if it is not in the store."""
+    if _store["root"] is None:
+        return None
+    entry = _store["entries"].get(os.path.relpath(os.path.abspath(image_path), _store["root"]))
+    return None if entry is None else entry[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-encode all benchmark images into a memory-mapped payload store")
+    parser.add_argument("--data_root", type=str, default=DEFAULT_DATA_ROOT,
+                        help="Dataset directory to scan for images")
+    parser.add_argument("--store_path", type=str, default=DEFAULT_STORE_PATH,
+                        help="Output path prefix (writes <prefix>.bin and <prefix>.json)")
+    add_preprocess_args(parser)
+
+    args = parser.parse_args()
+    configure_preprocessing_from_args(args)
+    build_payload_store(args.data_root, args.store_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import os
+import time
+import queue
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from checkpoint import read_results
+from response_cache import add_cache_args, configure_cache_from_args, close_cache, print_cache_stats
+from clients import add_client_args, configure_clients_from_args, make_client, make_async_client
+from ratelimit import add_ratelimit_args, configure_ratelimit_from_args, print_ratelimit_stats
+from payload_store import load_payload_store
+from manifest import load_manifest
+from preprocess import add_preprocess_args, configure_preprocessing_from_args
+from engine import DEFAULT_CONCURRENCY, add_prefetch_args, configure_prefetch_from_args, print_stage_stats, stage_stats, close_prefetch
+from instrumentation import add_instrumentation_args, configure_instrumentation_from_args, close_instrumentation
+import verification_memo
+import run_properties
+import run_affordance
+import run_constraint
+import verify_results
+
+# Evaluation rows buffered per task before the evaluator waits for its verifier
+DEFAULT_QUEUE_SIZE = 256
+
+# Per task: verification function and output CSV, the builder turning one
+# evaluation row into verification records, the argument naming the results
+# directory, and the (dataset, evaluate function, result CSV) of each dataset in order
+PIPELINE_TASKS = {
+    "properties": {
+        "verify": verify_results.verify_properties,
+        "output": "property_verification_results.csv",
+        "row_records": verify_results.property_row_records,
+        "results_dir": "property_dir",
+        "datasets": [
+            ("openimages", run_properties.evaluate_openimages, "openrouter_property_eval_results.csv"),
+            ("robocasa", run_properties.evaluate_robocasa, "openrouter_robocasa_eval_results.csv"),
+            ("humanoid", run_properties.evaluate_humanoid, "openrouter_humanoid_eval_results.csv"),
+        ],
+    },
+    "affordances": {
+        "verify": verify_results.verify_affordances,
+        "output": "affordance_verification_results.csv",
+        "row_records": verify_results.affordance_row_records,
+        "results_dir": "affordance_dir",
+        "datasets": [
+            ("humanoid", run_affordance.evaluate_humanoid_affordances, "openrouter_humanoid_affordance_results.csv"),
+            ("robocasa", run_affordance.evaluate_robocasa_affordances, "openrouter_robocasa_affordance_results.csv"),
+        ],
+    },
+    "constraints": {
+        "verify": verify_results.verify_constraints,
+        "output": "constraint_verification_results.csv",
+        "row_records": verify_results.constraint_row_records,
+        "results_dir": "constraint_dir",
+        "datasets": [
+            ("humanoid", run_constraint.evaluate_humanoid_constraints, "openrouter_humanoid_constraint_results.csv"),
+            ("simulated", run_constraint.evaluate_sim_constraints, "openrouter_sim_constraint_results.csv"),
+        ],
+    },
+}
+
+# Work item builder of each (task, dataset) and the result columns identifying its items
+DATASET_ITEMS = {
+    ("properties", "openimages"): (run_properties.build_openimages_items, run_properties.OPENIMAGES_KEY_COLUMNS),
+    ("properties", "robocasa"): (run_properties.build_robocasa_items, run_properties.ROBOCASA_KEY_COLUMNS),
+    ("properties", "humanoid"): (run_properties.build_humanoid_items, run_properties.HUMANOID_KEY_COLUMNS),
+    ("affordances", "humanoid"): (run_affordance.build_humanoid_affordance_items, run_affordance.HUMANOID_KEY_COLUMNS),
+    ("affordances", "robocasa"): (run_affordance.build_robocasa_affordance_items, run_affordance.ROBOCASA_KEY_COLUMNS),
+    ("constraints", "humanoid"): (run_constraint.build_humanoid_constraint_items, run_constraint.HUMANOID_KEY_COLUMNS),
+    ("constraints", "simulated"): (run_constraint.build_sim_constraint_items, run_constraint.SIM_KEY_COLUMNS),
+}
+
+# Marks the end of a task's evaluation rows on its queue
+_DONE = None
+
+
+def _hand_off(stage, entry):
+    """Put entry on a stage's queue, failing fast if its verifier has stopped."""
+    while True:
+        if stage["future"].done():
+            stage["future"].result()
+            raise RuntimeError(f"{stage['task']} verification stopped before evaluation finished")
+        try:
+            stage["queue"].put(entry, timeout=1)
+            return
+        except queue.Full:
+            pass
+
+
+def _queued_records(stage):
+    """Yield verification records for the evaluation rows arriving on a stage's queue."""
+    while True:
+        entry = stage["queue"].get()
+        if entry is _DONE:
+            return
+        yield from stage["row_records"](*entry)
+
+
+def _timed(stage, verify_fn, kwargs):
+    start = time.perf_counter()
+    verify_fn(**kwargs)
+    stage["seconds"] = time.perf_counter() - start
+
+
+def start_verification(task, stage_pool, client, model, output_file, queue_size, **verify_kwargs):
+    """Start verifying a task in stage_pool from a bounded queue of evaluation rows.
+
+    Returns the stage; feed it with evaluate_dataset and close it with
+    finish_verification.
+    """
+    spec = PIPELINE_TASKS[task]
+    stage = {"task": task, "queue": queue.Queue(maxsize=queue_size), "row_records": spec["row_records"],
+             "seconds": None}
+    kwargs = dict(client=client, model=model, input_dir=None, output_file=output_file,
+                  records=_queued_records(stage), **verify_kwargs)
+    stage["future"] = stage_pool.submit(_timed, stage, spec["verify"], kwargs)
+    return stage
+
+
+def evaluate_dataset(stage, evaluate_fn, client, model, num_samples, output_csv, concurrency, resume):
+    """Run one dataset's evaluation, handing every result row to the stage's verifier as it is written.
+
+    With resume, rows already in output_csv are handed over first so they are
+    verified too if the previous run stopped before verifying them. Returns
+    the number of items that failed and got no row.
+    """
+    source_file = os.path.basename(output_csv)
+    row_index = 0
+
+    def on_row(row):
+        nonlocal row_index
+        _hand_off(stage, (source_file, list(row), row_index, row))
+        row_index += 1
+
+    if resume:
+        for row in read_results(output_csv):
+            on_row(row)
+    return evaluate_fn(client, model, num_samples, output_csv, concurrency, resume, on_row)
+
+
+def finish_verification(stage):
+    """Signal the end of a stage's rows; stage["future"] completes once all are written."""
+    if not stage["future"].done():
+        _hand_off(stage, _DONE)
+
+
+def main():
+    """Evaluate and verify in one streaming pipeline instead of two stages."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Run evaluation and verification as one streaming pipeline")
+    parser.add_argument("--model", type=str, default="meta-llama/llama-4-maverick",
+                        help="Model name to use for evaluation")
+    parser.add_argument("--verifier_model", type=str, default="meta-llama/llama-4-maverick",
+                        help="Model name to use for verification")
+    parser.add_argument("--num_samples", type=int, default=None,
+                        help="Number of samples to evaluate per dataset (default: all)")
+    parser.add_argument("--task", type=str, choices=["properties", "affordances", "constraints", "all"],
+                        default="all", help="Which task to evaluate and verify")
+    parser.add_argument("--property_dir", type=str, default="../property_results",
+                        help="Directory to save property evaluation CSVs")
+    parser.add_argument("--affordance_dir", type=str, default="../affordance_results",
+                        help="Directory to save affordance evaluation CSVs")
+    parser.add_argument("--constraint_dir", type=str, default="../constraint_results",
+                        help="Directory to save constraint evaluation CSVs")
+    parser.add_argument("--output_dir", type=str, default="../evaluations",
+                        help="Directory to save verification results")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum number of in-flight evaluation requests")
+    parser.add_argument("--verify_concurrency", type=int, default=1,
+                        help="Maximum verifier requests in flight")
+    parser.add_argument("--verify_batch_size", type=int, default=1,
+                        help="Number of (ground truth, response) pairs verified per LLM request")
+    parser.add_argument("--disable_fast_path", action="store_true",
+                        help="Send every property verification to the LLM instead of matching MCQ options locally")
+    parser.add_argument("--verify_memo", type=str, default=verification_memo.DEFAULT_MEMO_PATH,
+                        help="SQLite file memoizing verdicts across rows and runs")
+    parser.add_argument("--disable_verify_memo", action="store_true",
+                        help="Do not read or write the verification memo")
+    parser.add_argument("--queue_size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Evaluation rows buffered per task before evaluation waits for verification")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep existing evaluation and verification CSVs and only process what is missing")
+    add_cache_args(parser)
+    add_ratelimit_args(parser)
+    add_client_args(parser)
+    add_preprocess_args(parser)
+    add_prefetch_args(parser)
+    add_instrumentation_args(parser)
+    run_constraint.add_sim_packing_args(parser)
+    parser.add_argument("--payload_store", type=str, default=None,
+                        help="Path prefix of a store built by payload_store.py to serve pre-encoded images from")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Dataset index built by manifest.py to list and check image files from")
+    parser.add_argument("--plan", action="store_true",
+                        help="Only print the requests, payload bytes, tokens and cost the run would take; nothing is sent")
+
+    args = parser.parse_args()
+    configure_cache_from_args(args)
+    configure_ratelimit_from_args(args)
+    configure_clients_from_args(args)
+    configure_preprocessing_from_args(args)
+    run_constraint.configure_sim_packing_from_args(args)
+    if args.payload_store:
+        load_payload_store(args.payload_store)
+    if args.manifest:
+        load_manifest(args.manifest)
+    tasks = list(PIPELINE_TASKS) if args.task == "all" else [args.task]
+    if args.plan:
+        # planner builds on PIPELINE_TASKS, so it is only imported once this module is loaded
+        from planner import run_plan
+        run_plan(tasks, [args.model], args.verifier_model, args.num_samples, args.verify_batch_size,
+                 not args.disable_fast_path)
+        return
+
+    OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+    if not OPENROUTER_API_KEY:
+        raise EnvironmentError("OPENROUTER_API_KEY not set in environment variables.")
+    eval_client = make_async_client(OPENROUTER_API_KEY)
+    verify_client = make_client(OPENROUTER_API_KEY)
+    configure_prefetch_from_args(args)
+    configure_instrumentation_from_args(args)
+    if not args.disable_verify_memo:
+        verification_memo.open_memo(args.verify_memo)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for task in tasks:
+        os.makedirs(getattr(args, PIPELINE_TASKS[task]["results_dir"]), exist_ok=True)
+
+    executor = ThreadPoolExecutor(max_workers=args.verify_concurrency) if args.verify_concurrency > 1 else None
+    start = time.perf_counter()
+
+    # One verifier per task runs for the whole pipeline, so verification of
+    # earlier tasks overlaps with evaluation of later ones
+    with ThreadPoolExecutor(max_workers=len(tasks)) as stage_pool:
+        stages = {}
+        for task in tasks:
+            verify_kwargs = dict(batch_size=args.verify_batch_size, executor=executor,
+                                 concurrency=args.verify_concurrency, resume=args.resume)
+            if task == "properties":
+                verify_kwargs["fast_path"] = not args.disable_fast_path
+            output_file = os.path.join(args.output_dir, PIPELINE_TASKS[task]["output"])
+            stages[task] = start_verification(task, stage_pool, verify_client, args.verifier_model, output_file,
+                                              args.queue_size, **verify_kwargs)
+
+        try:
+            for task in tasks:
+                results_dir = getattr(args, PIPELINE_TASKS[task]["results_dir"])
+                for _, evaluate_fn, filename in PIPELINE_TASKS[task]["datasets"]:
+                    evaluate_dataset(stages[task], evaluate_fn, eval_client, args.model, args.num_samples,
+                                     os.path.join(results_dir, filename), args.concurrency, args.resume)
+            eval_seconds = time.perf_counter() - start
+        finally:
+            for stage in stages.values():
+                finish_verification(stage)
+        for stage in stages.values():
+            stage["future"].result()
+    if executor is not None:
+        executor.shutdown()
+
+    print("\n" + "="*60)
+    print(f"Evaluation finished after {eval_seconds:.1f}s")
+    for task, stage in stages.items():
+        print(f"{task.capitalize()} verification finished after {stage['seconds']:.1f}s")
+    print(f"Total pipeline time: {time.perf_counter() - start:.1f}s")
+    print_stage_stats()
+    print_cache_stats()
+    print_ratelimit_stats()
+    close_cache()
+    close_prefetch()
+    close_instrumentation()
+    verify_results._print_verifier_stats()
+    verification_memo.print_memo_stats()
+    verification_memo.close_memo()
+    if stage_stats()["failed"]:
+        print("Pipeline incomplete: rerun with --resume to retry the failed items")
+        print("="*60)
+        raise SystemExit(1)
+    print("Pipeline complete!")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
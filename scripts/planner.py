@@ -0,0 +1,212 @@
+import io
+import math
+import time
+import contextlib
+from tabulate import tabulate
+from config import MODEL_PRICES
+from pipeline import PIPELINE_TASKS, DATASET_ITEMS
+from preprocess import preprocessing_enabled
+from ratelimit import estimate_prompt_tokens, CHARS_PER_TOKEN
+from utils import MAX_TOKENS, build_image_content
+import manifest
+import payload_store
+import verify_results
+
+# Item fields holding the ground truth that ends up in the verifier prompt
+GROUND_TRUTH_FIELDS = ("ground_truth", "gt_category", "answer", "verification_prompt")
+
+# Responses are not known before the run, so verifier prompts are sized with
+# responses that use the whole completion budget
+RESPONSE_PLACEHOLDER = "x" * (MAX_TOKENS * CHARS_PER_TOKEN)
+
+# Length of the "data:<mime>;base64," prefix of an encoded image, by file extension
+DATA_URL_PREFIX = len("data:image/jpeg;base64,")
+PNG_DATA_URL_PREFIX = len("data:image/png;base64,")
+
+
+def _new_stats():
+    return {"items": 0, "requests": 0, "local": 0, "images": 0, "payload_bytes": 0,
+            "input_tokens": 0, "output_tokens": 0}
+
+
+def _payload_bytes(image_path, sizes):
+    """Length of the data URL encode_image would send for image_path, or None if it is unreadable.
+
+    Lengths come from the loaded payload store, else from the size of the
+    image file; sizes caches them by path and counts the file-based ones.
+    """
+    if image_path not in sizes["paths"]:
+        size = payload_store.payload_size(image_path)
+        if size is None:
+            try:
+                prefix = PNG_DATA_URL_PREFIX if image_path.lower().endswith(".png") else DATA_URL_PREFIX
+                size = prefix + 4 * math.ceil(manifest.getsize(image_path) / 3)
+                sizes["from_files"] += 1
+            except OSError:
+                size = None
+        sizes["paths"][image_path] = size
+    return sizes["paths"][image_path]
+
+
+def _plan_query(query, stats, sizes):
+    """Count the request a query turns into, or nothing if the engine answers it locally."""
+    if isinstance(query, str):
+        stats["local"] += 1
+        return
+
+    paths = query["images"] if "images" in query else [query["image"]]
+    payloads = [size for size in (_payload_bytes(p, sizes) for p in paths) if size is not None]
+    if not payloads:
+        stats["local"] += 1
+        return
+
+    messages = [{"role": "user", "content": build_image_content(query["prompt"], [""] * len(payloads))}]
+    stats["requests"] += 1
+    stats["images"] += len(payloads)
+    stats["payload_bytes"] += sum(payloads)
+    stats["input_tokens"] += estimate_prompt_tokens(messages)
+    stats["output_tokens"] += MAX_TOKENS
+
+
+def _ground_truth(item):
+    for field in GROUND_TRUTH_FIELDS:
+        if field in item:
+            value = item[field]
+            return ", ".join(value) if isinstance(value, list) else value
+    return "N/A"
+
+
+def _plan_verify_batch(task, pairs, stats):
+    messages = [{"role": "user", "content": verify_results.verify_prompt(task, pairs)}]
+    stats["requests"] += 1
+    stats["input_tokens"] += estimate_prompt_tokens(messages)
+    stats["output_tokens"] += verify_results.verify_max_tokens(len(pairs))
+
+
+def plan_run(tasks, num_samples=None, verify_batch_size=1):
+    """Enumerate the work items of a run without sending anything.
+
+    Returns {"evaluation": [(task, dataset, stats)], "verification": [(task, stats)], ...}
+    with, per dataset, the requests one evaluated model is sent, the images
+    and encoded payload bytes they carry and their estimated tokens, and per
+    task the verifier requests for one model's results. Every query of an
+    item becomes one verification record, whether or not it needed a request.
+    """
+    plan = {"evaluation": [], "verification": []}
+    sizes = {"paths": {}, "from_files": 0}
+    batch_size = max(1, verify_batch_size)
+
+    for task in tasks:
+        verify_stats = _new_stats()
+        pairs = []
+        for dataset, _, _ in PIPELINE_TASKS[task]["datasets"]:
+            stats = _new_stats()
+            # The builders report skipped rows and missing files as they go
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_items, _ = DATASET_ITEMS[(task, dataset)]
+                for item in build_items(num_samples):
+                    stats["items"] += 1
+                    ground_truth = _ground_truth(item)
+                    for query in item["queries"]:
+                        _plan_query(query, stats, sizes)
+                        verify_stats["items"] += 1
+                        pairs.append((ground_truth, RESPONSE_PLACEHOLDER))
+                        if len(pairs) == batch_size:
+                            _plan_verify_batch(task, pairs, verify_stats)
+                            pairs = []
+            plan["evaluation"].append((task, dataset, stats))
+
+        if pairs:
+            _plan_verify_batch(task, pairs, verify_stats)
+        plan["verification"].append((task, verify_stats))
+    plan["sized_from_files"] = sizes["from_files"]
+    return plan
+
+
+def _cost(model, input_tokens, output_tokens):
+    """USD cost from MODEL_PRICES, or None if the model has no price."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (input_tokens * prices[0] + output_tokens * prices[1]) / 1e6
+
+
+def _format_cost(cost):
+    return "n/a" if cost is None else f"${cost:,.2f}"
+
+
+def _mb(num_bytes):
+    return f"{num_bytes / 1024 / 1024:,.2f}"
+
+
+def print_plan(plan, models, verifier_model, fast_path=True):
+    """Print the request, payload, token and cost estimate of a plan made by plan_run."""
+    print("\n" + "="*80)
+    print("RUN PLAN (nothing was sent)")
+    print("="*80)
+
+    rows = []
+    total = _new_stats()
+    for task, dataset, stats in plan["evaluation"]:
+        rows.append([task, dataset, stats["items"], stats["requests"], stats["local"], stats["images"],
+                     _mb(stats["payload_bytes"]), stats["input_tokens"], stats["output_tokens"]])
+        for key in total:
+            total[key] += stats[key]
+    rows.append(["Total", "", total["items"], total["requests"], total["local"], total["images"],
+                 _mb(total["payload_bytes"]), total["input_tokens"], total["output_tokens"]])
+    print("\nEvaluation, per model:")
+    print(tabulate(rows, headers=["Task", "Dataset", "Items", "Requests", "Answered locally", "Images",
+                                  "Payload (MB)", "Input tokens", "Output tokens (max)"], tablefmt="grid"))
+
+    verify_rows = []
+    verify_total = _new_stats()
+    for task, stats in plan["verification"]:
+        verify_rows.append([task, stats["items"], stats["requests"], stats["input_tokens"], stats["output_tokens"]])
+        for key in verify_total:
+            verify_total[key] += stats[key]
+    verify_rows.append(["Total", verify_total["items"], verify_total["requests"],
+                        verify_total["input_tokens"], verify_total["output_tokens"]])
+    print("\nVerification, per evaluated model:")
+    print(tabulate(verify_rows, headers=["Task", "Records", "Requests (max)", "Input tokens (max)",
+                                         "Output tokens (max)"], tablefmt="grid"))
+
+    cost_rows = []
+    costs = []
+    for model in models:
+        cost = _cost(model, total["input_tokens"], total["output_tokens"])
+        costs.append(cost)
+        cost_rows.append([model, "evaluation", total["requests"], _mb(total["payload_bytes"]),
+                          total["input_tokens"], total["output_tokens"], _format_cost(cost)])
+    runs = len(models)
+    cost = _cost(verifier_model, verify_total["input_tokens"] * runs, verify_total["output_tokens"] * runs)
+    costs.append(cost)
+    cost_rows.append([verifier_model, "verification", verify_total["requests"] * runs, "",
+                      verify_total["input_tokens"] * runs, verify_total["output_tokens"] * runs, _format_cost(cost)])
+    cost_rows.append(["Total", "", sum(row[2] for row in cost_rows), _mb(total["payload_bytes"] * runs),
+                      sum(row[4] for row in cost_rows), sum(row[5] for row in cost_rows),
+                      _format_cost(None if None in costs else sum(costs))])
+    print("\nCost:")
+    print(tabulate(cost_rows, headers=["Model", "Role", "Requests", "Payload (MB)", "Input tokens",
+                                       "Output tokens (max)", "Cost (USD, max)"], tablefmt="grid"))
+
+    print("\nToken counts are estimates: text at 1 token per "
+          f"{CHARS_PER_TOKEN} characters and a fixed budget per image; outputs use the full completion budget.")
+    if fast_path and any(task == "properties" for task, _ in plan["verification"]):
+        print("Property responses matching an MCQ option are verified locally, so fewer property verifier "
+              "requests are usually sent.")
+    print("Cached responses, memoized verdicts and rows kept by --resume are not subtracted.")
+    if preprocessing_enabled() and plan["sized_from_files"]:
+        print(f"{plan['sized_from_files']} images are sized before preprocessing; load a --payload_store built "
+              "with the same options for exact payload sizes.")
+    missing = [model for model in [*models, verifier_model] if model not in MODEL_PRICES]
+    if missing:
+        print(f"No price in config.MODEL_PRICES for: {', '.join(dict.fromkeys(missing))}")
+
+
+def run_plan(tasks, models, verifier_model, num_samples=None, verify_batch_size=1, fast_path=True):
+    """Plan a run and print its estimate; returns the plan."""
+    start = time.perf_counter()
+    plan = plan_run(tasks, num_samples, verify_batch_size)
+    print_plan(plan, models, verifier_model, fast_path)
+    print(f"Planned in {time.perf_counter() - start:.2f}s")
+    return plan
@@ -0,0 +1,179 @@
+import io
+import os
+import json
+import hashlib
+import argparse
+import pandas as pd
+from tabulate import tabulate
+
+DEFAULT_DATA_ROOT = "../pacbench"
+DEFAULT_PREPROCESS_CACHE = "../.cache/preprocessed"
+IMAGE_FORMATS = ["jpeg", "webp", "png"]
+DEFAULT_QUALITY = 85
+
+_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png", "gif": "image/gif"}
+
+_settings = {"max_edge": None, "quality": None, "format": None, "cache_dir": DEFAULT_PREPROCESS_CACHE}
+
+
+def detect_mime(data):
+    """Detect the MIME type of encoded image bytes from their signature."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    # Unknown signature: keep the historical label
+    return "image/png"
+
+
+def configure_preprocessing(max_edge=None, quality=None, image_format=None, cache_dir=DEFAULT_PREPROCESS_CACHE):
+    """Set the preprocessing applied by encode_image.
+
+    max_edge downscales images whose longest side exceeds it, image_format
+    re-encodes to jpeg/webp/png and quality is the JPEG/WebP quality. With all
+    three unset images are sent unchanged.
+    """
+    if image_format is not None and image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    if quality is None and image_format in ("jpeg", "webp"):
+        quality = DEFAULT_QUALITY
+    _settings.update(max_edge=max_edge, quality=quality, format=image_format, cache_dir=cache_dir)
+
+
+def preprocessing_settings():
+    """Return the active settings (excluding the cache location)."""
+    return {k: _settings[k] for k in ("max_edge", "quality", "format")}
+
+
+def preprocessing_options():
+    """Return the active settings as keyword arguments for configure_preprocessing."""
+    return dict(max_edge=_settings["max_edge"], quality=_settings["quality"], image_format=_settings["format"],
+                cache_dir=_settings["cache_dir"])
+
+
+def preprocessing_enabled():
+    return any(v is not None for v in preprocessing_settings().values())
+
+
+def add_preprocess_args(parser):
+    """Register the image preprocessing command line options on an argparse parser."""
+    parser.add_argument("--max_edge", type=int, default=None,
+                        help="Downscale images so their longest edge is at most this many pixels")
+    parser.add_argument("--image_format", type=str, choices=IMAGE_FORMATS, default=None,
+                        help="Re-encode images to this format before sending")
+    parser.add_argument("--image_quality", type=int, default=None,
+                        help=f"JPEG/WebP quality when re-encoding (default: {DEFAULT_QUALITY})")
+    parser.add_argument("--preprocess_cache", type=str, default=DEFAULT_PREPROCESS_CACHE,
+                        help="Directory caching preprocessed images")
+
+
+def configure_preprocessing_from_args(args):
+    """Configure preprocessing from options registered with add_preprocess_args."""
+    configure_preprocessing(args.max_edge, args.image_quality, args.image_format, args.preprocess_cache)
+
+
+def _transform(data):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("Pillow is required for image preprocessing (pip install Pillow)")
+
+    image = Image.open(io.BytesIO(data))
+    image_format = _settings["format"] or (image.format or "png").lower()
+    if image_format not in IMAGE_FORMATS:
+        image_format = "png"
+
+    max_edge = _settings["max_edge"]
+    if max_edge and max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    out = io.BytesIO()
+    save_kwargs = {"quality": _settings["quality"] or DEFAULT_QUALITY} if image_format in ("jpeg", "webp") else {}
+    image.save(out, format=image_format.upper(), **save_kwargs)
+    return out.getvalue(), _MIME_TYPES[image_format]
+
+
+def prepare_image(image_path):
+    """Return (bytes, mime) for image_path after the configured preprocessing.
+
+    Processed images are cached on disk keyed by the source bytes hash and
+    the settings, so each resolution/quality combination is computed once.
+    """
+    with open(image_path, "rb") as f:
+        data = f.read()
+
+    if not preprocessing_enabled():
+        return data, detect_mime(data)
+
+    settings = json.dumps(preprocessing_settings(), sort_keys=True)
+    digest = hashlib.sha256(hashlib.sha256(data).digest() + settings.encode()).hexdigest()
+    cache_path = os.path.join(_settings["cache_dir"], digest[:2], digest)
+
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            processed = f.read()
+        return processed, detect_mime(processed)
+
+    processed, mime = _transform(data)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(processed)
+    os.replace(tmp_path, cache_path)
+    return processed, mime
+
+
+def generate_savings_report(data_root=DEFAULT_DATA_ROOT):
+    """Preprocess every image under data_root and tabulate bytes saved per dataset."""
+    from payload_store import iter_image_files
+
+    totals = {}
+    for image_path in iter_image_files(data_root):
+        dataset = os.path.relpath(image_path, data_root).split(os.sep)[0]
+        original = os.path.getsize(image_path)
+        processed, _ = prepare_image(image_path)
+        count, orig_bytes, new_bytes = totals.get(dataset, (0, 0, 0))
+        totals[dataset] = (count + 1, orig_bytes + original, new_bytes + len(processed))
+
+    summary = []
+    for dataset, (count, orig_bytes, new_bytes) in sorted(totals.items()):
+        saved = (1 - new_bytes / orig_bytes) * 100 if orig_bytes > 0 else 0
+        summary.append({
+            'Dataset': dataset,
+            'Images': count,
+            'Original (MB)': f"{orig_bytes / 1024 / 1024:.2f}",
+            'Processed (MB)': f"{new_bytes / 1024 / 1024:.2f}",
+            'Saved (%)': f"{saved:.2f}"
+        })
+
+    return pd.DataFrame(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess benchmark images and report bytes saved per dataset")
+    parser.add_argument("--data_root", type=str, default=DEFAULT_DATA_ROOT,
+                        help="Dataset directory to scan for images")
+    parser.add_argument("--output_csv", type=str, default=None,
+                        help="Optional path to save the report as CSV")
+    add_preprocess_args(parser)
+
+    args = parser.parse_args()
+    configure_preprocessing_from_args(args)
+
+    print(f"Preprocessing settings: {preprocessing_settings()}")
+    report = generate_savings_report(args.data_root)
+    print(tabulate(report, headers='keys', tablefmt='grid', showindex=False))
+    if args.output_csv:
+        report.to_csv(args.output_csv, index=False)
+        print(f"Report saved to: {args.output_csv}")
+
+
+if __name__ == "__main__":
+    main()
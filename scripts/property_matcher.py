@@ -0,0 +1,91 @@
+import re
+from config import PROPERTY_MCQ_OPTIONS
+
+# Words that flip or hedge the meaning of an option mentioned next to them
+# ("not sticky", "unlikely to be heavy", "sealed rather than open", "contains
+# nothing"); a response containing one outside the option text is left to the
+# LLM verifier. normalize splits a contraction such as "doesn't" into "doesn t",
+# so the lone "t" catches every n't form and the stems catch "doesnt" & co.
+NEGATIONS = {"not", "no", "neither", "nor", "never", "without", "cannot", "t",
+             "isn", "isnt", "aren", "arent", "wasn", "wasnt", "weren", "werent", "ain", "aint",
+             "don", "dont", "doesn", "doesnt", "didn", "didnt", "hasn", "hasnt", "haven", "havent", "hadn", "hadnt",
+             "won", "wont", "wouldn", "wouldnt", "shouldn", "shouldnt", "couldn", "couldnt", "cant",
+             "mustn", "mustnt", "needn", "neednt", "mightn", "mightnt",
+             "nothing", "none", "nobody", "nowhere",
+             "unlikely", "hardly", "barely", "scarcely", "doubt", "doubtful", "rather", "instead", "except"}
+
+_stats = {"fast_path": 0, "llm": 0}
+
+
+def normalize(text):
+    """Lowercase and collapse punctuation/hyphens to single spaces."""
+    return re.sub(r"[^a-z0-9]+", " ", str(text).lower()).strip()
+
+
+def _compile_options(options_by_property):
+    """Build, per property, the phrases (category, descriptors, full text) that name each option."""
+    compiled = {}
+    for prop, options in options_by_property.items():
+        phrases = []
+        for idx, option in enumerate(options):
+            category, _, descriptors = option.partition(":")
+            names = [option, category] + [d for d in descriptors.split(",") if d.strip()]
+            for name in names:
+                tokens = tuple(normalize(name).split())
+                if tokens:
+                    phrases.append((tokens, idx))
+        # Longest phrases first so "non sticky" wins over "sticky"
+        phrases.sort(key=lambda p: -len(p[0]))
+        compiled[prop] = phrases
+    return compiled
+
+
+_PHRASES = _compile_options(PROPERTY_MCQ_OPTIONS)
+
+
+def match_option(property_type, text):
+    """Return the index of the option text unambiguously refers to, or None."""
+    phrases = _PHRASES.get(str(property_type).strip().upper())
+    if not phrases:
+        return None
+
+    tokens = normalize(text).split()
+    if not tokens:
+        return None
+
+    covered = [False] * len(tokens)
+    matched = set()
+    for phrase, idx in phrases:
+        n = len(phrase)
+        for start in range(len(tokens) - n + 1):
+            if tuple(tokens[start:start + n]) == phrase and not any(covered[start:start + n]):
+                covered[start:start + n] = [True] * n
+                matched.add(idx)
+
+    if len(matched) != 1:
+        return None
+    if any(tok in NEGATIONS for tok, hit in zip(tokens, covered) if not hit):
+        return None
+    return matched.pop()
+
+
+def fast_path_verdict(property_type, ground_truth, model_response):
+    """Decide CORRECT/INCORRECT locally when both texts map to a single option.
+
+    Returns None when either side is ambiguous, in which case the caller
+    should fall back to the LLM verifier. Every call is counted towards
+    fast_path_stats().
+    """
+    gt_idx = match_option(property_type, ground_truth)
+    resp_idx = match_option(property_type, model_response) if gt_idx is not None else None
+    if resp_idx is None:
+        _stats["llm"] += 1
+        return None
+
+    _stats["fast_path"] += 1
+    return "CORRECT" if resp_idx == gt_idx else "INCORRECT"
+
+
+def fast_path_stats():
+    """Return counts of verdicts decided locally vs deferred to the LLM."""
+    return dict(_stats)
@@ -0,0 +1,362 @@
+import math
+import time
+import array
+import random
+import asyncio
+import weakref
+import threading
+import email.utils
+import openai
+import instrumentation
+
+DEFAULT_MAX_RETRIES = 5
+
+# Exponential backoff: the n-th retry waits a random time up to
+# min(MAX_BACKOFF, BASE_BACKOFF * 2**n), or longer if the provider asks to
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# Requests are charged against the tokens/min budget before they are sent,
+# using this rough size of one image and of one token of text; the estimate is
+# corrected once the response reports its usage
+IMAGE_TOKEN_ESTIMATE = 1000
+CHARS_PER_TOKEN = 4
+
+# How often a request waiting for the adaptive concurrency limit, or for
+# tokens that may be refunded early, checks again
+SLOT_POLL_INTERVAL = 0.01
+TOKEN_POLL_INTERVAL = 0.25
+
+_state = {
+    "max_retries": DEFAULT_MAX_RETRIES,
+    "max_rps": None,
+    "max_tpm": None,
+    "adaptive": True,
+    "next_request": 0.0,
+    "tokens": 0.0,
+    "tokens_at": 0.0,
+    "limit": None,
+    "in_flight": 0,
+    "last_decrease": 0.0,
+}
+_stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "gave_up": 0,
+          "backoff_seconds": 0.0, "wait_seconds": 0.0}
+# Seconds from each successful create/acreate call until its response,
+# including rate limit waits and retries
+_latencies = array.array("d")
+_lock = threading.Lock()
+_sdk_clients = weakref.WeakKeyDictionary()
+
+
+def configure_ratelimit(max_retries=DEFAULT_MAX_RETRIES, max_rps=None, max_tpm=None, adaptive=True):
+    """Configure the rate control applied to every chat completion request.
+
+    max_rps and max_tpm cap requests per second and tokens per minute (None
+    for no cap). Throttled (429), server error and connection failures are
+    retried up to max_retries times with jittered exponential backoff,
+    honouring Retry-After. With adaptive, the number of requests in flight is
+    halved whenever the provider throttles and grows back by one per window of
+    successful requests.
+    """
+    with _lock:
+        _state.update(max_retries=max_retries, max_rps=max_rps, max_tpm=max_tpm, adaptive=adaptive,
+                      next_request=0.0, tokens=float(max_tpm or 0), tokens_at=time.monotonic(),
+                      limit=None, last_decrease=0.0)
+
+
+def add_ratelimit_args(parser):
+    """Register the rate control command line options on an argparse parser."""
+    parser.add_argument("--max_retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Retries of a request after a 429, 5xx or connection error")
+    parser.add_argument("--max_rps", type=float, default=None,
+                        help="Maximum API requests started per second (default: no limit)")
+    parser.add_argument("--max_tpm", type=float, default=None,
+                        help="Maximum estimated API tokens per minute (default: no limit)")
+    parser.add_argument("--disable_adaptive_concurrency", action="store_true",
+                        help="Keep the requested concurrency even when the provider throttles")
+
+
+def configure_ratelimit_from_args(args):
+    """Configure rate control from options registered with add_ratelimit_args."""
+    configure_ratelimit(args.max_retries, args.max_rps, args.max_tpm, not args.disable_adaptive_concurrency)
+
+
+def estimate_prompt_tokens(messages):
+    """Rough token count of the messages of a chat completion request."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(part.get("text", ""))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKEN_ESTIMATE
+
+
+def estimate_tokens(kwargs):
+    """Rough token count of a chat completion request, including its completion budget."""
+    return estimate_prompt_tokens(kwargs.get("messages", [])) + (kwargs.get("max_tokens") or 0)
+
+
+def _take_tokens(tokens):
+    """Take tokens from the tokens/min bucket; returns 0, or how long to wait before trying again."""
+    if not _state["max_tpm"]:
+        return 0.0
+    with _lock:
+        now = time.monotonic()
+        capacity = _state["max_tpm"]
+        rate = capacity / 60.0
+        level = min(capacity, _state["tokens"] + (now - _state["tokens_at"]) * rate)
+        _state["tokens"], _state["tokens_at"] = level, now
+        # A request larger than the whole budget goes once the bucket is full
+        needed = min(tokens, capacity)
+        if level >= needed:
+            _state["tokens"] = level - tokens
+            return 0.0
+        delay = min((needed - level) / rate, TOKEN_POLL_INTERVAL)
+        _stats["wait_seconds"] += delay
+        return delay
+
+
+def _reserve_request():
+    """Claim the next start time allowed by the requests/sec limit; returns how long to wait for it."""
+    if not _state["max_rps"]:
+        return 0.0
+    with _lock:
+        now = time.monotonic()
+        start = max(now, _state["next_request"])
+        _state["next_request"] = start + 1.0 / _state["max_rps"]
+        _stats["wait_seconds"] += start - now
+        return start - now
+
+
+def _settle(tokens, resp):
+    """Replace a request's estimated tokens by the usage the provider reported."""
+    used = getattr(getattr(resp, "usage", None), "total_tokens", None)
+    if used and _state["max_tpm"]:
+        with _lock:
+            _state["tokens"] += tokens - used
+
+
+def _try_acquire():
+    """Take an in-flight slot if the adaptive limit allows; returns the start time or None."""
+    with _lock:
+        limit = _state["limit"]
+        if limit is not None and _state["in_flight"] >= int(limit):
+            return None
+        _state["in_flight"] += 1
+        _stats["requests"] += 1
+        return time.monotonic()
+
+
+def _release(started, throttled):
+    """Free a slot and adjust the limit: halve it on throttling, add 1/limit per success at the limit."""
+    with _lock:
+        _state["in_flight"] -= 1
+        if not _state["adaptive"]:
+            return
+        limit = _state["limit"]
+        if throttled:
+            # Requests sent before the last decrease were already accounted for
+            if started >= _state["last_decrease"]:
+                current = limit if limit is not None else _state["in_flight"] + 1
+                _state["limit"] = max(1.0, current / 2)
+                _state["last_decrease"] = time.monotonic()
+        elif limit is not None and _state["in_flight"] + 1 >= int(limit):
+            _state["limit"] = limit + 1.0 / limit
+
+
+def _retry_after(error):
+    """Seconds the provider asked to wait in a Retry-After(-ms) header, or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _throttled(error):
+    return getattr(error, "status_code", None) == 429
+
+
+def retryable(error):
+    """Whether a failed request is worth retrying: throttling, server and connection errors.
+
+    Other errors (e.g. a 400 for an oversized image) fail the same way every time.
+    """
+    status = getattr(error, "status_code", None)
+    return status == 429 or isinstance(error, openai.APIConnectionError) or status in (408, 409) \
+        or (status is not None and status >= 500)
+
+
+def _on_error(error, attempt):
+    """Record a failed attempt (its slot already released); returns the delay before retrying, or None to give up."""
+    with _lock:
+        if _throttled(error):
+            _stats["throttled"] += 1
+        elif retryable(error):
+            _stats["errors"] += 1
+        if not retryable(error):
+            return None
+        if attempt >= _state["max_retries"]:
+            _stats["gave_up"] += 1
+            return None
+        delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+        delay = max(delay, _retry_after(error) or 0.0)
+        _stats["retries"] += 1
+        _stats["backoff_seconds"] += delay
+        return delay
+
+
+def _finish(kwargs, called, provider_seconds, attempt, resp=None, error=None):
+    """Record a finished call: its latency if it succeeded, and its instrumentation event."""
+    latency = time.monotonic() - called
+    if resp is not None:
+        with _lock:
+            _latencies.append(latency)
+    instrumentation.record_call(kwargs, latency, provider_seconds, attempt, resp, error)
+
+
+def _without_sdk_retries(client):
+    """The client with the SDK's own retries turned off, since retries happen here."""
+    with _lock:
+        wrapped = _sdk_clients.get(client)
+        if wrapped is None:
+            wrapped = _sdk_clients[client] = client.with_options(max_retries=0)
+        return wrapped
+
+
+def create(client, **kwargs):
+    """client.chat.completions.create(**kwargs) under rate control, retrying transient failures."""
+    client = _without_sdk_retries(client)
+    tokens = estimate_tokens(kwargs)
+    attempt = 0
+    called = time.monotonic()
+    provider_seconds = 0.0
+    while True:
+        # Waiting requests re-check the bucket, so tokens refunded by _settle are used early
+        delay = _take_tokens(tokens)
+        while delay:
+            time.sleep(delay)
+            delay = _take_tokens(tokens)
+        time.sleep(_reserve_request())
+        started = _try_acquire()
+        while started is None:
+            time.sleep(SLOT_POLL_INTERVAL)
+            started = _try_acquire()
+
+        sent = time.monotonic()
+        error = None
+        try:
+            resp = client.chat.completions.create(**kwargs)
+        except Exception as e:
+            error = e
+        finally:
+            # Also on KeyboardInterrupt, so the slot is never leaked
+            provider_seconds += time.monotonic() - sent
+            _release(started, _throttled(error))
+
+        if error is not None:
+            delay = _on_error(error, attempt)
+            if delay is None:
+                _finish(kwargs, called, provider_seconds, attempt, error=error)
+                raise error
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        _settle(tokens, resp)
+        _finish(kwargs, called, provider_seconds, attempt, resp)
+        return resp
+
+
+async def acreate(client, **kwargs):
+    """Async variant of create for an AsyncOpenAI client."""
+    client = _without_sdk_retries(client)
+    tokens = estimate_tokens(kwargs)
+    attempt = 0
+    called = time.monotonic()
+    provider_seconds = 0.0
+    while True:
+        # Waiting requests re-check the bucket, so tokens refunded by _settle are used early
+        delay = _take_tokens(tokens)
+        while delay:
+            await asyncio.sleep(delay)
+            delay = _take_tokens(tokens)
+        await asyncio.sleep(_reserve_request())
+        started = _try_acquire()
+        while started is None:
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+            started = _try_acquire()
+
+        sent = time.monotonic()
+        error = None
+        try:
+            resp = await client.chat.completions.create(**kwargs)
+        except Exception as e:
+            error = e
+        finally:
+            # Also when the task is cancelled mid-request, so the slot is never leaked
+            provider_seconds += time.monotonic() - sent
+            _release(started, _throttled(error))
+
+        if error is not None:
+            delay = _on_error(error, attempt)
+            if delay is None:
+                _finish(kwargs, called, provider_seconds, attempt, error=error)
+                raise error
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        _settle(tokens, resp)
+        _finish(kwargs, called, provider_seconds, attempt, resp)
+        return resp
+
+
+def ratelimit_stats():
+    """Return a copy of the request/retry/throttle counters."""
+    return dict(_stats)
+
+
+def request_latencies():
+    """Return the seconds each successful request took, retries and rate limit waits included."""
+    with _lock:
+        return list(_latencies)
+
+
+def percentile(values, q):
+    """The q-th percentile (0-100, nearest rank) of values, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def print_ratelimit_stats():
+    """Print retry and throttling counters (no-op when no request was sent)."""
+    if not _stats["requests"]:
+        return
+    limit = _state["limit"]
+    print(f"\nRate control: Requests: {_stats['requests']}  Retries: {_stats['retries']}"
+          f"  Throttled (429): {_stats['throttled']}  Other errors: {_stats['errors']}  Gave up: {_stats['gave_up']}")
+    print(f"  Backoff: {_stats['backoff_seconds']:.1f}s  Rate limit wait: {_stats['wait_seconds']:.1f}s"
+          f"  Concurrency limit: {int(limit) if limit is not None else 'not reached'}")
+    latencies = request_latencies()
+    if latencies:
+        print(f"  Latency p50: {percentile(latencies, 50):.2f}s  p99: {percentile(latencies, 99):.2f}s")
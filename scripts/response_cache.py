@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = "../.cache/vlm_responses.sqlite"
+CACHE_MODES = ["off", "read", "readwrite", "refresh"]
+
+_state = {
+    "mode": "off",
+    "path": DEFAULT_CACHE_PATH,
+    "max_size_mb": None,
+    "max_age_days": None,
+    "sample_index": None,
+    "conn": None,
+}
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+_lock = threading.Lock()
+
+
+def configure_cache(mode="off", path=DEFAULT_CACHE_PATH, max_size_mb=None, max_age_days=None, sample_index=None):
+    """Enable the on-disk response cache for query_openrouter / query_openrouter_multi_image.
+
+    mode is one of CACHE_MODES: "read" only serves hits, "readwrite" serves
+    hits and stores misses, "refresh" ignores existing entries but stores the
+    new responses. sample_index is mixed into the key so repeated samples at a
+    non-zero temperature are cached separately.
+    """
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode: {mode}")
+
+    close_cache()
+    _state.update(mode=mode, path=path, max_size_mb=max_size_mb,
+                  max_age_days=max_age_days, sample_index=sample_index)
+    if mode == "off":
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+        "created REAL NOT NULL, accessed REAL NOT NULL)"
+    )
+    _state["conn"] = conn
+    evict()
+
+
+def add_cache_args(parser):
+    """Register the response cache command line options on an argparse parser."""
+    parser.add_argument("--cache", type=str, choices=CACHE_MODES, default="off",
+                        help="Response cache mode (opt-in: sampling uses temperature=0.5)")
+    parser.add_argument("--cache_path", type=str, default=DEFAULT_CACHE_PATH,
+                        help="SQLite file holding cached responses")
+    parser.add_argument("--cache_max_size_mb", type=float, default=None,
+                        help="Evict least recently used entries above this size")
+    parser.add_argument("--cache_max_age_days", type=float, default=None,
+                        help="Evict entries older than this many days")
+    parser.add_argument("--cache_sample_index", type=int, default=None,
+                        help="Sample index mixed into the cache key to keep repeated samples distinct")
+
+
+def configure_cache_from_args(args):
+    """Configure the cache from options registered with add_cache_args."""
+    configure_cache(args.cache, args.cache_path, args.cache_max_size_mb,
+                    args.cache_max_age_days, args.cache_sample_index)
+
+
+def cache_key(model, prompt, image_urls, temperature, max_tokens):
+    """Content-addressed key for a request (images are hashed by their encoded bytes)."""
+    if _state["mode"] == "off":
+        return None
+    image_hashes = [hashlib.sha256(url.encode()).hexdigest() for url in image_urls]
+    payload = json.dumps([model, prompt, image_hashes, temperature, max_tokens, _state["sample_index"]])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lookup(key):
+    """Return the cached response for key, or None."""
+    if key is None or _state["mode"] not in ("read", "readwrite"):
+        return None
+
+    with _lock:
+        conn = _state["conn"]
+        row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        _stats["hits"] += 1
+        return row[0]
+
+
+def store(key, response):
+    """Store a successful response under key."""
+    if key is None or _state["mode"] not in ("readwrite", "refresh"):
+        return
+
+    now = time.time()
+    with _lock:
+        _state["conn"].execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, response, len(response.encode()), now, now),
+        )
+        _stats["writes"] += 1
+
+
+def evict():
+    """Drop entries older than max_age_days, then least recently used ones above max_size_mb."""
+    conn = _state["conn"]
+    if conn is None:
+        return
+
+    with _lock:
+        if _state["max_age_days"] is not None:
+            cutoff = time.time() - _state["max_age_days"] * 86400
+            _stats["evicted"] += conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,)).rowcount
+
+        if _state["max_size_mb"] is not None:
+            limit = _state["max_size_mb"] * 1024 * 1024
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > limit:
+                excess = total - limit
+                freed = 0
+                stale = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if freed >= excess:
+                        break
+                    stale.append((key,))
+                    freed += size
+                conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                _stats["evicted"] += len(stale)
+
+
+def close_cache():
+    """Apply eviction and close the cache database."""
+    if _state["conn"] is not None:
+        evict()
+        _state["conn"].close()
+        _state["conn"] = None
+
+
+def cache_stats():
+    """Return a copy of the hit/miss/write/eviction counters."""
+    return dict(_stats)
+
+
+def print_cache_stats():
+    """Print cache counters (no-op when the cache is off)."""
+    if _state["mode"] == "off":
+        return
+    lookups = _stats["hits"] + _stats["misses"]
+    hit_rate = (_stats["hits"] / lookups * 100) if lookups > 0 else 0
+    print(f"\nResponse cache ({_state['mode']}, {_state['path']}):")
+    print(f"  Hits: {_stats['hits']}  Misses: {_stats['misses']}  Hit rate: {hit_rate:.2f}%")
+    print(f"  Writes: {_stats['writes']}  Evicted: {_stats['evicted']}")
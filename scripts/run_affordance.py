@@ -1,11 +1,25 @@
 import os
-import csv
-import pandas as pd
 import random
 import argparse
-from openai import OpenAI
+from config import HUMANOID_IMAGES_DIR, ROBOCASA_OBJECTS_DIR, ROBO_AFFORDANCES_GT, SYN_AFFORDANCE_GT
+from ground_truth import load_ground_truth, iter_rows
 from dotenv import load_dotenv
-from utils import query_openrouter
+from response_cache import add_cache_args, configure_cache_from_args, close_cache, print_cache_stats
+from clients import add_client_args, configure_clients_from_args, make_async_client
+from ratelimit import add_ratelimit_args, configure_ratelimit_from_args, print_ratelimit_stats
+from payload_store import load_payload_store
+import manifest
+from preprocess import add_preprocess_args, configure_preprocessing_from_args
+from checkpoint import parse_models
+from sharding import add_shard_args, configure_sharding_from_args, shard_output_path
+from engine import (evaluate_items, image_query, DEFAULT_CONCURRENCY,
+                    add_prefetch_args, configure_prefetch_from_args, print_stage_stats, stage_stats, close_prefetch)
+from instrumentation import add_instrumentation_args, configure_instrumentation_from_args, close_instrumentation
+
+
+# Result columns identifying each dataset's work items (see checkpoint.open_results)
+HUMANOID_KEY_COLUMNS = ["cam0_image", "cam1_image"]
+ROBOCASA_KEY_COLUMNS = ["object_name"]
 
 
 def build_affordance_prompt(object_name: str) -> str:
@@ -17,142 +31,155 @@ def build_affordance_prompt(object_name: str) -> str:
     )
 
 
-def evaluate_humanoid_affordances(client, model, num_samples, output_csv):
-    """Evaluate affordance understanding for Humanoid dataset (dual cam)."""
-    print("\nEvaluating affordances for Humanoid dataset...")
-    
-    humanoid_affordance_gt = "../pacbench/ground_truth/robo_affordances.psv"
-    humanoid_images_path = "../pacbench/humanoid/captured_images"
-    
-    df = pd.read_csv(humanoid_affordance_gt, sep="|")
-    df.columns = [c.strip().lower() for c in df.columns]
-
-    with open(output_csv, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow([
-            "ground_truth_affordances", "cam0_image", "cam1_image",
-            "response_cam0", "response_cam1"
-        ])
-
-        df_sample = df.head(num_samples) if num_samples else df
-        for _, row in df_sample.iterrows():
-            try:
-                cam0_file = str(row.get("cam0_file", "")).strip()
-                cam1_file = str(row.get("cam1_file", "")).strip()
-
-                if not cam0_file or not cam1_file:
-                    print(f"Skipping row with missing cam files")
-                    continue
-
-                # Collect affordances from affordance1, affordance2, affordance3 columns
-                gt_affordances = [
-                    str(a).strip() for a in [
-                        row.get("affordance1", ""),
-                        row.get("affordance2", ""),
-                        row.get("affordance3", "")
-                    ]
-                    if str(a).strip() != "" and str(a) != "nan"
-                ]
-                gt_affordances_str = ", ".join(gt_affordances) if gt_affordances else "N/A"
+def build_humanoid_affordance_items(num_samples):
+    """Yield Humanoid affordance work items with one query per camera."""
+    humanoid_images_path = HUMANOID_IMAGES_DIR
+    table = load_ground_truth(ROBO_AFFORDANCES_GT)
 
-                cam0_path = os.path.join(humanoid_images_path, cam0_file)
-                cam1_path = os.path.join(humanoid_images_path, cam1_file)
+    for row in iter_rows(table, num_samples):
+        try:
+            cam0_file = str(getattr(row, "cam0_file", "")).strip()
+            cam1_file = str(getattr(row, "cam1_file", "")).strip()
 
-                prompt = "What are the affordances of the object in the image? Respond only with all applicable affordances, separated by commas. Provide no explanation."
+            if not cam0_file or not cam1_file:
+                print(f"Skipping row with missing cam files")
+                continue
 
-                result_cam0 = (
-                    query_openrouter(client, model, prompt, cam0_path)
-                    if os.path.exists(cam0_path)
-                    else "Missing cam0"
-                )
-                result_cam1 = (
-                    query_openrouter(client, model, prompt, cam1_path)
-                    if os.path.exists(cam1_path)
-                    else "Missing cam1"
-                )
+            # Collect affordances from affordance1, affordance2, affordance3 columns
+            gt_affordances = [
+                str(a).strip() for a in [
+                    getattr(row, "affordance1", ""),
+                    getattr(row, "affordance2", ""),
+                    getattr(row, "affordance3", "")
+                ]
+                if str(a).strip() != "" and str(a) != "nan"
+            ]
+            gt_affordances_str = ", ".join(gt_affordances) if gt_affordances else "N/A"
 
-                writer.writerow([
-                    gt_affordances_str,
-                    os.path.basename(cam0_path),
-                    os.path.basename(cam1_path),
-                    result_cam0,
-                    result_cam1
-                ])
+            cam0_path = os.path.join(humanoid_images_path, cam0_file)
+            cam1_path = os.path.join(humanoid_images_path, cam1_file)
 
-                print(f"GT: {gt_affordances_str} | cam0 -> {result_cam0} | cam1 -> {result_cam1}")
+            prompt = "What are the affordances of the object in the image? Respond only with all applicable affordances, separated by commas. Provide no explanation."
 
-            except Exception as e:
-                print(f"Error evaluating humanoid affordance row: {e}")
+            yield {
+                "key": (os.path.basename(cam0_path), os.path.basename(cam1_path)),
+                "ground_truth": gt_affordances_str,
+                "cam0_image": os.path.basename(cam0_path),
+                "cam1_image": os.path.basename(cam1_path),
+                "queries": [
+                    image_query(prompt, cam0_path) if manifest.exists(cam0_path) else "Missing cam0",
+                    image_query(prompt, cam1_path) if manifest.exists(cam1_path) else "Missing cam1",
+                ],
+            }
 
-    print(f"Humanoid affordance evaluation complete. Results saved to: {output_csv}")
+        except Exception as e:
+            print(f"Error evaluating humanoid affordance row: {e}")
 
 
-def evaluate_robocasa_affordances(client, model, num_samples, output_csv):
+def evaluate_humanoid_affordances(client, model, num_samples, output_csv, concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None):
+    """Evaluate affordance understanding for Humanoid dataset (dual cam)."""
+    print("\nEvaluating affordances for Humanoid dataset...")
+
+    header = [
+        "ground_truth_affordances", "cam0_image", "cam1_image",
+        "response_cam0", "response_cam1"
+    ]
+
+    def make_row(item, responses):
+        result_cam0, result_cam1 = responses
+        row = [
+            item["ground_truth"],
+            item["cam0_image"],
+            item["cam1_image"],
+            result_cam0,
+            result_cam1
+        ]
+        print(f"GT: {item['ground_truth']} | cam0 -> {result_cam0} | cam1 -> {result_cam1}")
+        return row
+
+    failed = evaluate_items(client, model, build_humanoid_affordance_items(num_samples), output_csv, header,
+                            HUMANOID_KEY_COLUMNS, make_row, concurrency, resume, on_row,
+                            labels={"task": "affordances", "dataset": "humanoid"})
+
+    print(f"Humanoid affordance evaluation complete. Results saved to: {output_csv}")
+    return failed
+
+
+def build_robocasa_affordance_items(num_samples):
+    """Yield RoboCasa affordance work items, one per object row."""
+    robocasa_path = ROBOCASA_OBJECTS_DIR
+    table = load_ground_truth(SYN_AFFORDANCE_GT)
+
+    for row in iter_rows(table, num_samples):
+        try:
+            obj_name = str(getattr(row, "object_name", "")).strip()
+            if not obj_name:
+                continue
+
+            # Collect all non-empty affordances
+            gt_affordances = [
+                str(a).strip().lower() for a in [
+                    getattr(row, "affordance1", ""),
+                    getattr(row, "affordance2", ""),
+                    getattr(row, "affordance3", "")
+                ]
+                if isinstance(a, str) and a.strip() != "" and a != "nan"
+            ]
+            if not gt_affordances:
+                continue
+
+            # Find image directory
+            obj_dir = os.path.join(robocasa_path, obj_name+"/unnamed")
+
+            if not manifest.isdir(obj_dir):
+                print(f"No folder found for {obj_name}")
+                continue
+
+            # Sample one image, seeded by the object name so reruns send the same
+            # image and hit the response cache
+            images = [f for f in manifest.listdir(obj_dir) if f.lower().endswith(('.png', '.jpg'))]
+            if not images:
+                print(f"No images found for {obj_name}")
+                continue
+            sampled_image = random.Random(obj_name).choice(sorted(images))
+            img_path = os.path.join(obj_dir, sampled_image)
+
+            yield {
+                "key": (obj_name,),
+                "object_name": obj_name,
+                "ground_truth": gt_affordances,
+                "image": os.path.basename(img_path),
+                "queries": [image_query(build_affordance_prompt(obj_name), img_path)],
+            }
+
+        except Exception as e:
+            print(f"Error evaluating RoboCasa affordance row: {e}")
+
+
+def evaluate_robocasa_affordances(client, model, num_samples, output_csv, concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None):
     """Evaluate affordance understanding for RoboCasa dataset."""
     print("\nEvaluating affordances for RoboCasa dataset...")
-    
-    robocasa_affordance_gt = "../pacbench/ground_truth/syn_affordance.psv"
-    robocasa_path = "../pacbench/robocasa_objects/object_views"
-    
-    df = pd.read_csv(robocasa_affordance_gt, sep="|")
-    df.columns = [c.strip().lower() for c in df.columns]
-
-    with open(output_csv, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow([
-            "object_name", "ground_truth_affordances",
-            "sampled_image", "model_response",
-        ])
-
-        df_sample = df.head(num_samples) if num_samples else df
-        for _, row in df_sample.iterrows():
-            try:
-                obj_name = str(row.get("object_name", "")).strip()
-                if not obj_name:
-                    continue
-                
-                # Collect all non-empty affordances
-                gt_affordances = [
-                    str(a).strip().lower() for a in [
-                        row.get("affordance1", ""),
-                        row.get("affordance2", ""),
-                        row.get("affordance3", "")
-                    ]
-                    if isinstance(a, str) and a.strip() != "" and a != "nan"
-                ]
-                if not gt_affordances:
-                    continue
-
-                # Find image directory
-                obj_dir = os.path.join(robocasa_path, obj_name+"/unnamed")
-             
-                if not os.path.isdir(obj_dir):
-                    print(f"No folder found for {obj_name}")
-                    continue
-                
-                # Randomly sample one image
-                images = [f for f in os.listdir(obj_dir) if f.lower().endswith(('.png', '.jpg'))]
-                if not images:
-                    print(f"No images found for {obj_name}")
-                    continue
-                sampled_image = random.choice(images)
-                img_path = os.path.join(obj_dir, sampled_image)
-
-                # Query the model
-                prompt = build_affordance_prompt(obj_name)
-                result = query_openrouter(client, model, prompt, img_path).lower()
-
-                writer.writerow([
-                    obj_name, ", ".join(gt_affordances),
-                    os.path.basename(img_path), result,
-                ])
-
-                print(f"{obj_name} → {result} | GT: {gt_affordances}")
-
-            except Exception as e:
-                print(f"Error evaluating RoboCasa affordance row: {e}")
+
+    header = [
+        "object_name", "ground_truth_affordances",
+        "sampled_image", "model_response",
+    ]
+
+    def make_row(item, responses):
+        result = responses[0].lower()
+        row = [
+            item["object_name"], ", ".join(item["ground_truth"]),
+            item["image"], result,
+        ]
+        print(f"{item['object_name']} → {result} | GT: {item['ground_truth']}")
+        return row
+
+    failed = evaluate_items(client, model, build_robocasa_affordance_items(num_samples), output_csv, header,
+                            ROBOCASA_KEY_COLUMNS, make_row, concurrency, resume, on_row,
+                            labels={"task": "affordances", "dataset": "robocasa"})
 
     print(f"RoboCasa affordance evaluation complete. Results saved to: {output_csv}")
+    return failed
 
 
 def main():
@@ -163,35 +190,73 @@ def main():
     if not OPENROUTER_API_KEY:
         raise EnvironmentError("OPENROUTER_API_KEY not set in environment variables.")
 
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPENROUTER_API_KEY)
-
     # Argument parser
     parser = argparse.ArgumentParser(description="Evaluate VLM affordance understanding across multiple datasets")
     parser.add_argument("--model", type=str, default="meta-llama/llama-4-maverick",
                         help="Model name to use for evaluation")
+    parser.add_argument("--models", type=str, default=None,
+                        help="Comma-separated models to evaluate in one sweep (overrides --model); "
+                             "results go to a subdirectory of --output_dir per model")
     parser.add_argument("--num_samples", type=int, default=None,
                         help="Number of samples to evaluate per dataset (default: all)")
     parser.add_argument("--output_dir", type=str, default="../affordance_results",
                         help="Directory to save results")
     parser.add_argument("--dataset", type=str, choices=["humanoid", "robocasa", "all"],
                         default="all", help="Which dataset to evaluate")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum number of in-flight API requests")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep existing output CSVs and only evaluate items not yet written")
+    add_cache_args(parser)
+    add_ratelimit_args(parser)
+    add_client_args(parser)
+    add_preprocess_args(parser)
+    add_prefetch_args(parser)
+    add_instrumentation_args(parser)
+    parser.add_argument("--payload_store", type=str, default=None,
+                        help="Path prefix of a store built by payload_store.py to serve pre-encoded images from")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Dataset index built by manifest.py to list and check image files from")
+    add_shard_args(parser)
 
     args = parser.parse_args()
+    model = parse_models(args.models) if args.models else args.model
+    configure_cache_from_args(args)
+    configure_ratelimit_from_args(args)
+    configure_clients_from_args(args)
+    client = make_async_client(OPENROUTER_API_KEY)
+    configure_preprocessing_from_args(args)
+    configure_sharding_from_args(args)
+    if args.payload_store:
+        load_payload_store(args.payload_store)
+    if args.manifest:
+        manifest.load_manifest(args.manifest)
+    configure_prefetch_from_args(args)
+    configure_instrumentation_from_args(args)
 
     # Create results directory
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Define output paths
-    output_csv_humanoid = os.path.join(args.output_dir, "openrouter_humanoid_affordance_results.csv")
-    output_csv_robocasa = os.path.join(args.output_dir, "openrouter_robocasa_affordance_results.csv")
+    output_csv_humanoid = shard_output_path(os.path.join(args.output_dir, "openrouter_humanoid_affordance_results.csv"))
+    output_csv_robocasa = shard_output_path(os.path.join(args.output_dir, "openrouter_robocasa_affordance_results.csv"))
 
     # Run evaluations based on dataset argument
     if args.dataset in ["humanoid", "all"]:
-        evaluate_humanoid_affordances(client, args.model, args.num_samples, output_csv_humanoid)
+        evaluate_humanoid_affordances(client, model, args.num_samples, output_csv_humanoid, args.concurrency, args.resume)
     
     if args.dataset in ["robocasa", "all"]:
-        evaluate_robocasa_affordances(client, args.model, args.num_samples, output_csv_robocasa)
-
+        evaluate_robocasa_affordances(client, model, args.num_samples, output_csv_robocasa, args.concurrency, args.resume)
+
+    print_stage_stats()
+    print_cache_stats()
+    print_ratelimit_stats()
+    close_cache()
+    close_prefetch()
+    close_instrumentation()
+    # Items that failed after all retries were left out of the results
+    if stage_stats()["failed"]:
+        raise SystemExit(1)
     print("\nAll evaluations complete!")
 
 
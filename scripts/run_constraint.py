@@ -1,152 +1,283 @@
 import os
-import csv
-import pandas as pd
 import argparse
-from openai import OpenAI
+from config import HUMANOID_IMAGES_DIR, CONSTRAINT_IMAGES_DIR, ROBO_CONSTRAINTS_GT, SYN_CONSTRAINTS_GT
+from ground_truth import load_ground_truth, iter_rows
 from dotenv import load_dotenv
-from utils import query_openrouter, query_openrouter_multi_image
+from response_cache import add_cache_args, configure_cache_from_args, close_cache, print_cache_stats
+from clients import add_client_args, configure_clients_from_args, make_async_client
+from ratelimit import add_ratelimit_args, configure_ratelimit_from_args, print_ratelimit_stats
+from payload_store import load_payload_store
+import manifest
+from preprocess import add_preprocess_args, configure_preprocessing_from_args
+from checkpoint import parse_models
+from sharding import add_shard_args, configure_sharding_from_args, shard_output_path
+from engine import (evaluate_items, image_query, multi_image_query, DEFAULT_CONCURRENCY,
+                    add_prefetch_args, configure_prefetch_from_args, print_stage_stats, stage_stats, close_prefetch)
+from instrumentation import add_instrumentation_args, configure_instrumentation_from_args, close_instrumentation
+
+
+# Result columns identifying each dataset's work items (see checkpoint.open_results)
+HUMANOID_KEY_COLUMNS = ["question", "cam0_image", "cam1_image"]
+SIM_KEY_COLUMNS = ["constraint_key", "view", "image_file"]
+
+# Camera views of each simulated constraint, in the order they are packed
+SIM_VIEWS = ["agentview", "frontview", "sideview"]
+
+# The view column of packed simulated rows, read by verify_results as the "multi" camera
+MULTI_VIEW = "multi"
+
+# "off": one request per (key, view, image); "frame": one request per (key, frame)
+# with every view of that frame; "key": one request per key with every
+# frame_stride-th frame of every view, split into several requests when that
+# exceeds max_images_per_request
+SIM_PACK_MODES = ["off", "frame", "key"]
+
+# Images sent in one packed request; providers reject requests with too many images
+DEFAULT_MAX_IMAGES_PER_REQUEST = 6
+
+_sim_packing = {"mode": "off", "frame_stride": 1, "max_images": DEFAULT_MAX_IMAGES_PER_REQUEST}
+
+
+def configure_sim_packing(mode="off", frame_stride=1, max_images=DEFAULT_MAX_IMAGES_PER_REQUEST):
+    """Choose how simulated constraint images are grouped into requests (see SIM_PACK_MODES)."""
+    if mode not in SIM_PACK_MODES:
+        raise ValueError(f"Unknown simulated packing mode: {mode}")
+    if frame_stride < 1:
+        raise ValueError(f"frame_stride must be at least 1, got {frame_stride}")
+    if max_images < len(SIM_VIEWS):
+        raise ValueError(f"max_images must be at least {len(SIM_VIEWS)} so a frame's views fit in one request, "
+                         f"got {max_images}")
+    _sim_packing.update(mode=mode, frame_stride=frame_stride, max_images=max_images)
+
+
+def sim_packing_settings():
+    """The current packing settings, e.g. to key cached results on."""
+    return dict(_sim_packing)
+
+
+def add_sim_packing_args(parser):
+    """Register the simulated constraint packing options on an argparse parser."""
+    parser.add_argument("--sim_pack", type=str, choices=SIM_PACK_MODES, default="off",
+                        help="Send the simulated constraint views together: one request per frame with all "
+                             "views, or one per constraint key; rows are written with view 'multi'")
+    parser.add_argument("--frame_stride", type=int, default=1,
+                        help="With --sim_pack, only send every Nth frame (by file name) of each view")
+    parser.add_argument("--max_images_per_request", type=int, default=DEFAULT_MAX_IMAGES_PER_REQUEST,
+                        help="With --sim_pack key, split a key's frames over several requests of at most this many images")
+
+
+def configure_sim_packing_from_args(args):
+    """Configure packing from the options registered with add_sim_packing_args."""
+    configure_sim_packing(args.sim_pack, args.frame_stride, args.max_images_per_request)
+
+
+def build_candidate_prompt(question):
+    """Build the unified candidate prompt for constraint reasoning."""
+    return (
+        f"Given the image(s), tell me if there is any constraint that would stop us "
+        f"from doing the following (Answer in 1 very short line): {question}"
+    )
+
+
+def build_humanoid_constraint_items(num_samples):
+    """Yield Humanoid constraint work items (cam0, cam1 and both cams)."""
+    humanoid_images_path = HUMANOID_IMAGES_DIR
+    table = load_ground_truth(ROBO_CONSTRAINTS_GT)
+
+    for row in iter_rows(table, num_samples):
+        try:
+            question = str(getattr(row, "question", "")).strip()
+            answer = str(getattr(row, "answer", "")).strip()
+            cam0_file = str(getattr(row, "cam0_file", "")).strip()
+            cam1_file = str(getattr(row, "cam1_file", "")).strip()
+
+            cam0_path = os.path.join(humanoid_images_path, cam0_file)
+            cam1_path = os.path.join(humanoid_images_path, cam1_file)
+
+            if not manifest.exists(cam0_path) and not manifest.exists(cam1_path):
+                print(f"Skipping: missing both cams for {question}")
+                continue
+
+            # --- use the unified candidate prompt ---
+            candidate_prompt = build_candidate_prompt(question)
+
+            # Query both camera views individually, then both cameras together
+            available_cams = [p for p in (cam0_path, cam1_path) if manifest.exists(p)]
+
+            yield {
+                "key": (question, os.path.basename(cam0_path), os.path.basename(cam1_path)),
+                "question": question,
+                "answer": answer,
+                "cam0_image": os.path.basename(cam0_path),
+                "cam1_image": os.path.basename(cam1_path),
+                "queries": [
+                    image_query(candidate_prompt, cam0_path) if manifest.exists(cam0_path) else "Missing cam0",
+                    image_query(candidate_prompt, cam1_path) if manifest.exists(cam1_path) else "Missing cam1",
+                    multi_image_query(candidate_prompt, available_cams) if available_cams else "No cameras available",
+                ],
+            }
 
+        except Exception as e:
+            print(f"Error processing humanoid constraint row: {e}")
 
-def evaluate_humanoid_constraints(client, model, num_samples, output_csv):
+
+def evaluate_humanoid_constraints(client, model, num_samples, output_csv, concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None):
     """Evaluate constraint reasoning for Humanoid dataset (dual cam)."""
     print("\nEvaluating constraints for Humanoid dataset...")
-    
-    humanoid_constraints_gt = "../pacbench/ground_truth/robo_constraints.psv"
-    humanoid_images_path = "../pacbench/humanoid/captured_images"
-    
-    df = pd.read_csv(humanoid_constraints_gt, sep="|")
-    df.columns = [c.strip().lower() for c in df.columns]
-
-    with open(output_csv, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow([
-            "question", "ground_truth_answer",
-            "cam0_image", "cam1_image",
-            "response_cam0", "response_cam1", "response_both_cams"
-        ])
-
-        df_sample = df.head(num_samples) if num_samples else df
-        for _, row in df_sample.iterrows():
-            try:
-                question = str(row.get("question", "")).strip()
-                answer = str(row.get("answer", "")).strip()
-                cam0_file = str(row.get("cam0_file", "")).strip()
-                cam1_file = str(row.get("cam1_file", "")).strip()
-
-                cam0_path = os.path.join(humanoid_images_path, cam0_file)
-                cam1_path = os.path.join(humanoid_images_path, cam1_file)
-
-                if not os.path.exists(cam0_path) and not os.path.exists(cam1_path):
-                    print(f"Skipping: missing both cams for {question}")
-                    continue
 
-                # --- use the unified candidate prompt ---
-                candidate_prompt = (
-                    f"Given the image(s), tell me if there is any constraint that would stop us "
-                    f"from doing the following (Answer in 1 very short line): {question}"
-                )
-
-                # Query both camera views individually
-                result_cam0 = (
-                    query_openrouter(client, model, candidate_prompt, cam0_path)
-                    if os.path.exists(cam0_path)
-                    else "Missing cam0"
-                )
-                result_cam1 = (
-                    query_openrouter(client, model, candidate_prompt, cam1_path)
-                    if os.path.exists(cam1_path)
-                    else "Missing cam1"
-                )
-
-                # Query with both cameras together
-                available_cams = []
-                if os.path.exists(cam0_path):
-                    available_cams.append(cam0_path)
-                if os.path.exists(cam1_path):
-                    available_cams.append(cam1_path)
-                
-                result_both = (
-                    query_openrouter_multi_image(client, model, candidate_prompt, available_cams)
-                    if available_cams
-                    else "No cameras available"
-                )
-
-                writer.writerow([
-                    question, answer,
-                    os.path.basename(cam0_path), os.path.basename(cam1_path),
-                    result_cam0, result_cam1, result_both
-                ])
-                print(f"Q: {question}\ncam0 → {result_cam0}\ncam1 → {result_cam1}\nboth → {result_both}\n")
-
-            except Exception as e:
-                print(f"Error processing humanoid constraint row: {e}")
+    header = [
+        "question", "ground_truth_answer",
+        "cam0_image", "cam1_image",
+        "response_cam0", "response_cam1", "response_both_cams"
+    ]
+
+    def make_row(item, responses):
+        result_cam0, result_cam1, result_both = responses
+        row = [
+            item["question"], item["answer"],
+            item["cam0_image"], item["cam1_image"],
+            result_cam0, result_cam1, result_both
+        ]
+        print(f"Q: {item['question']}\ncam0 → {result_cam0}\ncam1 → {result_cam1}\nboth → {result_both}\n")
+        return row
+
+    failed = evaluate_items(client, model, build_humanoid_constraint_items(num_samples), output_csv, header,
+                            HUMANOID_KEY_COLUMNS, make_row, concurrency, resume, on_row,
+                            labels={"task": "constraints", "dataset": "humanoid"})
 
     print(f"Humanoid constraint evaluation complete. Results saved to: {output_csv}")
+    return failed
+
+
+def _frame_groups(frame_views):
+    """Group (frame, views) pairs into requests: one frame each in "frame" mode, else up to max_images images each."""
+    per_request = 1 if _sim_packing["mode"] == "frame" else None
+    groups, group, count = [], [], 0
+    for frame, views in frame_views:
+        if group and (len(group) == per_request or count + len(views) > _sim_packing["max_images"]):
+            groups.append(group)
+            group, count = [], 0
+        group.append((frame, views))
+        count += len(views)
+    return groups + [group] if group else groups
+
+
+def _packed_sim_items(item, constraint_dir, view_images, candidate_prompt):
+    """Yield the multi-view work items of one constraint key (see SIM_PACK_MODES).
+
+    Frames are matched across views by file name and taken in name order,
+    every frame_stride-th one. A frame only one view has stays a per-view
+    row, as without packing. The image_file of a packed row lists its
+    images as view/file, separated by ";".
+    """
+    available = {view: set(images) for view, images in view_images.items()}
+    frames = sorted(set().union(*available.values()))[::_sim_packing["frame_stride"]]
+    frame_views = [(frame, [view for view in SIM_VIEWS if frame in available.get(view, ())]) for frame in frames]
+
+    for frame, views in frame_views:
+        if len(views) == 1:
+            yield {
+                **item,
+                "key": (item["constraint_key"], views[0], frame),
+                "view": views[0],
+                "image": frame,
+                "queries": [image_query(candidate_prompt, os.path.join(constraint_dir, views[0], frame))],
+            }
+
+    for group in _frame_groups([(frame, views) for frame, views in frame_views if len(views) > 1]):
+        images = [(view, frame) for frame, views in group for view in views]
+        image_file = ";".join(f"{view}/{frame}" for view, frame in images)
+        yield {
+            **item,
+            "key": (item["constraint_key"], MULTI_VIEW, image_file),
+            "view": MULTI_VIEW,
+            "image": image_file,
+            "queries": [multi_image_query(candidate_prompt,
+                                          [os.path.join(constraint_dir, view, frame) for view, frame in images])],
+        }
+
+
+def build_sim_constraint_items(num_samples):
+    """Yield simulated constraint work items, one per (key, view, image), or per packed group of views."""
+    sim_images_path = CONSTRAINT_IMAGES_DIR
+    table = load_ground_truth(SYN_CONSTRAINTS_GT)
+
+    for row in iter_rows(table, num_samples):
+        try:
+            key = str(getattr(row, "key", "")).strip()
+            question = str(getattr(row, "prompt", "")).strip()
+            verification_prompt = str(getattr(row, "verification_prompt", "")).strip()
+
+            # Constraint folder path (e.g. constraint_images/stack_bottom)
+            constraint_dir = os.path.join(sim_images_path, key)
+            if not manifest.isdir(constraint_dir):
+                print(f"No folder found for constraint key: {key}")
+                continue
+
+            # Unified candidate prompt from your template
+            candidate_prompt = build_candidate_prompt(question)
+
+            # Each constraint folder has subfolders: agentview, frontview, sideview
+            view_images = {}
+            for view in SIM_VIEWS:
+                view_path = os.path.join(constraint_dir, view)
+                if not manifest.isdir(view_path):
+                    continue
 
-
-def evaluate_sim_constraints(client, model, num_samples, output_csv):
+                images = [f for f in manifest.listdir(view_path) if f.lower().endswith(('.png', '.jpg'))]
+                if not images:
+                    print(f"No images found for {key}/{view}")
+                    continue
+                view_images[view] = images
+
+            item = {
+                "constraint_key": key,
+                "question": question,
+                "verification_prompt": verification_prompt,
+            }
+            if _sim_packing["mode"] != "off":
+                yield from _packed_sim_items(item, constraint_dir, view_images, candidate_prompt)
+                continue
+
+            for view, images in view_images.items():
+                for img_name in images:
+                    img_path = os.path.join(constraint_dir, view, img_name)
+                    yield {
+                        **item,
+                        "key": (key, view, img_name),
+                        "view": view,
+                        "image": os.path.basename(img_path),
+                        "queries": [image_query(candidate_prompt, img_path)],
+                    }
+
+        except Exception as e:
+            print(f"Error processing simulated constraint row: {e}")
+
+
+def evaluate_sim_constraints(client, model, num_samples, output_csv, concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None):
     """Evaluate simulated constraint reasoning (MuJoCo / RoboCasa-style) with multi-view support."""
     print("\nEvaluating simulated constraint dataset...")
-    
-    sim_constraints_gt = "../pacbench/ground_truth/syn_constraints.psv"
-    sim_images_path = "../pacbench/constraint_images"
-    
-    df = pd.read_csv(sim_constraints_gt, sep="|")
-    df.columns = [c.strip().lower() for c in df.columns]
-
-    with open(output_csv, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow([
-            "constraint_key", "view", "prompt", "verification_prompt",
-            "image_file", "model_response"
-        ])
-
-        df_sample = df.head(num_samples) if num_samples else df
-        for _, row in df_sample.iterrows():
-            try:
-                key = str(row.get("key", "")).strip()
-                question = str(row.get("prompt", "")).strip()
-                verification_prompt = str(row.get("verification_prompt", "")).strip()
-
-                # Constraint folder path (e.g. constraint_images/stack_bottom)
-                constraint_dir = os.path.join(sim_images_path, key)
-                if not os.path.isdir(constraint_dir):
-                    print(f"No folder found for constraint key: {key}")
-                    continue
-
-                # Each constraint folder has subfolders: agentview, frontview, sideview
-                for view in ["agentview", "frontview", "sideview"]:
-                    view_path = os.path.join(constraint_dir, view)
-                    if not os.path.isdir(view_path):
-                        continue
-
-                    images = [f for f in os.listdir(view_path) if f.lower().endswith(('.png', '.jpg'))]
-                    if not images:
-                        print(f"No images found for {key}/{view}")
-                        continue
-
-                    for img_name in images:
-                        img_path = os.path.join(view_path, img_name)
 
-                        # Unified candidate prompt from your template
-                        candidate_prompt = (
-                            f"Given the image(s), tell me if there is any constraint that would stop us "
-                            f"from doing the following (Answer in 1 very short line): {question}"
-                        )
+    header = [
+        "constraint_key", "view", "prompt", "verification_prompt",
+        "image_file", "model_response"
+    ]
 
-                        result = query_openrouter(client, model, candidate_prompt, img_path)
+    def make_row(item, responses):
+        result, = responses
+        row = [
+            item["constraint_key"], item["view"], item["question"], item["verification_prompt"],
+            item["image"], result
+        ]
+        print(f"{item['constraint_key']}/{item['view']} | {item['image']} → {result}")
+        return row
 
-                        writer.writerow([
-                            key, view, question, verification_prompt,
-                            os.path.basename(img_path), result
-                        ])
-
-                        print(f"{key}/{view} | {img_name} → {result}")
-
-            except Exception as e:
-                print(f"Error processing simulated constraint row: {e}")
+    failed = evaluate_items(client, model, build_sim_constraint_items(num_samples), output_csv, header,
+                            SIM_KEY_COLUMNS, make_row, concurrency, resume, on_row,
+                            labels={"task": "constraints", "dataset": "simulated"})
 
     print(f"Simulated constraint evaluation complete. Results saved to: {output_csv}")
+    return failed
 
 
 def main():
@@ -157,35 +288,75 @@ def main():
     if not OPENROUTER_API_KEY:
         raise EnvironmentError("OPENROUTER_API_KEY not set in environment variables.")
 
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPENROUTER_API_KEY)
-
     # Argument parser
     parser = argparse.ArgumentParser(description="Evaluate VLM constraint reasoning across multiple datasets")
     parser.add_argument("--model", type=str, default="meta-llama/llama-4-maverick",
                         help="Model name to use for evaluation")
+    parser.add_argument("--models", type=str, default=None,
+                        help="Comma-separated models to evaluate in one sweep (overrides --model); "
+                             "results go to a subdirectory of --output_dir per model")
     parser.add_argument("--num_samples", type=int, default=None,
                         help="Number of samples to evaluate per dataset (default: all)")
     parser.add_argument("--output_dir", type=str, default="../constraint_results",
                         help="Directory to save results")
     parser.add_argument("--dataset", type=str, choices=["humanoid", "simulated", "all"],
                         default="all", help="Which dataset to evaluate")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum number of in-flight API requests")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep existing output CSVs and only evaluate items not yet written")
+    add_cache_args(parser)
+    add_ratelimit_args(parser)
+    add_client_args(parser)
+    add_preprocess_args(parser)
+    add_prefetch_args(parser)
+    add_instrumentation_args(parser)
+    parser.add_argument("--payload_store", type=str, default=None,
+                        help="Path prefix of a store built by payload_store.py to serve pre-encoded images from")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Dataset index built by manifest.py to list and check image files from")
+    add_shard_args(parser)
+    add_sim_packing_args(parser)
 
     args = parser.parse_args()
+    model = parse_models(args.models) if args.models else args.model
+    configure_cache_from_args(args)
+    configure_ratelimit_from_args(args)
+    configure_clients_from_args(args)
+    client = make_async_client(OPENROUTER_API_KEY)
+    configure_preprocessing_from_args(args)
+    configure_sharding_from_args(args)
+    configure_sim_packing_from_args(args)
+    if args.payload_store:
+        load_payload_store(args.payload_store)
+    if args.manifest:
+        manifest.load_manifest(args.manifest)
+    configure_prefetch_from_args(args)
+    configure_instrumentation_from_args(args)
 
     # Create results directory
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Define output paths
-    output_csv_humanoid = os.path.join(args.output_dir, "openrouter_humanoid_constraint_results.csv")
-    output_csv_sim = os.path.join(args.output_dir, "openrouter_sim_constraint_results.csv")
+    output_csv_humanoid = shard_output_path(os.path.join(args.output_dir, "openrouter_humanoid_constraint_results.csv"))
+    output_csv_sim = shard_output_path(os.path.join(args.output_dir, "openrouter_sim_constraint_results.csv"))
 
     # Run evaluations based on dataset argument
     if args.dataset in ["humanoid", "all"]:
-        evaluate_humanoid_constraints(client, args.model, args.num_samples, output_csv_humanoid)
+        evaluate_humanoid_constraints(client, model, args.num_samples, output_csv_humanoid, args.concurrency, args.resume)
     
     if args.dataset in ["simulated", "all"]:
-        evaluate_sim_constraints(client, args.model, args.num_samples, output_csv_sim)
-
+        evaluate_sim_constraints(client, model, args.num_samples, output_csv_sim, args.concurrency, args.resume)
+
+    print_stage_stats()
+    print_cache_stats()
+    print_ratelimit_stats()
+    close_cache()
+    close_prefetch()
+    close_instrumentation()
+    # Items that failed after all retries were left out of the results
+    if stage_stats()["failed"]:
+        raise SystemExit(1)
     print("\nAll evaluations complete!")
 
 
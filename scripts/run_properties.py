@@ -1,14 +1,29 @@
 import os
-import pandas as pd
-import csv
 import random
 import argparse
-from openai import OpenAI
-from config import property_ground_files, PROPERTY_MCQ_OPTIONS
-from utils import query_openrouter
+from config import (property_ground_files, PROPERTY_MCQ_OPTIONS, GROUND_TRUTH_DIR, OPEN_IMAGES_DIR,
+                    ROBOCASA_OBJECTS_DIR, HUMANOID_IMAGES_DIR, SYN_PROPERTIES_GT, ROBO_PROPERTIES_GT)
+from ground_truth import load_ground_truth, iter_rows, rows_at, lookup, row_count
+from response_cache import add_cache_args, configure_cache_from_args, close_cache, print_cache_stats
+from clients import add_client_args, configure_clients_from_args, make_async_client
+from ratelimit import add_ratelimit_args, configure_ratelimit_from_args, print_ratelimit_stats
+from payload_store import load_payload_store
+import manifest
+from preprocess import add_preprocess_args, configure_preprocessing_from_args
+from checkpoint import parse_models
+from sharding import add_shard_args, configure_sharding_from_args, shard_output_path
+from engine import (evaluate_items, image_query, DEFAULT_CONCURRENCY,
+                    add_prefetch_args, configure_prefetch_from_args, print_stage_stats, stage_stats, close_prefetch)
+from instrumentation import add_instrumentation_args, configure_instrumentation_from_args, close_instrumentation
 from dotenv import load_dotenv
 
 
+# Result columns identifying each dataset's work items (see checkpoint.open_results)
+OPENIMAGES_KEY_COLUMNS = ["property", "image_filename"]
+ROBOCASA_KEY_COLUMNS = ["object_name", "property_name"]
+HUMANOID_KEY_COLUMNS = ["property_name", "cam0_image", "cam1_image"]
+
+
 def build_prompt(property_name, options):
     """Builds the property-specific prompt."""
     return (
@@ -19,167 +34,207 @@ def build_prompt(property_name, options):
     )
 
 
-def evaluate_openimages(client, model_name, num_samples, output_csv):
-    """Evaluate property understanding on Open Images dataset."""
-    print("\nStarting evaluation for Open Images dataset...")
-    
-    properties_path = "../pacbench/ground_truth"
-    images_base_path = "../pacbench/open_images"
-    
-    with open(output_csv, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(["property", "image_filename", "ground_truth_choice", "model_response"])
-
-        for filename in property_ground_files:
-            file_path = os.path.join(properties_path, filename)
-            try:
-                prop = filename.split("_")[-2].upper()
-                print(f"\n🔍 Evaluating property: {prop}")
-
-                df = pd.read_csv(file_path)
-                print(f"Loaded {filename} with {len(df)} rows.\n")
-
-                options = PROPERTY_MCQ_OPTIONS.get(prop)
-                if not options:
-                    print(f"No options defined for {prop}. Skipping.")
-                    continue
-
-                # Evaluate samples based on num_samples argument
-                df_sample = df.head(num_samples) if num_samples else df
-                for _, row in df_sample.iterrows():
-                    image_filename = str(row["image"]).strip()
-                    ground_truth = str(row["choice"]).strip()
-
-                    img_path = os.path.join(images_base_path, f"{image_filename}.jpg")
-
-                    if not os.path.exists(img_path):
-                        print(f"image missing for: {image_filename}")
-                        continue
-
-                    prompt = build_prompt(prop, options)
-                    result = query_openrouter(client, model_name, prompt, img_path)
+def build_openimages_items(num_samples):
+    """Yield Open Images property work items in evaluation order."""
+    properties_path = GROUND_TRUTH_DIR
+    images_base_path = OPEN_IMAGES_DIR
 
-                    writer.writerow([prop, os.path.basename(img_path), ground_truth, result])
-                    print(f"{os.path.basename(img_path)} → {result} | GT: {ground_truth}")
+    for filename in property_ground_files:
+        file_path = os.path.join(properties_path, filename)
+        try:
+            prop = filename.split("_")[-2].upper()
+            print(f"\n🔍 Evaluating property: {prop}")
 
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
+            table = load_ground_truth(file_path, sep=",")
+            print(f"Loaded {filename} with {row_count(table)} rows.\n")
 
-    print(f"\nOpen Images evaluation complete! Results saved to: {output_csv}")
-
-
-def evaluate_robocasa(client, model_name, num_samples, output_csv):
-    """Evaluate property understanding on RoboCasa dataset."""
-    print("\nStarting evaluation for RoboCasa dataset...")
-    
-    robocasa_path = "../pacbench/robocasa_objects/object_views"
-    robocasa_gt_file = "../pacbench/ground_truth/syn_properties.psv"
-    
-    ground_truth_df = pd.read_csv(robocasa_gt_file, sep="|")
-    ground_truth_df.columns = [c.strip().lower() for c in ground_truth_df.columns]
-
-    with open(output_csv, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow([
-            "object_name", "property_name", "ground_truth_category",
-            "ground_truth_descriptors", "sampled_image", "model_response"
-        ])
-
-        objects_to_process = sorted(os.listdir(robocasa_path))
-        if num_samples:
-            objects_to_process = objects_to_process[:num_samples]
-        
-        for obj_name in objects_to_process:
-            obj_dir = os.path.join(robocasa_path, obj_name+"/unnamed")
-            print(obj_dir)
-
-            # Randomly sample one image for that object
-            images = [f for f in os.listdir(obj_dir) if f.lower().endswith(('.png'))]
-            if not images:
-                print(f"No images found for {obj_name}")
+            options = PROPERTY_MCQ_OPTIONS.get(prop)
+            if not options:
+                print(f"No options defined for {prop}. Skipping.")
                 continue
 
-            sampled_image = random.choice(images)
-            img_path = os.path.join(obj_dir, sampled_image)
-
-            # Find ground truth info for that object
-            matches = ground_truth_df[ground_truth_df["object_name"].str.lower() == obj_name.lower()]
-            if matches.empty:
-                print(f"No ground truth found for {obj_name}")
-                continue
+            # Evaluate samples based on num_samples argument
+            for row in iter_rows(table, num_samples):
+                image_filename = str(row.image).strip()
+                ground_truth = str(row.choice).strip()
 
-            matches_sample = matches.head(num_samples) if num_samples else matches
-            for _, row in matches_sample.iterrows():
-                prop = str(row["property_name"]).strip().upper()
-                gt_category = str(row["selected_category"]).strip()
-                gt_desc = str(row["selected_descriptors"]).strip()
-                options = PROPERTY_MCQ_OPTIONS.get(prop)
+                img_path = os.path.join(images_base_path, f"{image_filename}.jpg")
 
-                if not options:
-                    print(f"No options defined for {prop}. Skipping {obj_name}.")
+                if not manifest.exists(img_path):
+                    print(f"image missing for: {image_filename}")
                     continue
 
                 prompt = build_prompt(prop, options)
-                result = query_openrouter(client, model_name, prompt, img_path)
+                yield {
+                    "key": (prop, os.path.basename(img_path)),
+                    "property": prop,
+                    "image": os.path.basename(img_path),
+                    "ground_truth": ground_truth,
+                    "queries": [image_query(prompt, img_path)],
+                }
 
-                writer.writerow([
-                    obj_name, prop, gt_category, gt_desc,
-                    os.path.basename(img_path), result
-                ])
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
 
-                print(f"{obj_name} | {prop} → {result} | GT: {gt_category}: {gt_desc}")
 
-    print(f"\nRoboCasa evaluation complete! Results saved to: {output_csv}")
-
-
-def evaluate_humanoid(client, model_name, num_samples, output_csv):
-    """Evaluate property understanding on Humanoid dataset."""
-    print("\nStarting evaluation for Humanoid dataset...")
-    
-    humanoid_gt_file = "../pacbench/ground_truth/robo_properties.psv"
-    humanoid_images_path = "../pacbench/humanoid/captured_images"
-    
-    humanoid_df = pd.read_csv(humanoid_gt_file, sep="|")
-    humanoid_df.columns = [c.strip().lower() for c in humanoid_df.columns]
-
-    with open(output_csv, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow([
-            "property_name", "ground_truth_category", "ground_truth_descriptors",
-            "cam0_image", "cam1_image", "response_cam0", "response_cam1"
-        ])
+def evaluate_openimages(client, model_name, num_samples, output_csv, concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None):
+    """Evaluate property understanding on Open Images dataset."""
+    print("\nStarting evaluation for Open Images dataset...")
 
-        humanoid_sample = humanoid_df.head(num_samples) if num_samples else humanoid_df
-        for _, row in humanoid_sample.iterrows():
-            prop = str(row["property_name"]).strip().upper()
-            gt_category = str(row["selected_category"]).strip()
-            gt_desc = str(row["selected_descriptors"]).strip()
+    header = ["property", "image_filename", "ground_truth_choice", "model_response"]
 
-            cam0_file = str(row["cam0_file"]).strip()
-            cam1_file = str(row["cam1_file"]).strip()
+    def make_row(item, responses):
+        result, = responses
+        row = [item["property"], item["image"], item["ground_truth"], result]
+        print(f"{item['image']} → {result} | GT: {item['ground_truth']}")
+        return row
 
-            cam0_path = os.path.join(humanoid_images_path, cam0_file)
-            cam1_path = os.path.join(humanoid_images_path, cam1_file)
+    failed = evaluate_items(client, model_name, build_openimages_items(num_samples), output_csv, header,
+                            OPENIMAGES_KEY_COLUMNS, make_row, concurrency, resume, on_row,
+                            labels={"task": "properties", "dataset": "openimages"})
 
+    print(f"\nOpen Images evaluation complete! Results saved to: {output_csv}")
+    return failed
+
+
+def build_robocasa_items(num_samples):
+    """Yield RoboCasa property work items, one per (object, property) row."""
+    robocasa_path = ROBOCASA_OBJECTS_DIR
+    table = load_ground_truth(SYN_PROPERTIES_GT, index_columns=["object_name"])
+
+    objects_to_process = sorted(manifest.listdir(robocasa_path))
+    if num_samples:
+        objects_to_process = objects_to_process[:num_samples]
+
+    for obj_name in objects_to_process:
+        obj_dir = os.path.join(robocasa_path, obj_name+"/unnamed")
+        print(obj_dir)
+
+        # Sample one image for that object, seeded by its name so reruns send
+        # the same image and hit the response cache
+        images = [f for f in manifest.listdir(obj_dir) if f.lower().endswith(('.png'))]
+        if not images:
+            print(f"No images found for {obj_name}")
+            continue
+
+        sampled_image = random.Random(obj_name).choice(sorted(images))
+        img_path = os.path.join(obj_dir, sampled_image)
+
+        # Find ground truth info for that object
+        matches = lookup(table, "object_name", obj_name)
+        if not matches:
+            print(f"No ground truth found for {obj_name}")
+            continue
+
+        for row in rows_at(table, matches[:num_samples] if num_samples else matches):
+            prop = str(row.property_name).strip().upper()
+            gt_category = str(row.selected_category).strip()
+            gt_desc = str(row.selected_descriptors).strip()
             options = PROPERTY_MCQ_OPTIONS.get(prop)
+
             if not options:
-                print(f"No options defined for {prop}. Skipping row.")
+                print(f"No options defined for {prop}. Skipping {obj_name}.")
                 continue
 
             prompt = build_prompt(prop, options)
+            yield {
+                "key": (obj_name, prop),
+                "object_name": obj_name,
+                "property": prop,
+                "gt_category": gt_category,
+                "gt_desc": gt_desc,
+                "image": os.path.basename(img_path),
+                "queries": [image_query(prompt, img_path)],
+            }
+
+
+def evaluate_robocasa(client, model_name, num_samples, output_csv, concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None):
+    """Evaluate property understanding on RoboCasa dataset."""
+    print("\nStarting evaluation for RoboCasa dataset...")
+
+    header = [
+        "object_name", "property_name", "ground_truth_category",
+        "ground_truth_descriptors", "sampled_image", "model_response"
+    ]
+
+    def make_row(item, responses):
+        result, = responses
+        row = [
+            item["object_name"], item["property"], item["gt_category"], item["gt_desc"],
+            item["image"], result
+        ]
+        print(f"{item['object_name']} | {item['property']} → {result} | GT: {item['gt_category']}: {item['gt_desc']}")
+        return row
 
-            result_cam0 = query_openrouter(client, model_name, prompt, cam0_path) if os.path.exists(cam0_path) else "Missing cam0"
-            result_cam1 = query_openrouter(client, model_name, prompt, cam1_path) if os.path.exists(cam1_path) else "Missing cam1"
+    failed = evaluate_items(client, model_name, build_robocasa_items(num_samples), output_csv, header,
+                            ROBOCASA_KEY_COLUMNS, make_row, concurrency, resume, on_row,
+                            labels={"task": "properties", "dataset": "robocasa"})
 
-            writer.writerow([
-                prop, gt_category, gt_desc,
-                os.path.basename(cam0_path), os.path.basename(cam1_path),
-                result_cam0, result_cam1
-            ])
+    print(f"\nRoboCasa evaluation complete! Results saved to: {output_csv}")
+    return failed
+
+
+def build_humanoid_items(num_samples):
+    """Yield Humanoid property work items with one query per camera."""
+    humanoid_images_path = HUMANOID_IMAGES_DIR
+    table = load_ground_truth(ROBO_PROPERTIES_GT)
+
+    for row in iter_rows(table, num_samples):
+        prop = str(row.property_name).strip().upper()
+        gt_category = str(row.selected_category).strip()
+        gt_desc = str(row.selected_descriptors).strip()
+
+        cam0_file = str(row.cam0_file).strip()
+        cam1_file = str(row.cam1_file).strip()
+
+        cam0_path = os.path.join(humanoid_images_path, cam0_file)
+        cam1_path = os.path.join(humanoid_images_path, cam1_file)
+
+        options = PROPERTY_MCQ_OPTIONS.get(prop)
+        if not options:
+            print(f"No options defined for {prop}. Skipping row.")
+            continue
+
+        prompt = build_prompt(prop, options)
+        yield {
+            "key": (prop, os.path.basename(cam0_path), os.path.basename(cam1_path)),
+            "property": prop,
+            "gt_category": gt_category,
+            "gt_desc": gt_desc,
+            "cam0_image": os.path.basename(cam0_path),
+            "cam1_image": os.path.basename(cam1_path),
+            "queries": [
+                image_query(prompt, cam0_path) if manifest.exists(cam0_path) else "Missing cam0",
+                image_query(prompt, cam1_path) if manifest.exists(cam1_path) else "Missing cam1",
+            ],
+        }
+
+
+def evaluate_humanoid(client, model_name, num_samples, output_csv, concurrency=DEFAULT_CONCURRENCY, resume=False, on_row=None):
+    """Evaluate property understanding on Humanoid dataset."""
+    print("\nStarting evaluation for Humanoid dataset...")
 
-            print(f"{prop} | GT: {gt_category} | cam0 → {result_cam0} | cam1 → {result_cam1}")
+    header = [
+        "property_name", "ground_truth_category", "ground_truth_descriptors",
+        "cam0_image", "cam1_image", "response_cam0", "response_cam1"
+    ]
+
+    def make_row(item, responses):
+        result_cam0, result_cam1 = responses
+        row = [
+            item["property"], item["gt_category"], item["gt_desc"],
+            item["cam0_image"], item["cam1_image"],
+            result_cam0, result_cam1
+        ]
+        print(f"{item['property']} | GT: {item['gt_category']} | cam0 → {result_cam0} | cam1 → {result_cam1}")
+        return row
+
+    failed = evaluate_items(client, model_name, build_humanoid_items(num_samples), output_csv, header,
+                            HUMANOID_KEY_COLUMNS, make_row, concurrency, resume, on_row,
+                            labels={"task": "properties", "dataset": "humanoid"})
 
     print(f"\nHumanoid evaluation complete! Results saved to: {output_csv}")
+    return failed
 
 
 def main():
@@ -190,39 +245,77 @@ def main():
     if not OPENROUTER_API_KEY:
         raise EnvironmentError("OPENROUTER_API_KEY not set in environment variables.")
 
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPENROUTER_API_KEY)
-
     # Argument parser
     parser = argparse.ArgumentParser(description="Evaluate VLM property understanding across multiple datasets")
     parser.add_argument("--model", type=str, default="meta-llama/llama-4-maverick",
                         help="Model name to use for evaluation")
+    parser.add_argument("--models", type=str, default=None,
+                        help="Comma-separated models to evaluate in one sweep (overrides --model); "
+                             "results go to a subdirectory of --output_dir per model")
     parser.add_argument("--num_samples", type=int, default=None,
                         help="Number of samples to evaluate per dataset (default: all)")
     parser.add_argument("--output_dir", type=str, default="../property_results",
                         help="Directory to save results")
     parser.add_argument("--dataset", type=str, choices=["openimages", "robocasa", "humanoid", "all"],
                         default="all", help="Which dataset to evaluate")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum number of in-flight API requests")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep existing output CSVs and only evaluate items not yet written")
+    add_cache_args(parser)
+    add_ratelimit_args(parser)
+    add_client_args(parser)
+    add_preprocess_args(parser)
+    add_prefetch_args(parser)
+    add_instrumentation_args(parser)
+    parser.add_argument("--payload_store", type=str, default=None,
+                        help="Path prefix of a store built by payload_store.py to serve pre-encoded images from")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Dataset index built by manifest.py to list and check image files from")
+    add_shard_args(parser)
 
     args = parser.parse_args()
+    model = parse_models(args.models) if args.models else args.model
+    configure_cache_from_args(args)
+    configure_ratelimit_from_args(args)
+    configure_clients_from_args(args)
+    client = make_async_client(OPENROUTER_API_KEY)
+    configure_preprocessing_from_args(args)
+    configure_sharding_from_args(args)
+    if args.payload_store:
+        load_payload_store(args.payload_store)
+    if args.manifest:
+        manifest.load_manifest(args.manifest)
+    configure_prefetch_from_args(args)
+    configure_instrumentation_from_args(args)
 
     # Create results directory
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Define output paths
-    output_csv_openimages = os.path.join(args.output_dir, "openrouter_property_eval_results.csv")
-    output_csv_robocasa = os.path.join(args.output_dir, "openrouter_robocasa_eval_results.csv")
-    output_csv_humanoid = os.path.join(args.output_dir, "openrouter_humanoid_eval_results.csv")
+    output_csv_openimages = shard_output_path(os.path.join(args.output_dir, "openrouter_property_eval_results.csv"))
+    output_csv_robocasa = shard_output_path(os.path.join(args.output_dir, "openrouter_robocasa_eval_results.csv"))
+    output_csv_humanoid = shard_output_path(os.path.join(args.output_dir, "openrouter_humanoid_eval_results.csv"))
 
     # Run evaluations based on dataset argument
     if args.dataset in ["openimages", "all"]:
-        evaluate_openimages(client, args.model, args.num_samples, output_csv_openimages)
+        evaluate_openimages(client, model, args.num_samples, output_csv_openimages, args.concurrency, args.resume)
     
     if args.dataset in ["robocasa", "all"]:
-        evaluate_robocasa(client, args.model, args.num_samples, output_csv_robocasa)
+        evaluate_robocasa(client, model, args.num_samples, output_csv_robocasa, args.concurrency, args.resume)
     
     if args.dataset in ["humanoid", "all"]:
-        evaluate_humanoid(client, args.model, args.num_samples, output_csv_humanoid)
-
+        evaluate_humanoid(client, model, args.num_samples, output_csv_humanoid, args.concurrency, args.resume)
+
+    print_stage_stats()
+    print_cache_stats()
+    print_ratelimit_stats()
+    close_cache()
+    close_prefetch()
+    close_instrumentation()
+    # Items that failed after all retries were left out of the results
+    if stage_stats()["failed"]:
+        raise SystemExit(1)
     print("\nAll evaluations complete!")
 
 
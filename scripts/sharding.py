@@ -0,0 +1,232 @@
+import io
+import os
+import csv
+import hashlib
+import argparse
+import contextlib
+from collections import Counter, deque
+from checkpoint import read_rows, parse_models, model_output_path
+from manifest import load_manifest
+
+# Number of missing or unexpected keys listed when a merge finds problems
+MAX_REPORTED_KEYS = 10
+
+_shard = {"index": None, "count": None}
+
+
+def parse_shard(value):
+    """Parse a --shard value "i/N" (1 <= i <= N) into (i, N)."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, e.g. 1/4, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def configure_sharding(shard=None):
+    """Restrict this process to shard (i, N) of the work, or to all of it when shard is None."""
+    index, count = shard or (None, None)
+    _shard.update(index=index, count=count)
+
+
+def add_shard_args(parser):
+    """Register the --shard command line option on an argparse parser."""
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="Only process shard i of N (e.g. 2/4), chosen by a stable hash of each item; "
+                             "outputs go to a shard-i-of-N subdirectory to be combined with sharding.py")
+
+
+def configure_sharding_from_args(args):
+    """Configure sharding from the option registered with add_shard_args."""
+    configure_sharding(args.shard)
+
+
+def shard_of(key, count):
+    """The shard (1..count) a key tuple belongs to, the same on every machine and Python run."""
+    text = "\x1f".join(str(value) for value in key)
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big") % count + 1
+
+
+def in_shard(key):
+    """Whether a key tuple belongs to the configured shard (always true without sharding)."""
+    return _shard["count"] is None or shard_of(key, _shard["count"]) == _shard["index"]
+
+
+def shard_items(items):
+    """Keep the work items whose key belongs to the configured shard."""
+    return (item for item in items if in_shard(item["key"]))
+
+
+def shard_output_dir(directory, shard=None):
+    """The shard-i-of-N subdirectory of directory the given (or configured) shard writes to."""
+    index, count = shard or (_shard["index"], _shard["count"])
+    if count is None:
+        return directory
+    return os.path.join(directory, f"shard-{index}-of-{count}")
+
+
+def shard_output_path(path, shard=None):
+    """Where the given (or configured) shard writes path (path itself without sharding)."""
+    return os.path.join(shard_output_dir(os.path.dirname(path), shard), os.path.basename(path))
+
+
+def merge_shards(output_csv, shard_paths, key_columns, expected_keys, lineterminator="\r\n", allow_incomplete=False):
+    """Combine the CSVs written by shards 1..N of a run into output_csv.
+
+    Rows are written in the order of expected_keys (the key tuples of the
+    unsharded run, repeated keys included), so the result matches what one
+    unsharded run writes. Missing shard files, missing items, rows in the
+    wrong shard and duplicate or unknown rows are reported; unless
+    allow_incomplete, nothing is written when any are found. Returns True if
+    output_csv was written.
+    """
+    count = len(shard_paths)
+    header = None
+    rows_by_key = {}
+    problems = Counter()
+
+    for index, path in enumerate(shard_paths, start=1):
+        rows = read_rows(path) if os.path.exists(path) else []
+        if not rows:
+            print(f"  Missing shard {index}/{count}: {path}")
+            problems["missing shard files"] += 1
+            continue
+        if header is None:
+            header = rows[0]
+        elif rows[0] != header:
+            raise ValueError(f"Shard {path} has header {rows[0]}, expected {header}")
+
+        key_idx = [header.index(c) for c in key_columns]
+        for row in rows[1:]:
+            key = tuple(row[i] for i in key_idx)
+            if shard_of(key, count) != index:
+                problems["rows in the wrong shard"] += 1
+                continue
+            rows_by_key.setdefault(key, deque()).append(row)
+
+    merged = []
+    missing = []
+    for key in expected_keys:
+        key = tuple(str(value) for value in key)
+        rows = rows_by_key.get(key)
+        if rows:
+            merged.append(rows.popleft())
+        else:
+            missing.append(key)
+    leftover = [key for key, rows in rows_by_key.items() for _ in rows]
+    expected = set(tuple(str(value) for value in key) for key in expected_keys)
+    problems["missing items"] += len(missing)
+    problems["duplicate rows"] += sum(1 for key in leftover if key in expected)
+    problems["unknown rows"] += sum(1 for key in leftover if key not in expected)
+
+    for label, keys in (("Missing", missing), ("Unknown", [k for k in leftover if k not in expected])):
+        for key in keys[:MAX_REPORTED_KEYS]:
+            print(f"  {label}: {key}")
+    found = {label: n for label, n in problems.items() if n}
+    print(f"  {len(merged)} rows from {count} shards" + (f"; problems: {found}" if found else ""))
+
+    if header is None or (found and not allow_incomplete):
+        print(f"  Not written: {output_csv}")
+        return False
+
+    os.makedirs(os.path.dirname(output_csv) or ".", exist_ok=True)
+    tmp_path = f"{output_csv}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator=lineterminator)
+        writer.writerow(header)
+        writer.writerows(merged)
+    os.replace(tmp_path, output_csv)
+    print(f"  Written: {output_csv}")
+    return True
+
+
+def _merge_evaluations(task, results_dir, count, models, num_samples, allow_incomplete):
+    # Imported here since the runners and verify_results.py import this module
+    from pipeline import PIPELINE_TASKS, DATASET_ITEMS
+
+    ok = True
+    for dataset, _, filename in PIPELINE_TASKS[task]["datasets"]:
+        build_items, key_columns = DATASET_ITEMS[(task, dataset)]
+        # The builders report skipped rows and missing files as they go
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected_keys = [item["key"] for item in build_items(num_samples)]
+        output_csv = os.path.join(results_dir, filename)
+        for model in models or [None]:
+            target = model_output_path(output_csv, model) if model else output_csv
+            shard_paths = [shard_output_path(output_csv, (index, count)) for index in range(1, count + 1)]
+            if model:
+                shard_paths = [model_output_path(path, model) for path in shard_paths]
+            print(f"\nMerging {task}/{dataset}" + (f" [{model}]" if model else ""))
+            ok &= merge_shards(target, shard_paths, key_columns, expected_keys, allow_incomplete=allow_incomplete)
+    return ok
+
+
+def _merge_verification(task, results_dir, output_dir, count, allow_incomplete):
+    from pipeline import PIPELINE_TASKS
+    import verify_results
+
+    records = {
+        "properties": verify_results.property_records,
+        "affordances": verify_results.affordance_records,
+        "constraints": verify_results.constraint_records,
+    }[task](results_dir)
+    expected_keys = [verify_results.record_key(record) for record in records]
+    output_file = os.path.join(output_dir, PIPELINE_TASKS[task]["output"])
+    shard_paths = [shard_output_path(output_file, (index, count)) for index in range(1, count + 1)]
+    print(f"\nMerging {task} verification")
+    return merge_shards(output_file, shard_paths, verify_results.VERIFY_KEY_COLUMNS, expected_keys,
+                        lineterminator="\n", allow_incomplete=allow_incomplete)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Combine the outputs of a run split with --shard i/N")
+    parser.add_argument("--shards", type=int, required=True,
+                        help="Number of shards N the run was split into")
+    parser.add_argument("--stage", type=str, choices=["evaluation", "verification"], default="evaluation",
+                        help="Merge the runners' result CSVs, or verify_results.py's outputs")
+    parser.add_argument("--task", type=str, choices=["properties", "affordances", "constraints", "all"],
+                        default="all", help="Which task to merge")
+    parser.add_argument("--property_dir", type=str, default="../property_results",
+                        help="Directory of the property evaluation CSVs")
+    parser.add_argument("--affordance_dir", type=str, default="../affordance_results",
+                        help="Directory of the affordance evaluation CSVs")
+    parser.add_argument("--constraint_dir", type=str, default="../constraint_results",
+                        help="Directory of the constraint evaluation CSVs")
+    parser.add_argument("--output_dir", type=str, default="../evaluations",
+                        help="Directory of the verification results")
+    parser.add_argument("--models", type=str, default=None,
+                        help="Comma-separated models of a sweep run; each model's CSVs are merged separately")
+    parser.add_argument("--num_samples", type=int, default=None,
+                        help="The --num_samples of the sharded run")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Dataset index built by manifest.py to list and check image files from")
+    parser.add_argument("--allow_incomplete", action="store_true",
+                        help="Write the merged CSVs even when items are missing or duplicated")
+    # Imported here since the runners and verify_results.py import this module
+    from pipeline import PIPELINE_TASKS
+    import run_constraint
+    run_constraint.add_sim_packing_args(parser)
+
+    args = parser.parse_args()
+    if args.manifest:
+        load_manifest(args.manifest)
+    run_constraint.configure_sim_packing_from_args(args)
+
+    tasks = list(PIPELINE_TASKS) if args.task == "all" else [args.task]
+    models = parse_models(args.models) if args.models else None
+    ok = True
+    for task in tasks:
+        results_dir = getattr(args, PIPELINE_TASKS[task]["results_dir"])
+        if args.stage == "evaluation":
+            ok &= _merge_evaluations(task, results_dir, args.shards, models, args.num_samples, args.allow_incomplete)
+        else:
+            ok &= _merge_verification(task, results_dir, args.output_dir, args.shards, args.allow_incomplete)
+
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
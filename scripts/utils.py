@@ -1,65 +1,146 @@
 import base64
+import payload_store
+import response_cache
+import ratelimit
+import instrumentation
+from preprocess import prepare_image
+
+MAX_TOKENS = 100
+TEMPERATURE = 0.5
+
 
 def encode_image(image_path):
     """Convert image to base64 for LLM input."""
+    payload = payload_store.lookup(image_path)
+    if payload is not None:
+        return payload
+
     try:
-        with open(image_path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode()
-        return f"data:image/png;base64,{b64}"
+        data, mime = prepare_image(image_path)
+        b64 = base64.b64encode(data).decode()
+        return f"data:{mime};base64,{b64}"
     except Exception:
         return ""
-    
 
-def query_openrouter(client, model, prompt, image_path):
-    """Send text + image to OpenRouter model."""
-    image_b64 = encode_image(image_path)
-    if not image_b64:
-        return "Image not found or unreadable."
 
+def build_image_content(prompt, image_urls):
+    """Build the multimodal message content for a prompt and encoded images."""
+    content = [{"type": "text", "text": prompt}]
+    for image_url in image_urls:
+        content.append({"type": "image_url", "image_url": {"url": image_url}})
+    return content
+
+
+def _completion_kwargs(model, content):
+    return dict(
+        model=model,
+        messages=[
+            {
+                "role": "user",
+                "content": content,
+            }
+        ],
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+    )
+
+
+def _complete(client, model, prompt, image_urls):
+    key = response_cache.cache_key(model, prompt, image_urls, TEMPERATURE, MAX_TOKENS)
+    cached = response_cache.lookup(key)
+    if cached is not None:
+        instrumentation.record_cached(model)
+        return cached
+
+    # Transient errors ratelimit gave up on are raised, so the item is not
+    # written and a --resume run sends it again; a rejected request fails the
+    # same way every time, so its error is recorded as the answer
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": image_b64}},
-                    ],
-                }
-            ],
-            max_tokens=100,
-            temperature=0.5,
-        )
-        return resp.choices[0].message.content.strip()
+        resp = ratelimit.create(client, **_completion_kwargs(model, build_image_content(prompt, image_urls)))
     except Exception as e:
+        if ratelimit.retryable(e):
+            raise
         return f"API error: {e}"
+    result = resp.choices[0].message.content.strip()
 
+    response_cache.store(key, result)
+    return result
 
-def query_openrouter_multi_image(client, model, prompt, image_paths):
-    """Send text + multiple images to OpenRouter model."""
-    content = [{"type": "text", "text": prompt}]
-    
-    for image_path in image_paths:
-        image_b64 = encode_image(image_path)
-        if image_b64:
-            content.append({"type": "image_url", "image_url": {"url": image_b64}})
-    
-    if len(content) == 1:  # Only text, no valid images
-        return "No valid images found."
 
+async def _acomplete(client, model, prompt, image_urls):
+    key = response_cache.cache_key(model, prompt, image_urls, TEMPERATURE, MAX_TOKENS)
+    cached = response_cache.lookup(key)
+    if cached is not None:
+        instrumentation.record_cached(model)
+        return cached
+
+    # Transient errors ratelimit gave up on are raised, so the item is not
+    # written and a --resume run sends it again; a rejected request fails the
+    # same way every time, so its error is recorded as the answer
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": content,
-                }
-            ],
-            max_tokens=100,
-            temperature=0.5,
-        )
-        return resp.choices[0].message.content.strip()
+        resp = await ratelimit.acreate(client, **_completion_kwargs(model, build_image_content(prompt, image_urls)))
     except Exception as e:
-        return f"API error: {e}"
\ No newline at end of file
+        if ratelimit.retryable(e):
+            raise
+        return f"API error: {e}"
+    result = resp.choices[0].message.content.strip()
+
+    response_cache.store(key, result)
+    return result
+
+
+def encode_single_image(image_path):
+    """Encode the image of a single-image query: returns (image_urls, None), or (None, error response)."""
+    image_b64 = encode_image(image_path)
+    if not image_b64:
+        return None, "Image not found or unreadable."
+    return [image_b64], None
+
+
+def encode_multi_image(image_paths):
+    """Encode the images of a multi-image query, dropping unreadable ones: returns (image_urls, error response)."""
+    image_urls = [url for url in (encode_image(p) for p in image_paths) if url]
+    if not image_urls:  # Only text, no valid images
+        return None, "No valid images found."
+    return image_urls, None
+
+
+def query_openrouter(client, model, prompt, image_path):
+    """Send text + image to OpenRouter model."""
+    image_urls, error = encode_single_image(image_path)
+    if error:
+        return error
+
+    return _complete(client, model, prompt, image_urls)
+
+
+def query_openrouter_multi_image(client, model, prompt, image_paths):
+    """Send text + multiple images to OpenRouter model."""
+    image_urls, error = encode_multi_image(image_paths)
+    if error:
+        return error
+
+    return _complete(client, model, prompt, image_urls)
+
+
+async def aquery_openrouter(client, model, prompt, image_path):
+    """Async variant of query_openrouter for use with an AsyncOpenAI client."""
+    image_urls, error = encode_single_image(image_path)
+    if error:
+        return error
+
+    return await _acomplete(client, model, prompt, image_urls)
+
+
+async def aquery_openrouter_multi_image(client, model, prompt, image_paths):
+    """Async variant of query_openrouter_multi_image for use with an AsyncOpenAI client."""
+    image_urls, error = encode_multi_image(image_paths)
+    if error:
+        return error
+
+    return await _acomplete(client, model, prompt, image_urls)
+
+
+async def aquery_encoded(client, model, prompt, image_urls):
+    """Async request for images already encoded by encode_single_image / encode_multi_image."""
+    return await _acomplete(client, model, prompt, image_urls)
@@ -0,0 +1,76 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_MEMO_PATH = "../.cache/verification_memo.sqlite"
+
+_state = {"conn": None, "path": DEFAULT_MEMO_PATH}
+_stats = {"hits": 0, "misses": 0, "writes": 0}
+_lock = threading.Lock()
+
+
+def open_memo(path=DEFAULT_MEMO_PATH):
+    """Open (creating if needed) the verification memo database."""
+    close_memo()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT NOT NULL)")
+    _state.update(conn=conn, path=path)
+
+
+def close_memo():
+    if _state["conn"] is not None:
+        _state["conn"].close()
+        _state["conn"] = None
+
+
+def memo_key(model, task, template, ground_truth, model_response):
+    """Key a verdict by verifier model, task, prompt template text, ground truth and response.
+
+    Hashing the template means any wording change to the verifier prompt
+    starts from an empty memo instead of reusing stale verdicts.
+    """
+    template_hash = hashlib.sha256(template.encode()).hexdigest()
+    payload = json.dumps([model, task, template_hash, str(ground_truth), str(model_response)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lookup(key):
+    """Return the memoized verdict for key, or None (also when the memo is closed)."""
+    if _state["conn"] is None:
+        return None
+
+    with _lock:
+        row = _state["conn"].execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        return row[0]
+
+
+def store(key, verdict):
+    """Memoize a verdict. ERROR results are never stored so they get retried."""
+    if _state["conn"] is None or verdict.startswith("ERROR"):
+        return
+
+    with _lock:
+        _state["conn"].execute("INSERT OR REPLACE INTO verdicts (key, verdict) VALUES (?, ?)", (key, verdict))
+        _stats["writes"] += 1
+
+
+def memo_stats():
+    return dict(_stats)
+
+
+def print_memo_stats():
+    """Print memo counters (no-op when the memo is closed)."""
+    if _state["conn"] is None:
+        return
+    lookups = _stats["hits"] + _stats["misses"]
+    hit_rate = (_stats["hits"] / lookups * 100) if lookups > 0 else 0
+    print(f"Verification memo ({_state['path']}): Hits: {_stats['hits']}  Misses: {_stats['misses']}"
+          f"  Hit rate: {hit_rate:.2f}%  Writes: {_stats['writes']}")
@@ -1,347 +1,561 @@
 import os
 import csv
+import json
+import math
 import pandas as pd
 import argparse
 import glob
-from openai import OpenAI
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from checkpoint import open_results, sync
+from property_matcher import fast_path_verdict, fast_path_stats
+import verification_memo
+import ratelimit
+from instrumentation import (event_labels, add_instrumentation_args, configure_instrumentation_from_args,
+                             close_instrumentation)
+from clients import add_client_args, configure_clients_from_args, make_client
+from sharding import add_shard_args, configure_sharding_from_args, in_shard, shard_output_path, shard_output_dir
+
+
+# Wording of the verifier prompt for each task. The single-pair prompt and the
+# batched prompt are both assembled from these pieces.
+VERIFY_PROMPT_SPECS = {
+    "properties": {
+        "intro": "You are evaluating if a model's response matches the ground truth for a property classification task.",
+        "ground_truth_label": "Ground Truth",
+        "question": "Does the model response match or align with the ground truth? Consider semantic similarity and variations in wording.",
+        "correct": "the response matches or closely aligns with the ground truth",
+        "incorrect": "the response does not match or contradicts the ground truth",
+    },
+    "affordances": {
+        "intro": "You are evaluating if a model's affordance predictions match the ground truth affordances.",
+        "ground_truth_label": "Ground Truth Affordances",
+        "question": "Does the model response capture the same affordances as the ground truth? The model may use different wording but should convey the same affordances.",
+        "correct": "the response captures all or most key affordances correctly",
+        "incorrect": "the response is wrong or misses the affordances",
+    },
+    "constraints": {
+        "intro": "You are evaluating if a model's constraint reasoning matches the expected answer.",
+        "ground_truth_label": "Ground Truth Answer",
+        "question": "Does the model response correctly identify whether there is a constraint or not? Consider the semantic meaning.",
+        "correct": "the response correctly identifies the constraint (or lack thereof)",
+        "incorrect": "the response incorrectly identifies or misses the constraint",
+    },
+}
+
+SINGLE_PROMPT_TEMPLATE = """{intro}
+
+{ground_truth_label}: {ground_truth}
+Model Response: {model_response}
 
+{question}
 
-def verify_property_match(client, model, ground_truth, model_response):
-    """Use LLM to verify if model response matches ground truth for properties."""
-    prompt = f"""You are evaluating if a model's response matches the ground truth for a property classification task.
+Respond with ONLY one of these options:
+- "CORRECT" if {correct}
+- "INCORRECT" if {incorrect}"""
 
-Ground Truth: {ground_truth}
-Model Response: {model_response}
+BATCH_PROMPT_TEMPLATE = """{intro}
 
-Does the model response match or align with the ground truth? Consider semantic similarity and variations in wording.
+Below are {count} numbered pairs. For each pair: {question}
 
-Respond with ONLY one of these options:
-- "CORRECT" if the response matches or closely aligns with the ground truth
-- "INCORRECT" if the response does not match or contradicts the ground truth"""
+{pairs}
 
-    try:
-        resp = client.chat.completions.create(
+Respond with ONLY a JSON array of {count} strings, one per pair in the same order, each being:
+- "CORRECT" if {correct}
+- "INCORRECT" if {incorrect}
+Example for 2 pairs: ["CORRECT", "INCORRECT"]"""
+
+VERIFY_COLUMNS = {
+    "properties": ['source_file', 'property_type', 'identifier', 'ground_truth', 'model_response', 'camera', 'verification'],
+    "affordances": ['source_file', 'identifier', 'ground_truth', 'model_response', 'camera', 'verification'],
+    "constraints": ['source_file', 'constraint_type', 'identifier', 'ground_truth', 'model_response', 'camera', 'verification'],
+}
+VERIFY_KEY_COLUMNS = ['source_file', 'identifier', 'camera']
+
+# Result CSVs are read this many rows at a time, and output is fsynced every
+# FLUSH_EVERY verified rows
+READ_CHUNK_ROWS = 1000
+FLUSH_EVERY = 50
+
+_verifier_stats = {"calls": 0, "prompt_tokens": 0, "batch_retries": 0}
+_stats_lock = threading.Lock()
+
+
+def _call_verifier(client, model, task, prompt, max_tokens):
+    with event_labels(stage="verification", task=task):
+        resp = ratelimit.create(
+            client,
             model=model,
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
+            max_tokens=max_tokens,
             temperature=0.0,
         )
-        result = resp.choices[0].message.content.strip().upper()
-        # Ensure we only get one of the valid responses
-        if "CORRECT" in result and "INCORRECT" not in result:
-            return "CORRECT"
-        elif "INCORRECT" in result:
-            return "INCORRECT"
-        else:
-            return "UNCERTAIN"
-    except Exception as e:
-        return f"ERROR: {e}"
+    usage = getattr(resp, "usage", None)
+    with _stats_lock:
+        _verifier_stats["calls"] += 1
+        if usage is not None and getattr(usage, "prompt_tokens", None):
+            _verifier_stats["prompt_tokens"] += usage.prompt_tokens
+    return resp.choices[0].message.content.strip()
 
 
-def verify_affordance_match(client, model, ground_truth, model_response):
-    """Use LLM to verify if model response matches ground truth for affordances."""
-    prompt = f"""You are evaluating if a model's affordance predictions match the ground truth affordances.
+def _parse_verdict(text):
+    result = text.strip().upper()
+    # Ensure we only get one of the valid responses
+    if "CORRECT" in result and "INCORRECT" not in result:
+        return "CORRECT"
+    elif "INCORRECT" in result:
+        return "INCORRECT"
+    else:
+        return "UNCERTAIN"
 
-Ground Truth Affordances: {ground_truth}
-Model Response: {model_response}
 
-Does the model response capture the same affordances as the ground truth? The model may use different wording but should convey the same affordances.
+def _template_text(task):
+    """All prompt wording used to verify a task; hashed into the memo key."""
+    return SINGLE_PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE + json.dumps(VERIFY_PROMPT_SPECS[task], sort_keys=True)
+
+
+def _memo_key(model, task, ground_truth, model_response):
+    return verification_memo.memo_key(model, task, _template_text(task), ground_truth, model_response)
+
+
+def verify_prompt(task, pairs):
+    """The verifier prompt for (ground_truth, model_response) pairs: the single-pair or the numbered batch form."""
+    spec = VERIFY_PROMPT_SPECS[task]
+    if len(pairs) == 1:
+        ground_truth, model_response = pairs[0]
+        return SINGLE_PROMPT_TEMPLATE.format(ground_truth=ground_truth, model_response=model_response, **spec)
+
+    numbered = "\n\n".join(
+        f"{i}. {spec['ground_truth_label']}: {gt}\n   Model Response: {resp}"
+        for i, (gt, resp) in enumerate(pairs, start=1)
+    )
+    return BATCH_PROMPT_TEMPLATE.format(count=len(pairs), pairs=numbered, **spec)
 
-Respond with ONLY one of these options:
-- "CORRECT" if the response captures all or most key affordances correctly
-- "INCORRECT" if the response is wrong or misses the affordances"""
 
+def verify_max_tokens(count):
+    """Completion budget of a verifier request covering count pairs."""
+    return 50 if count == 1 else 16 * count + 20
+
+
+def _llm_verify_single(client, model, task, ground_truth, model_response):
+    prompt = verify_prompt(task, [(ground_truth, model_response)])
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
-            temperature=0.0,
-        )
-        result = resp.choices[0].message.content.strip().upper()
-        if "CORRECT" in result and "INCORRECT" not in result:
-            return "CORRECT"
-        elif "INCORRECT" in result:
-            return "INCORRECT"
-        else:
-            return "UNCERTAIN"
+        return _parse_verdict(_call_verifier(client, model, task, prompt, max_tokens=verify_max_tokens(1)))
     except Exception as e:
         return f"ERROR: {e}"
 
 
+def _verify_single(client, model, task, ground_truth, model_response):
+    key = _memo_key(model, task, ground_truth, model_response)
+    verdict = verification_memo.lookup(key)
+    if verdict is None:
+        verdict = _llm_verify_single(client, model, task, ground_truth, model_response)
+        verification_memo.store(key, verdict)
+    return verdict
+
+
+def verify_property_match(client, model, ground_truth, model_response, property_type=None, fast_path=True):
+    """Use LLM to verify if model response matches ground truth for properties.
+
+    When property_type is known and both texts map unambiguously to one of its
+    PROPERTY_MCQ_OPTIONS, the verdict is decided locally without an LLM call.
+    """
+    if fast_path and property_type is not None:
+        verdict = fast_path_verdict(property_type, ground_truth, model_response)
+        if verdict is not None:
+            return verdict
+
+    return _verify_single(client, model, "properties", ground_truth, model_response)
+
+
+def verify_affordance_match(client, model, ground_truth, model_response):
+    """Use LLM to verify if model response matches ground truth for affordances."""
+    return _verify_single(client, model, "affordances", ground_truth, model_response)
+
+
 def verify_constraint_match(client, model, ground_truth, model_response):
     """Use LLM to verify if model response matches ground truth for constraints."""
-    prompt = f"""You are evaluating if a model's constraint reasoning matches the expected answer.
+    return _verify_single(client, model, "constraints", ground_truth, model_response)
 
-Ground Truth Answer: {ground_truth}
-Model Response: {model_response}
 
-Does the model response correctly identify whether there is a constraint or not? Consider the semantic meaning.
+def _parse_batch_verdicts(text, count):
+    """Parse a JSON array of verdicts; returns None unless it has exactly count valid entries."""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        verdicts = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(verdicts, list) or len(verdicts) != count:
+        return None
+
+    verdicts = [str(v).strip().upper() for v in verdicts]
+    if any(v not in ("CORRECT", "INCORRECT") for v in verdicts):
+        return None
+    return verdicts
 
-Respond with ONLY one of these options:
-- "CORRECT" if the response correctly identifies the constraint (or lack thereof)
-- "INCORRECT" if the response incorrectly identifies or misses the constraint"""
 
+def _llm_verify_batch(client, model, task, pairs):
+    if len(pairs) == 1:
+        return [_llm_verify_single(client, model, task, *pairs[0])]
+
+    prompt = verify_prompt(task, pairs)
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
-            temperature=0.0,
-        )
-        result = resp.choices[0].message.content.strip().upper()
-        if "CORRECT" in result and "INCORRECT" not in result:
-            return "CORRECT"
-        elif "INCORRECT" in result:
-            return "INCORRECT"
+        verdicts = _parse_batch_verdicts(_call_verifier(client, model, task, prompt, max_tokens=verify_max_tokens(len(pairs))),
+                                         len(pairs))
+    except Exception:
+        verdicts = None
+
+    if verdicts is None:
+        with _stats_lock:
+            _verifier_stats["batch_retries"] += 1
+        verdicts = [_llm_verify_single(client, model, task, gt, resp) for gt, resp in pairs]
+    return verdicts
+
+
+def verify_batch(client, model, task, pairs):
+    """Verify several (ground_truth, model_response) pairs with one request.
+
+    Pairs already in the verification memo, and repeats within the batch,
+    are not sent. Falls back to one request per pair when the reply is not a
+    well-formed JSON array with a verdict for every pair.
+    """
+    keys = [_memo_key(model, task, gt, resp) for gt, resp in pairs]
+    verdicts = {}
+    missing = {}
+    for key, pair in zip(keys, pairs):
+        if key in verdicts or key in missing:
+            continue
+        verdict = verification_memo.lookup(key)
+        if verdict is None:
+            missing[key] = pair
         else:
-            return "UNCERTAIN"
-    except Exception as e:
-        return f"ERROR: {e}"
+            verdicts[key] = verdict
+
+    if missing:
+        new_verdicts = _llm_verify_batch(client, model, task, list(missing.values()))
+        for key, verdict in zip(missing, new_verdicts):
+            verification_memo.store(key, verdict)
+            verdicts[key] = verdict
+
+    return [verdicts[key] for key in keys]
+
+
+def iter_verified(client, model, task, records, batch_size=1, fast_path=True, executor=None, concurrency=1):
+    """Yield records in input order with their 'verification' field set.
+
+    Property records are first matched locally (see property_matcher); the
+    rest go to the LLM verifier, batch_size pairs per request. With an
+    executor, up to `concurrency` batches are verified in parallel while
+    results are still yielded in the original order.
+    """
+    batch_size = max(1, batch_size)
+    window = batch_size * max(1, concurrency) * 2
+    queue = deque()  # [record, future] in input order
+    batch = []
+
+    def resolve(entries):
+        pairs = [(e[0]['ground_truth'], e[0]['model_response']) for e in entries]
+        for entry, verdict in zip(entries, verify_batch(client, model, task, pairs)):
+            entry[0]['verification'] = verdict
+
+    def flush():
+        entries = list(batch)
+        batch.clear()
+        if executor is None:
+            resolve(entries)
+            return
+        future = executor.submit(resolve, entries)
+        for entry in entries:
+            entry[1] = future
+
+    def ready(entry):
+        return 'verification' in entry[0] or entry[1] is not None
+
+    for record in records:
+        entry = [record, None]
+        queue.append(entry)
+        if task == "properties" and fast_path:
+            verdict = fast_path_verdict(record['property_type'], record['ground_truth'], record['model_response'])
+            if verdict is not None:
+                record['verification'] = verdict
+
+        if 'verification' not in record:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                flush()
+
+        while len(queue) > window and ready(queue[0]):
+            head, future = queue.popleft()
+            if future is not None:
+                future.result()
+            yield head
+
+    if batch:
+        flush()
+    while queue:
+        head, future = queue.popleft()
+        if future is not None:
+            future.result()
+        yield head
+
+
+def _print_summary(title, output_file):
+    # Counts come from the whole output file so resumed runs report every row
+    verdicts = pd.read_csv(output_file, usecols=['verification'])['verification']
+    print(f"\n{'='*60}")
+    print(f"{title} Verification Summary:")
+    print(f"  Total: {len(verdicts)}")
+    print(f"  Correct: {(verdicts == 'CORRECT').sum()}")
+    print(f"  Incorrect: {(verdicts == 'INCORRECT').sum()}")
+    print(f"  Uncertain: {(verdicts == 'UNCERTAIN').sum()}")
 
 
-def verify_properties(client, model, input_dir, output_file):
-    """Verify all property evaluation results."""
-    print("\n" + "="*60)
-    print("Verifying Property Evaluations")
-    print("="*60)
-    
-    all_results = []
+def _print_verifier_stats():
+    print(f"Verifier calls: {_verifier_stats['calls']}  Prompt tokens: {_verifier_stats['prompt_tokens']}"
+          f"  Batches retried individually: {_verifier_stats['batch_retries']}")
+
+
+def _csv_value(value):
+    """Render a value the way DataFrame.to_csv would (missing values as empty)."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+
+def _iter_result_rows(input_dir):
+    """Yield (source_file, columns, idx, row) for every row of every CSV in input_dir, chunk by chunk.
+
+    row is a {column: text} dict of the cells exactly as written (no NaN or
+    number parsing), like the rows pipeline.py streams from the runners, so
+    both build the same records.
+    """
     csv_files = glob.glob(os.path.join(input_dir, "*.csv"))
-    
+
     for csv_file in csv_files:
         print(f"\nProcessing: {os.path.basename(csv_file)}")
-        df = pd.read_csv(csv_file)
-        
-        for idx, row in df.iterrows():
-            # Handle different CSV formats
-            if 'ground_truth_choice' in df.columns:
-                # OpenImages format
-                ground_truth = row['ground_truth_choice']
-                model_response = row['model_response']
-                identifier = row.get('image_filename', f'row_{idx}')
-                property_type = row.get('property', 'UNKNOWN')
-            elif 'ground_truth_category' in df.columns:
-                # RoboCasa/Humanoid format
-                ground_truth = row['ground_truth_category']
-                identifier = row.get('object_name', row.get('cam0_image', f'row_{idx}'))
-                property_type = row.get('property_name', 'UNKNOWN')
-                
-                # Check for multiple camera responses
-                if 'response_cam0' in df.columns and 'response_cam1' in df.columns:
-                    # Verify both cameras
-                    verification_cam0 = verify_property_match(client, model, ground_truth, row['response_cam0'])
-                    verification_cam1 = verify_property_match(client, model, ground_truth, row['response_cam1'])
-                    
-                    all_results.append({
-                        'source_file': os.path.basename(csv_file),
-                        'property_type': property_type,
-                        'identifier': identifier,
-                        'ground_truth': ground_truth,
-                        'model_response': row['response_cam0'],
-                        'camera': 'cam0',
-                        'verification': verification_cam0
-                    })
-                    all_results.append({
-                        'source_file': os.path.basename(csv_file),
-                        'property_type': property_type,
-                        'identifier': identifier,
-                        'ground_truth': ground_truth,
-                        'model_response': row['response_cam1'],
-                        'camera': 'cam1',
-                        'verification': verification_cam1
-                    })
-                    print(f"  {identifier} - cam0: {verification_cam0}, cam1: {verification_cam1}")
-                    continue
-                else:
-                    model_response = row['model_response']
-            else:
-                continue
-            
-            verification = verify_property_match(client, model, ground_truth, model_response)
-            all_results.append({
-                'source_file': os.path.basename(csv_file),
-                'property_type': property_type,
-                'identifier': identifier,
-                'ground_truth': ground_truth,
-                'model_response': model_response,
-                'camera': 'N/A',
-                'verification': verification
-            })
-            print(f"  {identifier}: {verification}")
-    
-    # Save results
-    df_results = pd.DataFrame(all_results)
-    df_results.to_csv(output_file, index=False)
-    
+        for chunk in pd.read_csv(csv_file, chunksize=READ_CHUNK_ROWS, dtype=str, keep_default_na=False):
+            columns = list(chunk.columns)
+            for idx, row in zip(chunk.index, chunk.to_dict("records")):
+                yield os.path.basename(csv_file), columns, idx, row
+
+
+def property_row_records(source_file, columns, idx, row):
+    """Unverified records (one per camera) for one row of a property result CSV.
+
+    row maps column names to cell text, as read back from the CSV or streamed
+    by pipeline.py.
+    """
+    # Handle different CSV formats
+    if 'ground_truth_choice' in columns:
+        # OpenImages format
+        ground_truth = row['ground_truth_choice']
+        identifier = row.get('image_filename', f'row_{idx}')
+        property_type = row.get('property', 'UNKNOWN')
+        responses = [('N/A', row['model_response'])]
+    elif 'ground_truth_category' in columns:
+        # RoboCasa/Humanoid format
+        ground_truth = row['ground_truth_category']
+        identifier = row.get('object_name', row.get('cam0_image', f'row_{idx}'))
+        property_type = row.get('property_name', 'UNKNOWN')
+
+        # Check for multiple camera responses
+        if 'response_cam0' in columns and 'response_cam1' in columns:
+            responses = [('cam0', row['response_cam0']), ('cam1', row['response_cam1'])]
+        else:
+            responses = [('N/A', row['model_response'])]
+    else:
+        return []
+
+    return [{
+        'source_file': source_file,
+        'property_type': property_type,
+        'identifier': identifier,
+        'ground_truth': ground_truth,
+        'model_response': model_response,
+        'camera': camera,
+    } for camera, model_response in responses]
+
+
+def affordance_row_records(source_file, columns, idx, row):
+    """Unverified records (one per camera) for one row of an affordance result CSV."""
+    ground_truth = row.get('ground_truth_affordances', 'N/A')
+    identifier = row.get('object_name', row.get('cam0_image', f'row_{idx}'))
+
+    # Check for multiple camera responses
+    if 'response_cam0' in columns and 'response_cam1' in columns:
+        responses = [('cam0', row['response_cam0']), ('cam1', row['response_cam1'])]
+    else:
+        responses = [('N/A', row.get('model_response', 'N/A'))]
+
+    return [{
+        'source_file': source_file,
+        'identifier': identifier,
+        'ground_truth': ground_truth,
+        'model_response': model_response,
+        'camera': camera,
+    } for camera, model_response in responses]
+
+
+def constraint_row_records(source_file, columns, idx, row):
+    """Unverified records (one per camera) for one row of a constraint result CSV."""
+    ground_truth = row.get('ground_truth_answer', row.get('verification_prompt', 'N/A'))
+    identifier = row.get('question', row.get('constraint_key', f'row_{idx}'))
+    constraint_type = row.get('constraint_key', 'humanoid_task')
+
+    # Check for multiple camera responses
+    if 'response_cam0' in columns and 'response_cam1' in columns:
+        responses = [('cam0', row['response_cam0']), ('cam1', row['response_cam1'])]
+        if 'response_both_cams' in columns:
+            responses.append(('both', row['response_both_cams']))
+    elif row.get('view') == 'multi':
+        # Simulated rows packed with run_constraint.py --sim_pack carry all views in one response
+        responses = [('multi', row.get('model_response', 'N/A'))]
+    else:
+        responses = [('N/A', row.get('model_response', 'N/A'))]
+
+    return [{
+        'source_file': source_file,
+        'constraint_type': constraint_type,
+        'identifier': identifier,
+        'ground_truth': ground_truth,
+        'model_response': model_response,
+        'camera': camera,
+    } for camera, model_response in responses]
+
+
+def property_records(input_dir):
+    """Yield one unverified record per (row, camera) from the property result CSVs."""
+    for source_file, columns, idx, row in _iter_result_rows(input_dir):
+        yield from property_row_records(source_file, columns, idx, row)
+
+
+def affordance_records(input_dir):
+    """Yield one unverified record per (row, camera) from the affordance result CSVs."""
+    for source_file, columns, idx, row in _iter_result_rows(input_dir):
+        yield from affordance_row_records(source_file, columns, idx, row)
+
+
+def constraint_records(input_dir):
+    """Yield one unverified record per (row, camera) from the constraint result CSVs."""
+    for source_file, columns, idx, row in _iter_result_rows(input_dir):
+        yield from constraint_row_records(source_file, columns, idx, row)
+
+
+def record_key(record):
+    """The (source_file, identifier, camera) of a record, as written to the verification CSV."""
+    return tuple(str(_csv_value(record[c])) for c in VERIFY_KEY_COLUMNS)
+
+
+def _skip_verified(records, completed, key_columns):
+    for record in records:
+        key = tuple(str(_csv_value(record[c])) for c in key_columns)
+        if completed[key] > 0:
+            completed[key] -= 1
+            continue
+        yield record
+
+
+def write_verified(client, model, task, records, output_file, batch_size=1, fast_path=True,
+                   executor=None, concurrency=1, resume=False, identifier_width=None):
+    """Verify records and stream them to output_file as they complete.
+
+    Rows are flushed to disk every FLUSH_EVERY rows. With resume, records
+    already in output_file are skipped, except those with an ERROR verdict,
+    which are removed from it and verified again.
+    With a shard configured (see sharding.py), only that shard's records are verified.
+    """
+    columns = VERIFY_COLUMNS[task]
+    # Every column but the verdict, since (source_file, identifier, camera) is
+    # shared by the properties of a humanoid image and a removed ERROR row
+    # must not be matched with another property's record
+    key_columns = [c for c in columns if c != "verification"]
+    # Same line endings as the DataFrame.to_csv output this replaced
+    outfile, completed = open_results(output_file, columns, key_columns, resume, lineterminator="\n",
+                                      redo=lambda row: row["verification"].startswith("ERROR"))
+    with outfile:
+        writer = csv.writer(outfile, lineterminator="\n")
+        pending = _skip_verified((r for r in records if in_shard(record_key(r))), completed, key_columns)
+        verified = iter_verified(client, model, task, pending, batch_size, fast_path, executor, concurrency)
+        for count, result in enumerate(verified, start=1):
+            writer.writerow([_csv_value(result[c]) for c in columns])
+            identifier = str(result['identifier'])
+            if identifier_width:
+                identifier = identifier[:identifier_width] + "..."
+            print(f"  {identifier} [{result['camera']}]: {result['verification']}")
+            if count % FLUSH_EVERY == 0:
+                sync(outfile)
+        sync(outfile)
+
+
+def verify_properties(client, model, input_dir, output_file, fast_path=True, batch_size=1, executor=None, concurrency=1,
+                      resume=False, records=None):
+    """Verify all property evaluation results (or the given records instead of those read from input_dir)."""
+    print("\n" + "="*60)
+    print("Verifying Property Evaluations")
+    print("="*60)
+
+    if records is None:
+        records = property_records(input_dir)
+    write_verified(client, model, "properties", records, output_file,
+                   batch_size, fast_path, executor, concurrency, resume)
+
     # Print summary
-    print(f"\n{'='*60}")
-    print("Property Verification Summary:")
-    print(f"  Total: {len(all_results)}")
-    print(f"  Correct: {len(df_results[df_results['verification'] == 'CORRECT'])}")
-    print(f"  Incorrect: {len(df_results[df_results['verification'] == 'INCORRECT'])}")
-    print(f"  Uncertain: {len(df_results[df_results['verification'] == 'UNCERTAIN'])}")
+    _print_summary("Property", output_file)
+    if fast_path:
+        stats = fast_path_stats()
+        decided = stats['fast_path'] + stats['llm']
+        fast_pct = (stats['fast_path'] / decided * 100) if decided > 0 else 0
+        llm_pct = (stats['llm'] / decided * 100) if decided > 0 else 0
+        print(f"  Fast path: {stats['fast_path']} ({fast_pct:.2f}%)  LLM verifier: {stats['llm']} ({llm_pct:.2f}%)")
     print(f"Results saved to: {output_file}")
 
 
-def verify_affordances(client, model, input_dir, output_file):
-    """Verify all affordance evaluation results."""
+def verify_affordances(client, model, input_dir, output_file, batch_size=1, executor=None, concurrency=1, resume=False,
+                       records=None):
+    """Verify all affordance evaluation results (or the given records instead of those read from input_dir)."""
     print("\n" + "="*60)
     print("Verifying Affordance Evaluations")
     print("="*60)
-    
-    all_results = []
-    csv_files = glob.glob(os.path.join(input_dir, "*.csv"))
-    
-    for csv_file in csv_files:
-        print(f"\nProcessing: {os.path.basename(csv_file)}")
-        df = pd.read_csv(csv_file)
-        
-        for idx, row in df.iterrows():
-            ground_truth = row.get('ground_truth_affordances', 'N/A')
-            identifier = row.get('object_name', row.get('cam0_image', f'row_{idx}'))
-            
-            # Check for multiple camera responses
-            if 'response_cam0' in df.columns and 'response_cam1' in df.columns:
-                verification_cam0 = verify_affordance_match(client, model, ground_truth, row['response_cam0'])
-                verification_cam1 = verify_affordance_match(client, model, ground_truth, row['response_cam1'])
-                
-                all_results.append({
-                    'source_file': os.path.basename(csv_file),
-                    'identifier': identifier,
-                    'ground_truth': ground_truth,
-                    'model_response': row['response_cam0'],
-                    'camera': 'cam0',
-                    'verification': verification_cam0
-                })
-                all_results.append({
-                    'source_file': os.path.basename(csv_file),
-                    'identifier': identifier,
-                    'ground_truth': ground_truth,
-                    'model_response': row['response_cam1'],
-                    'camera': 'cam1',
-                    'verification': verification_cam1
-                })
-                print(f"  {identifier} - cam0: {verification_cam0}, cam1: {verification_cam1}")
-            else:
-                model_response = row.get('model_response', 'N/A')
-                verification = verify_affordance_match(client, model, ground_truth, model_response)
-                all_results.append({
-                    'source_file': os.path.basename(csv_file),
-                    'identifier': identifier,
-                    'ground_truth': ground_truth,
-                    'model_response': model_response,
-                    'camera': 'N/A',
-                    'verification': verification
-                })
-                print(f"  {identifier}: {verification}")
-    
-    # Save results
-    df_results = pd.DataFrame(all_results)
-    df_results.to_csv(output_file, index=False)
-    
+
+    if records is None:
+        records = affordance_records(input_dir)
+    write_verified(client, model, "affordances", records, output_file,
+                   batch_size, True, executor, concurrency, resume)
+
     # Print summary
-    print(f"\n{'='*60}")
-    print("Affordance Verification Summary:")
-    print(f"  Total: {len(all_results)}")
-    print(f"  Correct: {len(df_results[df_results['verification'] == 'CORRECT'])}")
-    print(f"  Incorrect: {len(df_results[df_results['verification'] == 'INCORRECT'])}")
-    print(f"  Uncertain: {len(df_results[df_results['verification'] == 'UNCERTAIN'])}")
+    _print_summary("Affordance", output_file)
     print(f"Results saved to: {output_file}")
 
 
-def verify_constraints(client, model, input_dir, output_file):
-    """Verify all constraint evaluation results."""
+def verify_constraints(client, model, input_dir, output_file, batch_size=1, executor=None, concurrency=1, resume=False,
+                       records=None):
+    """Verify all constraint evaluation results (or the given records instead of those read from input_dir)."""
     print("\n" + "="*60)
     print("Verifying Constraint Evaluations")
     print("="*60)
-    
-    all_results = []
-    csv_files = glob.glob(os.path.join(input_dir, "*.csv"))
-    
-    for csv_file in csv_files:
-        print(f"\nProcessing: {os.path.basename(csv_file)}")
-        df = pd.read_csv(csv_file)
-        
-        for idx, row in df.iterrows():
-            ground_truth = row.get('ground_truth_answer', row.get('verification_prompt', 'N/A'))
-            identifier = row.get('question', row.get('constraint_key', f'row_{idx}'))
-            constraint_type = row.get('constraint_key', 'humanoid_task')
-            
-            # Check for multiple camera responses
-            if 'response_cam0' in df.columns and 'response_cam1' in df.columns:
-                verification_cam0 = verify_constraint_match(client, model, ground_truth, row['response_cam0'])
-                verification_cam1 = verify_constraint_match(client, model, ground_truth, row['response_cam1'])
-                verification_both = verify_constraint_match(client, model, ground_truth, row.get('response_both_cams', 'N/A'))
-                
-                all_results.append({
-                    'source_file': os.path.basename(csv_file),
-                    'constraint_type': constraint_type,
-                    'identifier': identifier,
-                    'ground_truth': ground_truth,
-                    'model_response': row['response_cam0'],
-                    'camera': 'cam0',
-                    'verification': verification_cam0
-                })
-                all_results.append({
-                    'source_file': os.path.basename(csv_file),
-                    'constraint_type': constraint_type,
-                    'identifier': identifier,
-                    'ground_truth': ground_truth,
-                    'model_response': row['response_cam1'],
-                    'camera': 'cam1',
-                    'verification': verification_cam1
-                })
-                if 'response_both_cams' in df.columns:
-                    all_results.append({
-                        'source_file': os.path.basename(csv_file),
-                        'constraint_type': constraint_type,
-                        'identifier': identifier,
-                        'ground_truth': ground_truth,
-                        'model_response': row['response_both_cams'],
-                        'camera': 'both',
-                        'verification': verification_both
-                    })
-                print(f"  {identifier[:50]}... - cam0: {verification_cam0}, cam1: {verification_cam1}, both: {verification_both}")
-            else:
-                model_response = row.get('model_response', 'N/A')
-                verification = verify_constraint_match(client, model, ground_truth, model_response)
-                all_results.append({
-                    'source_file': os.path.basename(csv_file),
-                    'constraint_type': constraint_type,
-                    'identifier': identifier,
-                    'ground_truth': ground_truth,
-                    'model_response': model_response,
-                    'camera': 'N/A',
-                    'verification': verification
-                })
-                print(f"  {identifier[:50]}...: {verification}")
-    
-    # Save results
-    df_results = pd.DataFrame(all_results)
-    df_results.to_csv(output_file, index=False)
-    
+
+    if records is None:
+        records = constraint_records(input_dir)
+    write_verified(client, model, "constraints", records, output_file,
+                   batch_size, True, executor, concurrency, resume, identifier_width=50)
+
     # Print summary
-    print(f"\n{'='*60}")
-    print("Constraint Verification Summary:")
-    print(f"  Total: {len(all_results)}")
-    print(f"  Correct: {len(df_results[df_results['verification'] == 'CORRECT'])}")
-    print(f"  Incorrect: {len(df_results[df_results['verification'] == 'INCORRECT'])}")
-    print(f"  Uncertain: {len(df_results[df_results['verification'] == 'UNCERTAIN'])}")
+    _print_summary("Constraint", output_file)
     print(f"Results saved to: {output_file}")
 
 
 def main():
     """Main function to run LLM verification."""
     load_dotenv()
-    
+
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     if not OPENROUTER_API_KEY:
         raise EnvironmentError("OPENROUTER_API_KEY not set in environment variables.")
 
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPENROUTER_API_KEY)
-
     # Argument parser
     parser = argparse.ArgumentParser(description="Verify VLM evaluation results using LLM")
     parser.add_argument("--model", type=str, default="meta-llama/llama-4-maverick",
@@ -356,30 +570,73 @@ def main():
                         help="Directory to save verification results")
     parser.add_argument("--task", type=str, choices=["properties", "affordances", "constraints", "all"],
                         default="all", help="Which task to verify")
+    parser.add_argument("--disable_fast_path", action="store_true",
+                        help="Send every property verification to the LLM instead of matching MCQ options locally")
+    parser.add_argument("--verify_batch_size", type=int, default=1,
+                        help="Number of (ground truth, response) pairs verified per LLM request")
+    parser.add_argument("--verify_memo", type=str, default=verification_memo.DEFAULT_MEMO_PATH,
+                        help="SQLite file memoizing verdicts across rows and runs")
+    parser.add_argument("--disable_verify_memo", action="store_true",
+                        help="Do not read or write the verification memo")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep existing verification CSVs and skip rows already verified")
+    parser.add_argument("--verify_concurrency", type=int, default=1,
+                        help="Maximum verifier requests in flight; above 1, all tasks are verified in parallel")
+    ratelimit.add_ratelimit_args(parser)
+    add_client_args(parser)
+    add_shard_args(parser)
+    add_instrumentation_args(parser)
 
     args = parser.parse_args()
+    ratelimit.configure_ratelimit_from_args(args)
+    configure_clients_from_args(args)
+    configure_sharding_from_args(args)
+    configure_instrumentation_from_args(args)
+    client = make_client(OPENROUTER_API_KEY)
+    if not args.disable_verify_memo:
+        verification_memo.open_memo(args.verify_memo)
 
     # Create output directory
-    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(shard_output_dir(args.output_dir), exist_ok=True)
+
+    # Concurrent mode shares one pool of verifier workers across all tasks
+    executor = ThreadPoolExecutor(max_workers=args.verify_concurrency) if args.verify_concurrency > 1 else None
+    jobs = []
 
     # Run verifications based on task argument
     if args.task in ["properties", "all"]:
-        output_file = os.path.join(args.output_dir, "property_verification_results.csv")
-        verify_properties(client, args.model, args.property_dir, output_file)
-    
+        output_file = shard_output_path(os.path.join(args.output_dir, "property_verification_results.csv"))
+        jobs.append((verify_properties, (client, args.model, args.property_dir, output_file, not args.disable_fast_path,
+                                         args.verify_batch_size, executor, args.verify_concurrency, args.resume)))
+
     if args.task in ["affordances", "all"]:
-        output_file = os.path.join(args.output_dir, "affordance_verification_results.csv")
-        verify_affordances(client, args.model, args.affordance_dir, output_file)
-    
+        output_file = shard_output_path(os.path.join(args.output_dir, "affordance_verification_results.csv"))
+        jobs.append((verify_affordances, (client, args.model, args.affordance_dir, output_file,
+                                          args.verify_batch_size, executor, args.verify_concurrency, args.resume)))
+
     if args.task in ["constraints", "all"]:
-        output_file = os.path.join(args.output_dir, "constraint_verification_results.csv")
-        verify_constraints(client, args.model, args.constraint_dir, output_file)
+        output_file = shard_output_path(os.path.join(args.output_dir, "constraint_verification_results.csv"))
+        jobs.append((verify_constraints, (client, args.model, args.constraint_dir, output_file,
+                                          args.verify_batch_size, executor, args.verify_concurrency, args.resume)))
+
+    if executor is None:
+        for verify_fn, fn_args in jobs:
+            verify_fn(*fn_args)
+    else:
+        with executor, ThreadPoolExecutor(max_workers=max(1, len(jobs))) as task_pool:
+            futures = [task_pool.submit(verify_fn, *fn_args) for verify_fn, fn_args in jobs]
+            for future in futures:
+                future.result()
 
     print("\n" + "="*60)
+    _print_verifier_stats()
+    ratelimit.print_ratelimit_stats()
+    verification_memo.print_memo_stats()
+    verification_memo.close_memo()
+    close_instrumentation()
     print("All verifications complete!")
     print("="*60)
 
 
 if __name__ == "__main__":
     main()
-
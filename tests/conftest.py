@@ -0,0 +1,45 @@
+import os
+import sys
+import subprocess
+import pytest
+
+# The scripts are flat modules that import each other by name
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from benchmark import make_dataset
+from mock_server import configure_mock, start_mock_server
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    """A small synthetic dataset (see benchmark.make_dataset); returns the scripts/ directory to run from."""
+    return make_dataset(str(tmp_path_factory.mktemp("pacbench")), scale=1, image_size=(16, 12))
+
+
+@pytest.fixture(scope="session")
+def _mock_server():
+    server, base_url = start_mock_server()
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mock_api(_mock_server):
+    """Base URL of the mock API, answering without delay or failures unless a test configures it."""
+    configure_mock(latency_ms=1, distribution="fixed")
+    yield _mock_server
+    configure_mock(latency_ms=1, distribution="fixed")
+
+
+@pytest.fixture
+def run_script(dataset):
+    """Run scripts/<name>.py in a fresh interpreter from the dataset's scripts/ directory."""
+
+    def run(name, *args):
+        env = dict(os.environ, OPENROUTER_API_KEY="mock")
+        return subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, f"{name}.py"), *map(str, args)],
+                              cwd=dataset, env=env, capture_output=True, text=True, timeout=600)
+
+    return run
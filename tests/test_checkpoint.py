@@ -0,0 +1,60 @@
+import csv
+import pytest
+from checkpoint import open_results, read_results, result_writer
+
+HEADER = ["key", "answer"]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows([HEADER] + rows)
+
+
+def test_resume_discards_truncated_last_record(tmp_path):
+    path = str(tmp_path / "results.csv")
+    write_csv(path, [["a", "1"], ["b", "2"]])
+    with open(path, "ab") as f:
+        f.write(b'c,"half a')
+
+    outfile, completed = open_results(path, HEADER, ["key"], resume=True)
+    with outfile:
+        result_writer(outfile, HEADER)(["c", "3"])
+
+    assert completed == {("a",): 1, ("b",): 1}
+    assert read_results(path) == [{"key": "a", "answer": "1"}, {"key": "b", "answer": "2"},
+                                  {"key": "c", "answer": "3"}]
+
+
+def test_resume_counts_repeated_keys(tmp_path):
+    path = str(tmp_path / "results.csv")
+    write_csv(path, [["a", "1"], ["a", "2"]])
+    outfile, completed = open_results(path, HEADER, ["key"], resume=True)
+    outfile.close()
+    assert completed[("a",)] == 2
+
+
+def test_resume_redoes_matching_rows(tmp_path):
+    path = str(tmp_path / "results.csv")
+    write_csv(path, [["a", "1"], ["b", "ERROR: timeout"], ["c", "3"]])
+    outfile, completed = open_results(path, HEADER, ["key"], resume=True,
+                                      redo=lambda row: row["answer"].startswith("ERROR"))
+    outfile.close()
+
+    assert completed == {("a",): 1, ("c",): 1}
+    assert [row["key"] for row in read_results(path)] == ["a", "c"]
+
+
+def test_without_resume_the_file_is_rewritten(tmp_path):
+    path = str(tmp_path / "results.csv")
+    write_csv(path, [["a", "1"]])
+    outfile, completed = open_results(path, HEADER, ["key"])
+    outfile.close()
+    assert not completed
+    assert read_results(path) == []
+
+
+def test_resume_rejects_a_different_header(tmp_path):
+    path = str(tmp_path / "results.csv")
+    write_csv(path, [["a", "1"]])
+    with pytest.raises(ValueError):
+        open_results(path, ["key", "response"], ["key"], resume=True)
@@ -0,0 +1,56 @@
+import os
+import pytest
+from mock_server import configure_mock
+
+RESULT_FILES = ["openrouter_property_eval_results.csv", "openrouter_robocasa_eval_results.csv",
+                "openrouter_humanoid_eval_results.csv"]
+
+
+def read_bytes(directory):
+    result = {}
+    for name in RESULT_FILES:
+        with open(os.path.join(directory, name), "rb") as f:
+            result[name] = f.read()
+    return result
+
+
+@pytest.fixture
+def reference(mock_api, run_script, tmp_path):
+    """Property results of one uninterrupted run, as bytes per file."""
+    output_dir = tmp_path / "reference"
+    result = run_script("run_properties", "--base_url", mock_api, "--output_dir", output_dir)
+    assert result.returncode == 0, result.stderr
+    return read_bytes(output_dir)
+
+
+def test_output_does_not_depend_on_concurrency(mock_api, run_script, tmp_path, reference):
+    output_dir = tmp_path / "serial"
+    result = run_script("run_properties", "--base_url", mock_api, "--output_dir", output_dir, "--concurrency", 1)
+    assert result.returncode == 0, result.stderr
+    assert read_bytes(output_dir) == reference
+
+
+def test_failed_items_are_left_out_and_retried_on_resume(mock_api, run_script, tmp_path, reference):
+    output_dir = tmp_path / "failing"
+    configure_mock(latency_ms=1, distribution="fixed", error_rate=1.0)
+    result = run_script("run_properties", "--base_url", mock_api, "--output_dir", output_dir, "--max_retries", 0)
+    assert result.returncode == 1
+    assert "rerun with --resume" in result.stdout
+    # Only the headers were written
+    assert all(data.count(b"\n") == 1 for data in read_bytes(output_dir).values())
+
+    configure_mock(latency_ms=1, distribution="fixed")
+    result = run_script("run_properties", "--base_url", mock_api, "--output_dir", output_dir, "--resume")
+    assert result.returncode == 0, result.stderr
+    assert read_bytes(output_dir) == reference
+
+
+def test_merged_shards_match_an_unsharded_run(mock_api, run_script, tmp_path, reference):
+    output_dir = tmp_path / "sharded"
+    for shard in ("1/2", "2/2"):
+        result = run_script("run_properties", "--base_url", mock_api, "--output_dir", output_dir, "--shard", shard)
+        assert result.returncode == 0, result.stderr
+
+    result = run_script("sharding", "--shards", 2, "--task", "properties", "--property_dir", output_dir)
+    assert result.returncode == 0, result.stdout
+    assert read_bytes(output_dir) == reference
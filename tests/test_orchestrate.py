@@ -0,0 +1,31 @@
+import json
+from mock_server import configure_mock
+
+EVAL_NODES = ["evaluate:properties:openimages", "evaluate:properties:robocasa", "evaluate:properties:humanoid"]
+
+
+def test_nodes_with_failed_items_are_not_skipped(mock_api, run_script, tmp_path):
+    state_path = tmp_path / "state.json"
+    orchestrate = ["orchestrate", "--base_url", mock_api, "--task", "properties", "--property_dir", tmp_path / "results",
+                   "--output_dir", tmp_path / "evaluations", "--state_path", state_path, "--disable_verify_memo",
+                   "--max_retries", 0, "--resume"]
+
+    configure_mock(latency_ms=1, distribution="fixed", error_rate=1.0)
+    result = run_script(*orchestrate)
+    assert result.returncode == 1
+    for name in EVAL_NODES:
+        assert f"[orchestrate] {name} failed" in result.stdout
+    assert not state_path.exists()
+
+    configure_mock(latency_ms=1, distribution="fixed")
+    result = run_script(*orchestrate)
+    assert result.returncode == 0, result.stdout + result.stderr
+    for name in EVAL_NODES:
+        assert f"[orchestrate] {name} ran" in result.stdout
+    assert set(EVAL_NODES) <= set(json.loads(state_path.read_text()))
+
+    result = run_script(*orchestrate)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert " ran in " not in result.stdout
+    for name in EVAL_NODES:
+        assert f"[orchestrate] {name} skipped" in result.stdout
@@ -0,0 +1,32 @@
+import pytest
+from property_matcher import fast_path_verdict, match_option
+
+
+@pytest.mark.parametrize("property_type, ground_truth, response", [
+    ("WEIGHT", "Heavy", "The object doesn't look heavy"),
+    ("WEIGHT", "Heavy", "It doesnt look heavy"),
+    ("HARDNESS", "Soft", "It isn't hard"),
+    ("HARDNESS", "Soft", "It wasn't rigid"),
+    ("SEALING", "Unsealed", "It can't leak"),
+    ("STICKINESS", "Sticky", "Not sticky"),
+    ("CONTENTS", "Empty", "Contains nothing"),
+    ("CONTENTS", "Contains", "None, it is empty"),
+    ("WEIGHT", "Light", "Unlikely to be heavy"),
+])
+def test_negated_responses_go_to_the_llm(property_type, ground_truth, response):
+    assert fast_path_verdict(property_type, ground_truth, response) is None
+
+
+@pytest.mark.parametrize("property_type, ground_truth, response, verdict", [
+    ("WEIGHT", "Heavy", "Heavy", "CORRECT"),
+    ("WEIGHT", "Heavy", "Heavy: Bulky, Dense", "CORRECT"),
+    ("WEIGHT", "Heavy", "Light", "INCORRECT"),
+    ("SEALING", "Unsealed", "Unsealed: Open, can leak", "CORRECT"),
+    ("STICKINESS", "Sticky", "Non-sticky", "INCORRECT"),
+])
+def test_plain_answers_are_decided_locally(property_type, ground_truth, response, verdict):
+    assert fast_path_verdict(property_type, ground_truth, response) == verdict
+
+
+def test_ambiguous_answer_matches_no_option():
+    assert match_option("WEIGHT", "Light or heavy") is None
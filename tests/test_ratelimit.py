@@ -0,0 +1,38 @@
+import asyncio
+import openai
+import pytest
+import ratelimit
+from mock_server import configure_mock
+
+MESSAGES = [{"role": "user", "content": "Describe the object."}]
+
+
+class StatusError(Exception):
+    """Stands in for an openai.APIStatusError, which retryable only reads the status_code of."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("status, retry", [(429, True), (500, True), (503, True), (408, True),
+                                           (400, False), (401, False), (404, False)])
+def test_retryable(status, retry):
+    assert ratelimit.retryable(StatusError(status)) == retry
+
+
+def test_cancelled_request_releases_its_slot(mock_api):
+    configure_mock(latency_ms=2000, distribution="fixed")
+    ratelimit.configure_ratelimit()
+
+    async def cancel_in_flight():
+        client = openai.AsyncOpenAI(api_key="mock", base_url=mock_api)
+        task = asyncio.ensure_future(ratelimit.acreate(client, model="mock", messages=MESSAGES))
+        await asyncio.sleep(0.2)
+        assert ratelimit._state["in_flight"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_in_flight())
+    assert ratelimit._state["in_flight"] == 0
@@ -0,0 +1,37 @@
+import csv
+
+OUTPUT_FILE = "property_verification_results.csv"
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_resume_verifies_error_rows_again(mock_api, run_script, tmp_path):
+    results_dir, output_dir = tmp_path / "results", tmp_path / "verified"
+    result = run_script("run_properties", "--base_url", mock_api, "--output_dir", results_dir)
+    assert result.returncode == 0, result.stderr
+    verify = ["verify_results", "--base_url", mock_api, "--task", "properties", "--property_dir", results_dir,
+              "--output_dir", output_dir, "--disable_fast_path", "--disable_verify_memo"]
+    result = run_script(*verify)
+    assert result.returncode == 0, result.stderr
+
+    path = output_dir / OUTPUT_FILE
+    reference = read_rows(path)
+    header, rows = reference[0], [list(row) for row in reference[1:]]
+    # Humanoid rows share (source_file, identifier, camera) across properties,
+    # so the failed rows must be matched with their own records
+    failed = [i for i, row in enumerate(rows) if row[0] == "openrouter_humanoid_eval_results.csv"][1::3]
+    assert failed
+    for i in failed:
+        rows[i][-1] = "ERROR: Connection error."
+    with open(path, "w", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerows([header] + rows)
+
+    result = run_script(*verify, "--resume")
+    assert result.returncode == 0, result.stderr
+    assert f"Redoing {len(failed)} rows" in result.stdout
+    resumed = read_rows(path)
+    assert resumed[0] == header
+    assert sorted(resumed[1:]) == sorted(reference[1:])